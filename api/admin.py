@@ -10,3 +10,33 @@ from api.models import models as m
 models = [m.Story, m.Comment, m.Poll, m.PollOption]
 # type: ignore
 admin.site.register(_ for _ in models)
+
+
+@admin.register(m.SyncRun)
+class SyncRunAdmin(admin.ModelAdmin):
+    """Run history of the collector, to find where syncs slow down."""
+
+    list_display = [
+        "started_at",
+        "kind",
+        "seconds",
+        "fetched",
+        "items_per_sec",
+        "fetch_p50",
+        "fetch_p99",
+        "fetch_seconds",
+        "parse_seconds",
+        "write_seconds",
+        "retries",
+        "backlog",
+        "bottleneck",
+        "error",
+    ]
+    list_filter = ["kind"]
+    date_hierarchy = "started_at"
+
+    def has_add_permission(self, request) -> bool:
+        return False
+
+    def has_change_permission(self, request, obj=None) -> bool:
+        return False
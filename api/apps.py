@@ -1,8 +1,17 @@
 from __future__ import annotations
 
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class ApiConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "api"
+
+    def ready(self):
+        from api import checks  # noqa: F401
+
+        if settings.METRICS_ENABLED:
+            from api.lib import metrics
+
+            metrics.install()
@@ -0,0 +1,223 @@
+"""
+Async versions of the read endpoints, for `core.asgi`.
+
+Under ASGI, a synchronous DRF view runs in a worker thread for \
+    the whole request. These views are coroutines instead: their \
+        queries are awaited (see `api.lib.aio`) and their pages are \
+            cut by the paginators of `api.pagination`. Querysets \
+                join everything their serializer reads, so that \
+                    serializing is plain CPU work done on the event loop.
+
+Rows are fetched with `.values()` and rendered by the \
+    `RowSerializer` of each endpoint's serializer, then with DRF's \
+        `JSONRenderer`, so they match the sync endpoints byte for byte:
+
+    /api/v1/async/news/                 GetLatestNewsAPIView
+    /api/v1/async/news/<id>             UpdateorDeleteNewsAPIView
+    /api/v1/async/stories/              StoriesViewset
+    /api/v1/async/stories/<id>          StoriesViewset
+    /api/v1/async/items/<id>/comments   the comment thread of an item
+
+They are only routed with `ASYNC_VIEWS_ENABLED`, on by default \
+    from Django 4.1: before, their queries are serialized on one \
+        thread, see `api.lib.aio`.
+"""
+from __future__ import annotations
+
+import functools
+
+from asgiref.sync import sync_to_async
+from django.http import HttpRequest
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django_filters.filterset import filterset_factory
+from rest_framework import status
+from rest_framework.exceptions import APIException
+from rest_framework.exceptions import MethodNotAllowed
+from rest_framework.exceptions import NotFound
+from rest_framework.exceptions import ValidationError
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+
+from api.lib import aio
+from api.lib import cache
+from api.lib import metrics
+from api.lib.rows import for_request
+from api.models.models import Comment
+from api.models.models import Item
+from api.models.models import Story
+from api.pagination import KeysetOrOffsetPagination
+from api.pagination import ThreadPagination
+from api.serializers import BaseItemSerializer
+from api.serializers import CommentSerializer
+from api.serializers import EXPANSIONS
+from api.serializers import StorySerializer
+
+
+NEWS_FILTERS = ["type", "time", "by"]
+"""The `filterset_fields` of `GetLatestNewsAPIView`."""
+
+renderer = JSONRenderer()
+
+
+def render(data, status: int = status.HTTP_200_OK) -> HttpResponse:
+    return HttpResponse(
+        renderer.render(data), status=status, content_type="application/json"
+    )
+
+
+def read_only(view):
+    """
+    Restricts an async view to safe methods, and renders the \
+        API errors it raises like DRF does.
+    """
+
+    @functools.wraps(view)
+    async def wrapper(request: HttpRequest, *args, **kwargs):
+        try:
+            if request.method not in ("GET", "HEAD"):
+                raise MethodNotAllowed(request.method)
+            return await view(request, *args, **kwargs)
+        except APIException as exc:
+            detail = exc.detail
+            if not isinstance(detail, (list, dict)):
+                detail = {"detail": detail}
+            return render(detail, exc.status_code)
+
+    return wrapper
+
+
+async def cached(request: HttpRequest, view) -> HttpResponse:
+    """
+    Serves `view()` from the response cache, see `api.lib.cache`.
+    """
+    key = cache.response_key(request)
+    response, version = await sync_to_async(cache.get_response)(key)
+    if response is None:
+        response = await view()
+        await sync_to_async(cache.set_response)(key, response, version)
+    return response
+
+
+async def paginate(
+    request: HttpRequest,
+    queryset,
+    serializer_class,
+    pagination_class=KeysetOrOffsetPagination,
+) -> HttpResponse:
+    paginator = pagination_class()
+    rows = for_request(serializer_class, request, EXPANSIONS)
+    ordering = paginator.ordering
+    page = await paginator.apaginate_queryset(
+        rows.values(
+            queryset, *((ordering,) if isinstance(ordering, str) else ordering)
+        ),
+        Request(request),
+    )
+    with metrics.serializing():
+        data = await rows.arender_many(page)
+    return render(paginator.get_paginated_data(data))
+
+
+async def retrieve(
+    request: HttpRequest, queryset, serializer_class
+) -> HttpResponse:
+    """
+    Renders the single row of `queryset`, answering conditional \
+        requests from its digest, see `ConditionalRetrieveMixin`.
+    """
+    version = await aio.first(queryset.values_list("digest", "changed_at"))
+    if version is None:
+        raise NotFound()
+    rows = for_request(serializer_class, request, EXPANSIONS)
+    fields = cache.representation(request)
+    if not version[0] or fields is None:
+        row = await aio.first(rows.values(queryset))
+        if row is None:
+            raise NotFound()
+        with metrics.serializing():
+            data = (await rows.arender_many([row]))[0]
+        return render(data)
+
+    etag, last_modified, headers = cache.validators(*version, "json", fields)
+    response = get_conditional_response(
+        request, etag=etag, last_modified=last_modified
+    )
+    if response is None:
+        row = await aio.first(rows.values(queryset))
+        if row is None:
+            raise NotFound()
+        with metrics.serializing():
+            data = (await rows.arender_many([row]))[0]
+        response = render(data)
+    for header, value in headers.items():
+        response[header] = value
+    return response
+
+
+def filter_news(request: HttpRequest, queryset):
+    # validating `?by=` looks the author up, so this runs in a thread
+    filterset = filterset_factory(Item, fields=NEWS_FILTERS)(
+        request.GET, queryset=queryset
+    )
+    if not filterset.is_valid():
+        raise ValidationError(filterset.errors)
+    return filterset.qs
+
+
+@read_only
+async def news_list(request: HttpRequest) -> HttpResponse:
+    async def view():
+        queryset = Item.objects.filter(time__isnull=False)
+        if any(name in request.GET for name in NEWS_FILTERS):
+            queryset = await sync_to_async(filter_news)(request, queryset)
+        return await paginate(request, queryset, BaseItemSerializer)
+
+    return await cached(request, view)
+
+
+@read_only
+async def news_detail(request: HttpRequest, id: int) -> HttpResponse:
+    return await retrieve(
+        request, Item.objects.filter(id=id), BaseItemSerializer
+    )
+
+
+@read_only
+async def story_list(request: HttpRequest) -> HttpResponse:
+    async def view():
+        return await paginate(
+            request, Story.objects.filter(time__isnull=False), StorySerializer
+        )
+
+    return await cached(request, view)
+
+
+@read_only
+async def story_detail(request: HttpRequest, id: int) -> HttpResponse:
+    return await retrieve(
+        request,
+        Story.objects.filter(id=id),
+        StorySerializer,
+    )
+
+
+@read_only
+async def comment_thread(request: HttpRequest, id: int) -> HttpResponse:
+    item = await aio.first(
+        Item.objects.select_related("comment").filter(id=id)
+    )
+    if item is None:
+        raise NotFound()
+    if item.type == "comment":
+        item = item.comment
+
+    async def view():
+        return await paginate(
+            request,
+            Comment.objects.thread(item),
+            CommentSerializer,
+            ThreadPagination,
+        )
+
+    return await cached(request, view)
@@ -0,0 +1,103 @@
+"""
+Benchmark suites for the collector and the API.
+
+Suites are run with `python manage.py benchmark <suite>`; each \
+    suite module exposes `run(**options) -> dict` returning its \
+        measurements.
+"""
+from __future__ import annotations
+
+import time
+from contextlib import contextmanager
+from typing import Any
+
+from django.db import connection
+from django.db import transaction
+
+
+SUITES = {
+    "asgi": "api.benchmarks.servers",
+    "endpoints": "api.benchmarks.endpoints",
+    "persistence": "api.benchmarks.persistence",
+    "serializers": "api.benchmarks.serializers",
+}
+"""Available suites, by name."""
+
+
+class Rollback(Exception):
+    """Raised to undo everything a measurement wrote."""
+
+
+class QueryCounter:
+    """
+    Counts the queries executed on a connection, see \
+        `connection.execute_wrapper`.
+    """
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+@contextmanager
+def measure(results: dict, rollback: bool = True):
+    """
+    Records the wall time and query count of the block into \
+        `results`, optionally rolling back its writes.
+    """
+    try:
+        with transaction.atomic():
+            counter = QueryCounter()
+            with connection.execute_wrapper(counter):
+                started = time.perf_counter()
+                yield
+                results["seconds"] = time.perf_counter() - started
+            results["queries"] = counter.count
+            if rollback:
+                raise Rollback
+    except Rollback:
+        pass
+
+
+def flatten(results: dict, prefix: str = "") -> dict[str, Any]:
+    """
+    Returns the leaves of nested `results`, keyed by their \
+        `/`-joined path.
+    """
+    leaves = {}
+    for key, value in results.items():
+        path = f"{prefix}/{key}" if prefix else str(key)
+        if isinstance(value, dict):
+            leaves.update(flatten(value, path))
+        else:
+            leaves[path] = value
+    return leaves
+
+
+def compare(baseline: dict, results: dict) -> dict[str, dict]:
+    """
+    Compares the numeric leaves of two runs of a suite.
+
+    Returns:
+        dict: `{"before", "after", "change"}` of each leaf found \
+            in both runs, keyed by path; `change` is relative to \
+                the baseline.
+    """
+    before, after = flatten(baseline), flatten(results)
+    changes = {}
+    for path, old in before.items():
+        new = after.get(path)
+        numbers = all(
+            isinstance(value, (int, float)) and not isinstance(value, bool)
+            for value in (old, new)
+        )
+        if numbers:
+            changes[path] = {
+                "before": old,
+                "after": new,
+                "change": (new - old) / old if old else None,
+            }
+    return changes
@@ -0,0 +1,222 @@
+"""
+Measures every read endpoint: the routes of `api.urls` (the \
+    router viewsets and the async views included), the home page \
+        (`DisplayNewsView`) and the item page (`get_item_view`).
+
+    python manage.py generate_dataset --items 1000000
+    python manage.py benchmark endpoints --output before.json
+    python manage.py benchmark endpoints --compare before.json
+
+Routes are found by walking `api.urls`, so new ones are measured \
+    without being listed here; their arguments are filled with \
+        rows of the current database (see `samples`), and exports \
+            are narrowed to their `SLICES`. Each endpoint gets, for \
+                each size (a number of requests):
+
+    cold     latency percentiles with the response cache \
+                 invalidated before every request.
+    warm     the same, served from the response cache where the \
+                 endpoint uses it and `RESPONSE_CACHE_ENABLED` is on.
+    queries  queries made by a cold request.
+    memory   peak and retained bytes of a cold request, traced \
+                 with `tracemalloc` in a separate, untimed request.
+
+Requests go through a `WSGIHandler` in process, see \
+    `api.benchmarks.servers`. Run it against a populated database.
+"""
+from __future__ import annotations
+
+import statistics
+import subprocess
+import time
+import tracemalloc
+
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIHandler
+from django.db import connection
+from django.urls import reverse
+from django.urls import URLPattern
+from django.utils import timezone
+
+from api import urls as api_urls
+from api.benchmarks import QueryCounter
+from api.benchmarks.servers import wsgi_get
+from api.lib import cache
+from api.models.models import Comment
+from api.models.models import Item
+from api.models.models import ListEntry
+from api.models.models import Story
+
+
+PAGES = {
+    "home": "/home",
+    "home, ?filters=": "/home?filters=Story",
+    "item page": "/{item}/",
+}
+"""The `newsapp` pages measured, by name."""
+
+VARIANTS = {
+    "get_news, ?type=": ("get_news", "type=story"),
+    "get_news, ?by=": ("get_news", "by={author}"),
+    "story-list, ?limit=": ("story-list", "limit=100"),
+}
+"""Query strings measured on top of the bare routes, by name."""
+
+SLICES = {"export_news": "type=job"}
+"""Query strings of the routes streaming whole tables, which are \
+    measured on a slice of them instead."""
+
+PERCENTILES = (50, 95, 99)
+
+
+def _revision() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=settings.BASE_DIR,
+            capture_output=True,
+            check=True,
+            text=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def samples() -> dict:
+    """
+    Rows the routes are pointed at: the story with a comment \
+        thread, the first row of each model and a list entry.
+    """
+    story = (
+        Comment.objects.exclude(root=None)
+        .values_list("root", flat=True)
+        .first()
+    ) or Story.objects.values_list("id", flat=True).first()
+    if story is None:
+        raise ValueError("The benchmark needs a populated database.")
+    entry = ListEntry.objects.values_list("name", "item_id").first()
+    return {
+        "item": story,
+        "author": Item.objects.filter(id=story).values_list(
+            "by_id", flat=True
+        )[0],
+        "list": entry,
+    }
+
+
+def _kwargs(pattern: URLPattern, found: dict) -> dict | None:
+    """
+    Fills the arguments of `pattern`, or returns `None` when the \
+        database has no row to point it at.
+    """
+    names = set(pattern.pattern.regex.groupindex)
+    if "name" in names:
+        if found["list"] is None:
+            return None
+        name, item = found["list"]
+        return {"name": name, **({"id": item} if "id" in names else {})}
+
+    kwargs = {}
+    for name in names:
+        view = getattr(pattern.callback, "cls", None)
+        queryset = getattr(view, "queryset", None)
+        if name == "pk" and queryset is not None:
+            model = queryset.model
+            if model is not Story:
+                kwargs[name] = model.objects.values_list(
+                    "pk", flat=True
+                ).first()
+                if kwargs[name] is None:
+                    return None
+                continue
+        kwargs[name] = found["item"]
+    return kwargs
+
+
+def paths(found: dict) -> dict[str, str | None]:
+    """
+    The path of every endpoint measured, by name; `None` for the \
+        routes that could not be filled.
+    """
+    routes = {}
+    for pattern in api_urls.urlpatterns:
+        if not isinstance(pattern, URLPattern) or not pattern.name:
+            continue
+        kwargs = _kwargs(pattern, found)
+        routes[pattern.name] = (
+            None if kwargs is None else reverse(pattern.name, kwargs=kwargs)
+        )
+        if pattern.name in SLICES and routes[pattern.name]:
+            routes[pattern.name] += f"?{SLICES[pattern.name]}"
+    for name, (route, query) in VARIANTS.items():
+        if routes.get(route):
+            routes[name] = f"{routes[route]}?{query.format(**found)}"
+    for name, path in PAGES.items():
+        routes[name] = path.format(**found)
+    return routes
+
+
+def percentiles(seconds: list[float]) -> dict:
+    """The `PERCENTILES` of request durations, in milliseconds."""
+    if len(seconds) < 2:
+        seconds = seconds * 2
+    cuts = statistics.quantiles(seconds, n=100, method="inclusive")
+    return {f"p{p}_ms": cuts[p - 1] * 1000 for p in PERCENTILES}
+
+
+def _timed(app: WSGIHandler, path: str, requests: int, cold: bool):
+    seconds, statuses = [], set()
+    for _ in range(requests):
+        if cold:
+            cache.bump_data_version()
+        started = time.perf_counter()
+        statuses.add(wsgi_get(app, path, 0))
+        seconds.append(time.perf_counter() - started)
+    return {"status": sorted(statuses), **percentiles(seconds)}
+
+
+def measure_path(app: WSGIHandler, path: str, requests: int) -> dict:
+    counter = QueryCounter()
+    cache.bump_data_version()
+    with connection.execute_wrapper(counter):
+        wsgi_get(app, path, 0)
+
+    cache.bump_data_version()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        wsgi_get(app, path, 0)
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "cold": _timed(app, path, requests, cold=True),
+        "warm": _timed(app, path, requests, cold=False),
+        "queries": counter.count,
+        "memory": {
+            "peak_kib": (peak - before) / 1024,
+            "retained_kib": (current - before) / 1024,
+        },
+    }
+
+
+def run(sizes=(100,), **options) -> dict:
+    found = samples()
+    app = WSGIHandler()
+    results = {
+        "meta": {
+            "revision": _revision(),
+            "database": connection.vendor,
+            "items": Item.objects.count(),
+            "at": timezone.now().isoformat(),
+        }
+    }
+    for name, path in paths(found).items():
+        if path is None:
+            results[name] = {"skipped": "no rows to point it at"}
+            continue
+        results[name] = {"path": path}
+        for requests in sizes:
+            results[name][requests] = measure_path(app, path, requests)
+    return results
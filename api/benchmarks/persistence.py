@@ -0,0 +1,33 @@
+"""
+Compares per-item saves with batched upserts.
+
+    python manage.py benchmark persistence --sizes 10000 100000
+"""
+from __future__ import annotations
+
+from api.benchmarks import measure
+from api.lib import persistence
+from api.lib.synthetic import SyntheticDataset
+
+
+def run(sizes=(10_000, 100_000), **options) -> dict:
+    results = {}
+    for size in sizes:
+        items = list(SyntheticDataset(size=size).items.values())
+        per_item, bulk = {}, {}
+
+        with measure(per_item):
+            for item in items:
+                persistence.save_item(item)
+
+        with measure(bulk):
+            persistence.save_items(items)
+
+        for result in (per_item, bulk):
+            result["items_per_sec"] = size / result["seconds"]
+        results[size] = {
+            "per_item": per_item,
+            "bulk": bulk,
+            "speedup": per_item["seconds"] / bulk["seconds"],
+        }
+    return results
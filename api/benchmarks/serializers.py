@@ -0,0 +1,90 @@
+"""
+Compares DRF serializers with their `RowSerializer` fast path, \
+    on pages of the list endpoints.
+
+    python manage.py benchmark serializers --sizes 100 1000
+
+Sizes are rows per page. Each page is fetched and rendered to \
+    JSON `ROUNDS` times both ways, timing the two steps apart: \
+        with `depth`, DRF's render step includes the queries of \
+            the related rows. The bodies must be identical. Run it \
+                against a populated database.
+"""
+from __future__ import annotations
+
+import time
+
+from rest_framework.renderers import JSONRenderer
+
+from api.benchmarks import measure
+from api.lib.rows import row_serializer
+from api.models.models import Comment
+from api.models.models import Item
+from api.models.models import Job
+from api.models.models import Story
+from api.serializers import BaseItemSerializer
+from api.serializers import CommentSerializer
+from api.serializers import JobSerializer
+from api.serializers import StorySerializer
+
+
+ROUNDS = 20
+"""Renders of each page measured, both ways."""
+
+PAGES = {
+    "news": (Item.objects.order_by("time", "id"), BaseItemSerializer),
+    "stories": (Story.objects.order_by("time", "id"), StorySerializer),
+    "comments": (Comment.objects.order_by("id"), CommentSerializer),
+    "jobs": (Job.objects.order_by("id"), JobSerializer),
+}
+"""The querysets and serializers of the list endpoints."""
+
+
+def _time(fetch, render) -> dict:
+    result = {"fetch": 0.0, "render": 0.0}
+    with measure(result):
+        for _ in range(ROUNDS):
+            started = time.perf_counter()
+            page = fetch()
+            fetched = time.perf_counter()
+            body = render(page)
+            result["fetch"] += fetched - started
+            result["render"] += time.perf_counter() - fetched
+    return {
+        "fetch_ms": result["fetch"] / ROUNDS * 1000,
+        "render_ms": result["render"] / ROUNDS * 1000,
+        "queries": result["queries"] / ROUNDS,
+        "body": body,
+    }
+
+
+def run(sizes=(100,), **options) -> dict:
+    renderer = JSONRenderer()
+    results = {}
+    for name, (queryset, serializer_class) in PAGES.items():
+        rows = row_serializer(serializer_class)
+        results[name] = {}
+        for size in sizes:
+            drf = _time(
+                lambda: list(queryset[:size]),
+                lambda page: renderer.render(
+                    serializer_class(page, many=True).data
+                ),
+            )
+            fast = _time(
+                lambda: list(rows.values(queryset)[:size]),
+                lambda page: renderer.render(rows.render_many(page)),
+            )
+            identical = drf.pop("body") == fast.pop("body")
+            total = {
+                way: result["fetch_ms"] + result["render_ms"]
+                for way, result in (("drf", drf), ("rows", fast))
+            }
+            results[name][size] = {
+                "drf": drf,
+                "rows": fast,
+                "identical": identical,
+                "render_speedup": drf["render_ms"] / fast["render_ms"],
+                "speedup": total["drf"] / total["rows"],
+            }
+    return results
@@ -0,0 +1,174 @@
+"""
+Compares the throughput of the read endpoints served by the sync \
+    views over WSGI and by the async views over ASGI.
+
+Both applications are driven in process, without a server or \
+    sockets: WSGI requests are handled by `THREADS` worker threads, \
+        like a threaded WSGI server would, ASGI requests by tasks on \
+            one event loop. Every simulated client takes `CLIENT_DELAY` \
+                seconds to receive a body, which holds a WSGI worker \
+                    for that long but only suspends a coroutine under ASGI.
+
+    python manage.py benchmark asgi --sizes 10 100 1000
+
+Sizes are numbers of concurrent clients, each making `ROUNDS` \
+    requests. Run it against a populated database, with \
+        `ASYNC_VIEWS_ENABLED` set before Django 4.1.
+"""
+from __future__ import annotations
+
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from wsgiref.util import setup_testing_defaults
+
+from django.conf import settings
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+
+from api.models.models import Comment
+from api.models.models import Story
+
+
+THREADS = 8
+"""Worker threads of the WSGI server."""
+
+CLIENT_DELAY = 0.2
+"""Seconds each client takes to receive a response body."""
+
+ROUNDS = 3
+"""Requests made by each client."""
+
+ENDPOINTS = {
+    "news": ("/api/v1/news/", "/api/v1/async/news/"),
+    "item": ("/api/v1/news/{item}", "/api/v1/async/news/{item}"),
+    "stories": ("/api/v1/stories/", "/api/v1/async/stories/"),
+    "story": ("/api/v1/stories/{item}/", "/api/v1/async/stories/{item}"),
+    "thread": (None, "/api/v1/async/items/{item}/comments"),
+}
+"""Paths of the sync and the async version of each endpoint."""
+
+
+def _host() -> str:
+    hosts = [host for host in settings.ALLOWED_HOSTS if "*" not in host]
+    return hosts[0].lstrip(".") if hosts else "localhost"
+
+
+def wsgi_get(app: WSGIHandler, path: str, delay: float) -> int:
+    """GETs `path` from a WSGI application, as a slow client."""
+    path, _, query = path.partition("?")
+    environ = {
+        "REQUEST_METHOD": "GET",
+        "PATH_INFO": path,
+        "QUERY_STRING": query,
+        "HTTP_HOST": _host(),
+    }
+    setup_testing_defaults(environ)
+    statuses = []
+
+    def start_response(status, headers, exc_info=None):
+        statuses.append(int(status[:3]))
+
+    body = app(environ, start_response)
+    try:
+        for _ in body:
+            time.sleep(delay)
+    finally:
+        body.close()
+    return statuses[0]
+
+
+async def asgi_get(app: ASGIHandler, path: str, delay: float) -> int:
+    """GETs `path` from an ASGI application, as a slow client."""
+    path, _, query = path.partition("?")
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": query.encode(),
+        "root_path": "",
+        "headers": [(b"host", _host().encode())],
+        "client": ("127.0.0.1", 0),
+        "server": ("127.0.0.1", 80),
+    }
+    statuses = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            statuses.append(message["status"])
+        elif message["type"] == "http.response.body":
+            await asyncio.sleep(delay)
+
+    await app(scope, receive, send)
+    return statuses[0]
+
+
+def _report(statuses: list[int], seconds: float) -> dict:
+    return {
+        "requests": len(statuses),
+        "errors": sum(status != 200 for status in statuses),
+        "seconds": seconds,
+        "requests_per_sec": len(statuses) / seconds if seconds else 0.0,
+    }
+
+
+def measure_wsgi(path: str, clients: int) -> dict:
+    app = WSGIHandler()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(THREADS) as pool:
+        statuses = list(
+            pool.map(
+                lambda _: wsgi_get(app, path, CLIENT_DELAY),
+                range(clients * ROUNDS),
+            )
+        )
+    return _report(statuses, time.perf_counter() - started)
+
+
+def measure_asgi(path: str, clients: int) -> dict:
+    app = ASGIHandler()
+
+    async def client():
+        return [await asgi_get(app, path, CLIENT_DELAY) for _ in range(ROUNDS)]
+
+    async def main():
+        started = time.perf_counter()
+        done = await asyncio.gather(*(client() for _ in range(clients)))
+        statuses = [status for statuses in done for status in statuses]
+        return _report(statuses, time.perf_counter() - started)
+
+    return asyncio.run(main())
+
+
+def run(sizes=(10, 100, 1000), **options) -> dict:
+    if not settings.ASYNC_VIEWS_ENABLED:
+        raise ValueError("The benchmark needs ASYNC_VIEWS_ENABLED.")
+    story = (
+        Comment.objects.exclude(root=None)
+        .values_list("root", flat=True)
+        .first()
+    ) or Story.objects.values_list("id", flat=True).first()
+    if story is None:
+        raise ValueError("The benchmark needs a populated database.")
+
+    results = {}
+    for name, (sync_path, async_path) in ENDPOINTS.items():
+        results[name] = {}
+        for clients in sizes:
+            result = {}
+            if sync_path:
+                result["wsgi"] = measure_wsgi(
+                    sync_path.format(item=story), clients
+                )
+            result["asgi"] = measure_asgi(
+                async_path.format(item=story), clients
+            )
+            results[name][clients] = result
+    return results
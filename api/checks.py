@@ -0,0 +1,53 @@
+from __future__ import annotations
+
+import django
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.checks import register
+from django.core.checks import Tags
+from django.core.checks import Warning
+
+
+@register(Tags.caches)
+def check_response_cache(app_configs, **kwargs) -> list[Warning]:
+    """
+    Warns when the response cache is on over a per-process cache, \
+        where syncs in the Celery worker can't invalidate it.
+    """
+    if not settings.RESPONSE_CACHE_ENABLED:
+        return []
+    if not isinstance(caches[settings.RESPONSE_CACHE_ALIAS], LocMemCache):
+        return []
+    return [
+        Warning(
+            "The response cache is on over the local memory cache.",
+            hint=(
+                "Each process then has its own data version, and web "
+                "workers serve stale pages after a sync. Set REDIS_URL, "
+                "or RESPONSE_CACHE_ENABLED=False."
+            ),
+            id="api.W001",
+        )
+    ]
+
+
+@register()
+def check_async_views(app_configs, **kwargs) -> list[Warning]:
+    """
+    Warns when the async views are routed on a Django that runs \
+        their queries on a single thread, see `api.lib.aio`.
+    """
+    if not settings.ASYNC_VIEWS_ENABLED or django.VERSION >= (4, 1):
+        return []
+    return [
+        Warning(
+            "The async views are on, and Django < 4.1 runs all their "
+            "queries on one thread per process.",
+            hint=(
+                "Concurrent async requests wait for each other's queries. "
+                "Upgrade to Django 4.1, or set ASYNC_VIEWS_ENABLED=False."
+            ),
+            id="api.W002",
+        )
+    ]
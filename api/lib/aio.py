@@ -0,0 +1,47 @@
+"""
+Awaitable queryset evaluation for the async views.
+
+Django 4.1 added async queryset methods (`async for`, `afirst`, \
+    ...). On older releases the same calls run the query through \
+        `sync_to_async`, in the thread Django keeps for the ORM, so \
+            the async views are written once against this module.
+
+That thread is a single one per process (`thread_sensitive=True`): \
+    on Django 4.0 the queries of every concurrent async request, \
+        and of the sync views run under ASGI, wait for each other \
+            there. Running them with `thread_sensitive=False` would \
+                open a connection per executor thread that Django \
+                    never closes, so the async routes are off before \
+                        Django 4.1 unless `ASYNC_VIEWS_ENABLED` is set, \
+                            and only then worth it for slow clients.
+
+Usage:
+
+    items = await aio.fetch(Item.objects.filter(type="story")[:30])
+    item = await aio.first(Item.objects.filter(id=8863))
+"""
+from __future__ import annotations
+
+from typing import Any
+
+import django
+from asgiref.sync import sync_to_async
+from django.db.models import QuerySet
+
+
+ASYNC_ORM = django.VERSION >= (4, 1)
+"""Whether querysets can be evaluated natively from a coroutine."""
+
+
+async def fetch(queryset: QuerySet) -> list:
+    """Evaluates `queryset` into a list."""
+    if ASYNC_ORM:
+        return [obj async for obj in queryset]
+    return await sync_to_async(list)(queryset)
+
+
+async def first(queryset: QuerySet) -> Any:
+    """The first row of `queryset`, or `None`."""
+    if ASYNC_ORM:
+        return await queryset.afirst()
+    return await sync_to_async(queryset.first)()
@@ -0,0 +1,228 @@
+"""
+Response cache for the list endpoints and the home page.
+
+Our data only changes when the collector commits a batch, so \
+    rendered pages are cached under their normalized query \
+        string and tagged with a global data version, which \
+            `persistence` bumps once each batch commits. Old entries \
+                are never deleted: they just stop matching the \
+                    version and age out of the cache.
+
+Serving a cached page costs a single round trip, as the version \
+    and the page are fetched together with `get_many`.
+
+The version must be shared by every process: the Celery worker \
+    bumps it, the web workers read it. With the local memory \
+        cache each process has its own, so the response cache is \
+            off unless `RESPONSE_CACHE_ENABLED` (on with `REDIS_URL`).
+
+Single items are revalidated by HTTP instead: their ETag and \
+    Last-Modified come from the digest and change time recorded \
+        at ingest (see `Item.digest`), see `ConditionalRetrieveMixin`.
+"""
+from __future__ import annotations
+
+import hashlib
+import time
+from datetime import datetime
+from typing import Any
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.http import HttpRequest
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.cache import quote_etag
+from django.utils.http import http_date
+from rest_framework.permissions import SAFE_METHODS
+
+from api.lib.rows import names
+
+
+VERSION_KEY = "data-version"
+
+HEADERS = ("Content-Type", "Link")
+"""Response headers stored along with the body."""
+
+
+def get_cache():
+    return caches[settings.RESPONSE_CACHE_ALIAS]
+
+
+def _initial_version() -> int:
+    # a restarted or evicted counter must not revive old entries
+    return time.time_ns()
+
+
+def data_version() -> int:
+    cache = get_cache()
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, _initial_version(), timeout=None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def bump_data_version() -> None:
+    """Invalidates every cached response."""
+    cache = get_cache()
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.add(VERSION_KEY, _initial_version(), timeout=None)
+
+
+def bump_on_commit() -> None:
+    """Bumps the data version once the current transaction commits."""
+    transaction.on_commit(bump_data_version)
+
+
+def response_key(request: HttpRequest) -> str:
+    """
+    Returns the cache key of a request: its path, its query \
+        parameters in sorted order and the formats it accepts.
+    """
+    params = sorted(
+        (key, value) for key, values in request.GET.lists() for value in values
+    )
+    raw = "\n".join(
+        [request.path, urlencode(params), request.META.get("HTTP_ACCEPT", "")]
+    )
+    return "response:" + hashlib.sha1(raw.encode()).hexdigest()
+
+
+def get_response(key: str) -> tuple[HttpResponse | None, int]:
+    """
+    Returns the cached response for `key`, if it is current, \
+        and the current data version.
+    """
+    if not settings.RESPONSE_CACHE_ENABLED:
+        return None, 0
+    cache = get_cache()
+    found = cache.get_many([VERSION_KEY, key])
+    version = found.get(VERSION_KEY)
+    if version is None:
+        return None, data_version()
+
+    entry = found.get(key)
+    if entry is None or entry["version"] != version:
+        return None, version
+    response = HttpResponse(entry["content"], status=entry["status"])
+    for header, value in entry["headers"].items():
+        response[header] = value
+    return response, version
+
+
+def set_response(key: str, response: HttpResponse, version: int) -> None:
+    """
+    Caches a rendered response under the data version read \
+        before it was computed, so that a response racing a sync \
+            is never served as current.
+    """
+    if not settings.RESPONSE_CACHE_ENABLED:
+        return
+    if response.status_code != 200 or response.streaming:
+        return
+    entry: dict[str, Any] = {
+        "version": version,
+        "status": response.status_code,
+        "content": response.content,
+        "headers": {
+            header: response[header]
+            for header in HEADERS
+            if response.has_header(header)
+        },
+    }
+    get_cache().set(key, entry, settings.RESPONSE_CACHE_TIMEOUT)
+
+
+def representation(request: HttpRequest) -> str | None:
+    """
+    The normalized `?fields=` of `request`, empty for all of them; \
+        `None` when `?expand=` nests related rows, which the \
+            digest of an item doesn't cover.
+    """
+    if names(request.GET.get("expand")):
+        return None
+    return ",".join(sorted(names(request.GET.get("fields")) or ()))
+
+
+def validators(
+    digest: str, changed_at: datetime | None, format: str, fields: str = ""
+) -> tuple[str, int | None, dict[str, str]]:
+    """
+    Returns the ETag and Last-Modified time of an item rendered \
+        in `format` with `fields` (see `representation`), and the \
+            response headers carrying them.
+    """
+    tag = f"{digest}-{format}"
+    if fields:
+        tag += "-" + hashlib.sha1(fields.encode()).hexdigest()[:12]
+    etag = quote_etag(tag)
+    last_modified = int(changed_at.timestamp()) if changed_at else None
+    headers = {"ETag": etag}
+    if last_modified is not None:
+        headers["Last-Modified"] = http_date(last_modified)
+    return etag, last_modified, headers
+
+
+class ResponseCacheMixin:
+    """
+    Caches the `list` responses of an API view, and invalidates \
+        the cache when the view writes.
+    """
+
+    def list(self, request, *args, **kwargs):
+        key = response_key(request)
+        cached, version = get_response(key)
+        if cached is not None:
+            return cached
+
+        response = super().list(request, *args, **kwargs)
+        response.add_post_render_callback(
+            lambda rendered: set_response(key, rendered, version)
+        )
+        return response
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        if request.method not in SAFE_METHODS and response.status_code < 400:
+            bump_on_commit()
+        return super().finalize_response(request, response, *args, **kwargs)
+
+
+class ConditionalRetrieveMixin:
+    """
+    Answers conditional `retrieve` requests (`If-None-Match`, \
+        `If-Modified-Since`) with a 304 from the item's digest \
+            and change time alone, before the serializer or the \
+                subtype query runs. Responses with `?expand=` are \
+                    always rendered.
+    """
+
+    def retrieve(self, request, *args, **kwargs):
+        fields = representation(request)
+        if fields is None:
+            return super().retrieve(request, *args, **kwargs)
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        version = (
+            self.filter_queryset(self.get_queryset())
+            .filter(**{self.lookup_field: self.kwargs[lookup_url_kwarg]})
+            .values_list("digest", "changed_at")
+            .first()
+        )
+        if version is None or not version[0]:
+            return super().retrieve(request, *args, **kwargs)
+
+        etag, last_modified, headers = validators(
+            *version, request.accepted_renderer.format, fields
+        )
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified
+        )
+        if response is None:
+            response = super().retrieve(request, *args, **kwargs)
+        for header, value in headers.items():
+            response[header] = value
+        return response
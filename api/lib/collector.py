@@ -0,0 +1,601 @@
+"""
+Asynchronous collector for the Hacker News v0 API.
+
+All requests made during a run go through one transport (an \
+    `aiohttp` connection pool, or a recording, see \
+        `api.lib.transport`), and at most `HACKER_NEWS_CONCURRENCY` \
+            of them are in flight at any time. Item ids are crawled \
+                breadth-first from a set of seeds, following `kids` \
+                    and `parts`.
+
+Scheduled runs are incremental: a `SyncCursor` remembers the \
+    last `maxitem` we collected and the ids that failed, so each \
+        run only fetches newer ids, those failed ones and a bounded \
+            slice of history. The story lists \
+                (`/topstories.json`, ...) are mirrored after each \
+                    run, see `api.lib.lists`.
+
+Every scheduled run is recorded as a `SyncRun`: the upstream \
+    response time percentiles and how long the run spent crawling, \
+        decoding and writing, to tell a slow network from a slow \
+            database.
+
+Usage:
+
+    async with HackerNewsCollector(concurrency=64) as collector:
+        items = await collector.crawl([8863])
+        print(collector.stats)
+"""
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import json
+import statistics
+import time
+from collections import Counter
+from datetime import timedelta
+from dataclasses import dataclass
+from dataclasses import field
+from itertools import chain
+from logging import getLogger
+from typing import Any
+from typing import Iterable
+from typing import TYPE_CHECKING
+
+import aiohttp
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import DatabaseError
+from django.db import transaction
+from django.utils import timezone
+
+from api.lib import lists
+from api.lib import persistence
+from api.lib import transport as transports
+from api.models.models import SyncCursor
+from api.models.models import SyncRun
+
+if TYPE_CHECKING:
+    from api.lib.profiles import ProfileFetcher
+
+
+logger = getLogger(__name__)
+
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+"""Upstream statuses worth retrying after a back off."""
+
+FAILED = object()
+"""Returned by `fetch_json` for failed requests, when asked to."""
+
+
+@dataclass
+class CrawlStats:
+    """
+    Counters for a single crawl.
+
+    Arguments:
+        fetched (int) - items successfully fetched.
+
+        failed (int) - requests that gave up after all retries.
+
+        retries (int) - requests that were retried.
+
+        latencies (list) - seconds taken by each upstream response.
+
+        fetching (float) - wall time spent crawling.
+
+        parsing (float) - time spent decoding responses.
+
+        writing (float) - time spent storing what was fetched.
+
+        rows (Counter) - rows written, by item type (and `user` \
+            for profiles), as counted by `api.lib.persistence`.
+
+        backlog (int) - ids left to collect, when known.
+    """
+
+    fetched: int = 0
+    failed: int = 0
+    retries: int = 0
+    started: float = field(default_factory=time.perf_counter)
+    finished: float | None = None
+    latencies: list[float] = field(default_factory=list)
+    fetching: float = 0.0
+    parsing: float = 0.0
+    writing: float = 0.0
+    rows: Counter = field(default_factory=Counter)
+    backlog: int | None = None
+
+    @property
+    def elapsed(self) -> float:
+        end = self.finished or time.perf_counter()
+        return end - self.started
+
+    @property
+    def items_per_sec(self) -> float:
+        elapsed = self.elapsed
+        return self.fetched / elapsed if elapsed else 0.0
+
+    def latency_percentiles(self) -> dict[int, float | None]:
+        """The 50th, 95th and 99th response times, in milliseconds."""
+        if not self.latencies:
+            return dict.fromkeys((50, 95, 99))
+        cuts = statistics.quantiles(
+            self.latencies * (2 if len(self.latencies) == 1 else 1),
+            n=100,
+            method="inclusive",
+        )
+        return {p: cuts[p - 1] * 1000 for p in (50, 95, 99)}
+
+    def wrote(self, started: float, rows: dict[str, int]) -> None:
+        """
+        Accounts for a write that began at `started` and stored \
+            `rows`, by type.
+        """
+        self.writing += time.perf_counter() - started
+        self.rows.update(rows)
+
+    def __str__(self) -> str:
+        return (
+            f"{self.fetched} items in {self.elapsed:.2f}s "
+            f"({self.items_per_sec:.1f} items/sec), "
+            f"{self.retries} retries, {self.failed} failed; "
+            f"crawling {self.fetching:.2f}s, parsing {self.parsing:.2f}s, "
+            f"writing {self.writing:.2f}s"
+        )
+
+
+def record_run(
+    kind: str, stats: CrawlStats, started_at, error: str = ""
+) -> SyncRun:
+    """
+    Stores the stats of a finished run, dropping the runs older \
+        than `SYNC_RUN_RETENTION` days.
+    """
+    p50, p95, p99 = stats.latency_percentiles().values()
+    run = SyncRun.objects.create(
+        kind=kind,
+        started_at=started_at,
+        seconds=stats.elapsed,
+        fetched=stats.fetched,
+        failed=stats.failed,
+        retries=stats.retries,
+        requests=len(stats.latencies),
+        fetch_p50=p50,
+        fetch_p95=p95,
+        fetch_p99=p99,
+        fetch_seconds=stats.fetching,
+        parse_seconds=stats.parsing,
+        write_seconds=stats.writing,
+        rows=dict(stats.rows),
+        backlog=stats.backlog,
+        error=error[:200],
+    )
+    cutoff = timezone.now() - timedelta(days=settings.SYNC_RUN_RETENTION)
+    SyncRun.objects.filter(started_at__lt=cutoff).delete()
+    return run
+
+
+class HackerNewsCollector:
+    """
+    Crawls items from the Hacker News API.
+
+    Must be used as an async context manager, which owns the \
+        shared transport.
+
+    Args:
+        base_url (str) - API root, defaults to `HACKER_NEWSAPI_URI`.
+
+        concurrency (int) - maximum number of in-flight requests.
+
+        timeout (float) - per request timeout, in seconds.
+
+        retries (int) - attempts per request after the first one.
+
+        max_items (int) - upper bound on items fetched per crawl.
+
+        transport (str) - `passthrough`, `record` or `replay`, \
+            defaults to `HACKER_NEWS_TRANSPORT`, see \
+                `api.lib.transport`.
+
+        recording (str) - store recorded to or replayed from, \
+            defaults to `HACKER_NEWS_RECORDING`.
+    """
+
+    backoff = 0.25
+    """Base delay (seconds) of the exponential retry back off."""
+
+    max_retry_after = 60.0
+    """Longest `Retry-After` delay (seconds) waited for."""
+
+    def __init__(
+        self,
+        base_url: str | None = None,
+        concurrency: int | None = None,
+        timeout: float | None = None,
+        retries: int | None = None,
+        max_items: int | None = None,
+        transport: str | None = None,
+        recording: str | None = None,
+    ):
+        self.base_url = (base_url or settings.HACKER_NEWSAPI_URI).rstrip("/")
+        self.concurrency = concurrency or settings.HACKER_NEWS_CONCURRENCY
+        self.timeout = timeout or settings.HACKER_NEWS_TIMEOUT
+        self.retries = (
+            settings.HACKER_NEWS_RETRIES if retries is None else retries
+        )
+        self.max_items = max_items or settings.HACKER_NEWS_MAX_ITEMS
+        self.mode = transport
+        self.recording = recording
+        self.transport: transports.Transport | None = None
+        self.stats = CrawlStats()
+        self.failed_ids: set[int] = set()
+        self.profiles: ProfileFetcher | None = None
+
+    async def __aenter__(self) -> HackerNewsCollector:
+        self.transport = transports.get_transport(
+            self.base_url,
+            self.concurrency,
+            self.timeout,
+            mode=self.mode,
+            recording=self.recording,
+        )
+        await self.transport.__aenter__()
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.transport.__aexit__(*exc_info)
+        self.transport = None
+
+    async def fetch_json(self, path: str, failed: Any = None) -> Any:
+        """
+        GETs `path` relative to the API root, retrying transient \
+            failures with an exponential back off, or after the \
+                `Retry-After` delay of throttled requests.
+
+        Returns:
+            Any: the decoded body, or `failed` if the request \
+                failed or its body wasn't JSON.
+        """
+        url = f"{self.base_url}/{path}"
+        wait = 0.0
+
+        for attempt in range(self.retries + 1):
+            if attempt:
+                self.stats.retries += 1
+                await asyncio.sleep(
+                    max(wait, self.backoff * 2 ** (attempt - 1))
+                )
+                wait = 0.0
+            started = time.perf_counter()
+            try:
+                status, body = await self.transport.get(path)
+            except transports.Throttled as err:
+                wait = min(err.retry_after, self.max_retry_after)
+                logger.warning(f"Retrying {url} in {wait}s: {err.status}")
+                continue
+            except (aiohttp.ClientError, asyncio.TimeoutError) as err:
+                logger.warning(f"Retrying {url}: {err!r}")
+                continue
+            decoding = time.perf_counter()
+            self.stats.latencies.append(decoding - started)
+            if status == 200:
+                try:
+                    return json.loads(body)
+                except ValueError as err:
+                    # malformed or truncated, not worth retrying
+                    logger.error(f"Error decoding {url}: {err!r}")
+                    break
+                finally:
+                    self.stats.parsing += time.perf_counter() - decoding
+            if status not in RETRY_STATUSES:
+                logger.error(f"Error fetching {url}: {status}")
+                break
+            logger.warning(f"Retrying {url}: {status}")
+
+        self.stats.failed += 1
+        return failed
+
+    async def fetch_item(self, item_id: int) -> dict[str, Any] | None:
+        """
+        The payload of `item_id`, `None` if it doesn't exist or \
+            failed, in which case it is added to `failed_ids`.
+        """
+        item = await self.fetch_json(f"item/{item_id}.json", FAILED)
+        if item is FAILED:
+            self.failed_ids.add(item_id)
+            return None
+        if item is not None and not isinstance(item, dict):
+            logger.error(f"Item {item_id} is not an object: {item!r:.80}")
+            self.stats.failed += 1
+            self.failed_ids.add(item_id)
+            return None
+        return item
+
+    async def crawl(
+        self, seeds: Iterable[int], expand: bool = True
+    ) -> list[dict[str, Any]]:
+        """
+        Fetches `seeds` and, when `expand` is set, everything \
+            reachable from them through `kids` and `parts` (up \
+                to `max_items` in total).
+
+        Ids are processed in breadth-first order by a pool of \
+            `concurrency` workers sharing one queue; an id that \
+                fails in any way is counted in `stats.failed` and \
+                    skipped.
+
+        Returns:
+            list: the fetched item payloads, in completion order.
+        """
+        queue: asyncio.Queue[int] = asyncio.Queue()
+        seen: set[int] = set()
+        items: list[dict[str, Any]] = []
+
+        def enqueue(ids: Iterable[int], bounded: bool = True) -> None:
+            for item_id in ids:
+                if bounded and len(seen) >= self.max_items:
+                    return
+                if item_id not in seen:
+                    seen.add(item_id)
+                    queue.put_nowait(item_id)
+
+        async def worker() -> None:
+            while True:
+                item_id = await queue.get()
+                try:
+                    item = await self.fetch_item(item_id)
+                    if item:
+                        items.append(item)
+                        self.stats.fetched += 1
+                        if expand:
+                            enqueue(
+                                chain(
+                                    item.get("kids") or (),
+                                    item.get("parts") or (),
+                                )
+                            )
+                except Exception:
+                    # a bad id must not take its worker, and the
+                    # `queue.join()` waiting on it, down with it
+                    logger.exception(f"Error collecting item {item_id}.")
+                    self.stats.failed += 1
+                    self.failed_ids.add(item_id)
+                finally:
+                    queue.task_done()
+
+        started = time.perf_counter()
+        enqueue(seeds, bounded=False)
+        workers = [
+            asyncio.create_task(worker()) for _ in range(self.concurrency)
+        ]
+        try:
+            await queue.join()
+        finally:
+            for task in workers:
+                task.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+            self.stats.finished = time.perf_counter()
+            self.stats.fetching += self.stats.finished - started
+
+        return items
+
+    async def sync(self, lists: bool = False) -> list[dict[str, Any]]:
+        """
+        Collects the ids above the stored watermark, one slice of \
+            older ids and the ids previous runs failed to collect, \
+                then stores them and moves the cursor forward in \
+                    the same transaction. Ids that fail are kept on \
+                        the cursor for the next runs.
+
+        Runs lease the cursor, see `SyncCursor.acquire`: a run \
+            starting while another holds it does nothing. With \
+                `lists`, the story lists are mirrored under the same \
+                    lease, see `sync_lists`.
+
+        Returns:
+            list: the fetched item payloads.
+        """
+        maxitem = await self.fetch_json("maxitem.json")
+        if not maxitem:
+            logger.error("Could not read maxitem, skipping sync.")
+            return []
+
+        cursor = await sync_to_async(SyncCursor.acquire)(
+            SyncCursor.ITEMS,
+            timedelta(seconds=settings.HACKER_NEWS_SYNC_LEASE),
+        )
+        if cursor is None:
+            logger.warning("Another sync is running, skipping.")
+            return []
+        try:
+            items = await self._sync(cursor, maxitem)
+            if lists:
+                await self.sync_lists()
+            return items
+        finally:
+            await sync_to_async(cursor.release)()
+
+    async def _sync(
+        self, cursor: SyncCursor, maxitem: int
+    ) -> list[dict[str, Any]]:
+        retry_ids = cursor.retry_ids[: self.max_items]
+        new_ids, backfill_ids = cursor.advance(
+            maxitem, self.max_items, settings.HACKER_NEWS_BACKFILL_SLICE
+        )
+        logger.info(
+            f"Collecting {len(new_ids)} new, {len(backfill_ids)} backfill "
+            f"and {len(retry_ids)} retried items."
+        )
+
+        attempted = list(chain(new_ids, backfill_ids, retry_ids))
+        items = await self.crawl(attempted, expand=False)
+        given_up = cursor.requeue(attempted, self.failed_ids)
+        if given_up:
+            logger.error(f"Giving up on items {given_up}.")
+        self.stats.backlog = (
+            maxitem - cursor.high_water + cursor.backfill + len(cursor.retry)
+        )
+
+        started = time.perf_counter()
+        rows = await sync_to_async(self._commit)(items, cursor)
+        self.stats.wrote(started, rows)
+        return items
+
+    @staticmethod
+    @transaction.atomic
+    def _commit(items: list[dict[str, Any]], cursor: SyncCursor) -> Counter:
+        rows = persistence.save_items(items)
+        cursor.save(
+            update_fields=["high_water", "backfill", "retry", "updated"]
+        )
+        return rows
+
+    async def sync_lists(self) -> dict[str, list[int]]:
+        """
+        Mirrors the upstream story lists, see `api.lib.lists`.
+
+        Listed items we haven't collected yet are fetched first, \
+            then the new snapshots are diffed against the stored \
+                ones in one transaction. Lists that couldn't be read \
+                    keep their previous snapshot.
+
+        Scheduled runs call it through `sync(lists=True)`, so that \
+            only the run holding the cursor lease writes the lists.
+
+        Returns:
+            dict: the fetched lists, by name.
+        """
+        names = list(lists.LISTS)
+        fetched = await asyncio.gather(
+            *(self.fetch_json(f"{lists.LISTS[name]}.json") for name in names)
+        )
+        snapshots = {
+            name: ids for name, ids in zip(names, fetched) if ids is not None
+        }
+        ids = await sync_to_async(persistence.missing)(
+            chain.from_iterable(snapshots.values())
+        )
+        logger.info(
+            f"Collecting {len(snapshots)} lists, {len(ids)} new items."
+        )
+
+        items = await self.crawl(ids, expand=False)
+        started = time.perf_counter()
+        rows = await sync_to_async(self._commit_lists)(items, snapshots)
+        self.stats.wrote(started, rows)
+        return snapshots
+
+    @staticmethod
+    @transaction.atomic
+    def _commit_lists(
+        items: list[dict[str, Any]], snapshots: dict[str, list[int]]
+    ) -> Counter:
+        rows = persistence.save_items(items)
+        for name, ids in snapshots.items():
+            lists.store(name, ids)
+        return rows
+
+    async def fetch_profiles(self, uids: Iterable[str]) -> list[dict]:
+        """
+        Fetches the profiles of `uids` concurrently, through the \
+            `ProfileFetcher` of this collector: requests are shared \
+                with the other fetches in flight, and the fetched \
+                    profiles are cached. Profiles that can't be \
+                        fetched are left out, keeping their stored row.
+        """
+        from api.lib.profiles import ProfileFetcher
+
+        if self.profiles is None:
+            self.profiles = ProfileFetcher(self)
+        found = await self.profiles.fetch_many(uids, refresh=True)
+        return list(found.values())
+
+    async def refresh(self, window: timedelta | None = None) -> tuple:
+        """
+        Applies the change feed on `/updates.json`.
+
+        Items and profiles refreshed within `window` are skipped, \
+            the rest are re-fetched concurrently and stored in one \
+                transaction.
+
+        Returns:
+            tuple: the fetched item and profile payloads.
+        """
+        if window is None:
+            window = timedelta(seconds=settings.HACKER_NEWS_REFRESH_WINDOW)
+
+        updates = await self.fetch_json("updates.json")
+        if not updates:
+            logger.error("Could not read the change feed, skipping.")
+            return [], []
+
+        item_ids, uids = await sync_to_async(persistence.stale)(
+            updates.get("items") or [], updates.get("profiles") or [], window
+        )
+        logger.info(
+            f"Refreshing {len(item_ids)} items and {len(uids)} profiles."
+        )
+
+        items, profiles = await asyncio.gather(
+            self.crawl(item_ids, expand=False), self.fetch_profiles(uids)
+        )
+        started = time.perf_counter()
+        rows, users = await sync_to_async(persistence.save_changes)(
+            items, profiles
+        )
+        self.stats.wrote(started, {**rows, "user": users} if users else rows)
+        return items, profiles
+
+    @contextlib.asynccontextmanager
+    async def recorded(self, kind: str):
+        """
+        Records the stats of the run done in the block as a \
+            `SyncRun`, failed or not.
+        """
+        started_at = timezone.now()
+        error = ""
+        try:
+            yield self.stats
+        except Exception as err:
+            error = repr(err)
+            raise
+        finally:
+            self.stats.finished = time.perf_counter()
+            try:
+                await sync_to_async(record_run)(
+                    kind, self.stats, started_at, error
+                )
+            except DatabaseError:
+                logger.exception(f"Could not record the {kind} run.")
+
+    @staticmethod
+    def save_to_db(item: dict[str, Any]):
+        """Creates or updates a single item from its API payload."""
+        return persistence.save_item(item)
+
+    @classmethod
+    async def changes(cls, **options) -> CrawlStats:
+        """
+        Applies the change feed once, see `HackerNewsCollector.refresh`.
+        """
+        async with cls(**options) as collector:
+            async with collector.recorded(SyncRun.CHANGES):
+                await collector.refresh()
+
+        logger.info(f"Refreshed {collector.stats}")
+        return collector.stats
+
+    @classmethod
+    async def main(cls, **options) -> CrawlStats:
+        """
+        Runs one incremental sync, see `HackerNewsCollector.sync`, \
+            and mirrors the story lists.
+        """
+        async with cls(**options) as collector:
+            async with collector.recorded(SyncRun.SYNC):
+                await collector.sync(lists=True)
+
+        logger.info(f"Collected {collector.stats}")
+        return collector.stats
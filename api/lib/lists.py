@@ -0,0 +1,141 @@
+"""
+Mirrors the upstream story lists (top, new, best, ask, show, job).
+
+Each sync fetches the lists as ordered snapshots of item ids and \
+    diffs them against the stored ones, so that only the slots that \
+        appeared, moved or dropped out are written, see `store`.
+
+Ranks are looked up from a per-process `{item id: rank}` map of \
+    each list, so `rank_of` is a dict lookup. A map is reloaded \
+        when the data version of the response cache changes (which \
+            `store` bumps), or after `LIST_RANKS_TTL` seconds: with \
+                the local memory cache, a web worker never sees the \
+                    bumps of the Celery worker.
+
+Usage:
+
+    lists.store("top", [8863, 8265, ...])
+    lists.rank_of("top", 8863)   # 1
+"""
+from __future__ import annotations
+
+import time
+from typing import Iterable
+
+from django.conf import settings
+from django.db import transaction
+
+from api.lib import cache
+from api.models.models import ListEntry
+
+
+LISTS = ListEntry.LISTS
+
+_ranks: dict[str, tuple[int, float, dict[int, int]]] = {}
+"""Rank maps of each list, with the data version and the monotonic \
+    time they were read at."""
+
+
+def snapshot(ids: Iterable[int]) -> dict[int, int]:
+    """
+    Returns the `{item id: rank}` map of an upstream list, \
+        keeping the first slot of ids listed twice.
+    """
+    ranks: dict[int, int] = {}
+    for item_id in ids:
+        ranks.setdefault(item_id, len(ranks) + 1)
+    return ranks
+
+
+def diff(
+    previous: dict[int, int], current: dict[int, int]
+) -> tuple[dict[int, int], dict[int, int], list[int]]:
+    """
+    Compares two snapshots of a list.
+
+    Returns:
+        tuple: the new slots and the moved ones, as `{item id: \
+            rank}`, and the ids that dropped out of the list.
+    """
+    added, moved = {}, {}
+    for item_id, rank in current.items():
+        old = previous.get(item_id)
+        if old is None:
+            added[item_id] = rank
+        elif old != rank:
+            moved[item_id] = rank
+    removed = [item_id for item_id in previous if item_id not in current]
+    return added, moved, removed
+
+
+@transaction.atomic
+def store(name: str, ids: Iterable[int]) -> int:
+    """
+    Replaces the stored snapshot of list `name` with `ids`, \
+        writing only the slots that changed.
+
+    Returns:
+        int: number of slots written.
+    """
+    entries = {
+        entry.item_id: entry
+        for entry in ListEntry.objects.filter(name=name).only(
+            "pk", "item_id", "rank"
+        )
+    }
+    added, moved, removed = diff(
+        {item_id: entry.rank for item_id, entry in entries.items()},
+        snapshot(ids),
+    )
+
+    if removed:
+        ListEntry.objects.filter(
+            pk__in=[entries[item_id].pk for item_id in removed]
+        ).delete()
+    if moved:
+        for item_id, rank in moved.items():
+            entries[item_id].rank = rank
+        ListEntry.objects.bulk_update(
+            [entries[item_id] for item_id in moved], ["rank"], batch_size=500
+        )
+    if added:
+        ListEntry.objects.bulk_create(
+            ListEntry(name=name, rank=rank, item_id=item_id)
+            for item_id, rank in added.items()
+        )
+
+    written = len(added) + len(moved) + len(removed)
+    if written:
+        cache.bump_on_commit()
+    return written
+
+
+def ranks(name: str) -> dict[int, int]:
+    """
+    Returns the `{item id: rank}` map of list `name`, read from \
+        the database once per data version, and at least every \
+            `LIST_RANKS_TTL` seconds.
+    """
+    version, now = cache.data_version(), time.monotonic()
+    memo = _ranks.get(name)
+    if (
+        memo is None
+        or memo[0] != version
+        or now - memo[1] >= settings.LIST_RANKS_TTL
+    ):
+        memo = (
+            version,
+            now,
+            dict(
+                ListEntry.objects.filter(name=name)
+                .order_by()
+                .values_list("item_id", "rank")
+            ),
+        )
+        _ranks[name] = memo
+    return memo[2]
+
+
+def rank_of(name: str, item_id: int) -> int | None:
+    """The rank of an item in list `name`, if it is listed."""
+    return ranks(name).get(item_id)
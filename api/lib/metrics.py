@@ -0,0 +1,344 @@
+"""
+Per-route request metrics, exposed in the Prometheus text format.
+
+`api.middleware.metrics_middleware` records, for every request, \
+    under the route it resolved to:
+
+    hn_request_duration_seconds      latency, by method and status
+    hn_request_queries               SQL queries made
+    hn_request_db_duration_seconds   time spent in those queries
+    hn_serializer_duration_seconds   time spent rendering the \
+                                         data of list and retrieve \
+                                             responses (the queries \
+                                                 it triggers included)
+
+Serialization is timed by the views, in `serializing` blocks: \
+    `SerializerMetricsMixin` for views on DRF serializers, \
+        `RowReadMixin` and the async views for compiled rows.
+
+Each worker aggregates into its own `registry`, under a lock and \
+    with no I/O, and publishes a snapshot of it to the default \
+        cache every `METRICS_FLUSH_INTERVAL` seconds, under a key \
+            of its own. Workers are found through up to \
+                `METRICS_MAX_WORKERS` slot keys, each claimed by one \
+                    worker with `cache.add` and expiring unless it \
+                        flushes again, so no key is ever written by \
+                            two workers. `/metrics` sums the snapshots \
+                                of the workers holding a slot, so \
+                                    whichever worker answers the \
+                                        scrape reports them all.
+
+Queries are counted by an execute wrapper installed on every \
+    database connection as it opens; it adds to the stats of the \
+        request running in its context, if any, so the queries of \
+            async views (run in `sync_to_async` threads) count too.
+"""
+from __future__ import annotations
+
+import contextlib
+import contextvars
+import logging
+import os
+import socket
+import threading
+import time
+from bisect import bisect_left
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.backends.signals import connection_created
+from rest_framework.response import Response
+
+
+LATENCY_BUCKETS = (
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+"""Upper bounds of the duration histograms, in seconds."""
+
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 25, 50, 100, 250)
+"""Upper bounds of the query count histogram."""
+
+SLOT_KEY = "metrics:slot:{}"
+"""Cache key of a worker slot, holding the name of its worker."""
+
+WORKER = f"{socket.gethostname()}:{os.getpid()}"
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class RequestStats:
+    queries: int = 0
+    db: float = 0.0
+    serializer: float = 0.0
+
+
+current: contextvars.ContextVar[RequestStats | None] = contextvars.ContextVar(
+    "request_stats", default=None
+)
+"""Stats of the request being handled in this context."""
+
+
+class Histogram:
+    """
+    Counts observations into buckets, per label values; they are \
+        made cumulative on `exposition`.
+    """
+
+    def __init__(
+        self, name: str, doc: str, labels: tuple[str, ...], buckets: tuple
+    ):
+        self.name = name
+        self.doc = doc
+        self.labels = labels
+        self.buckets = buckets
+        # label values -> [count per bucket (non-cumulative) ..., +Inf, sum]
+        self.series: dict[tuple, list] = {}
+
+    def observe(self, values: tuple, amount: float) -> None:
+        series = self.series.get(values)
+        if series is None:
+            series = self.series[values] = [0] * (len(self.buckets) + 1)
+            series.append(0.0)
+        series[bisect_left(self.buckets, amount)] += 1
+        series[-1] += amount
+
+
+class Registry:
+    """The histograms of one worker."""
+
+    def __init__(self, *histograms: Histogram):
+        self.histograms = {h.name: h for h in histograms}
+        self.lock = threading.Lock()
+        self.flushed_at = time.monotonic()
+
+    def __getitem__(self, name: str) -> Histogram:
+        return self.histograms[name]
+
+    def snapshot(self) -> dict[str, dict[tuple, list]]:
+        with self.lock:
+            return {
+                name: {values: list(s) for values, s in h.series.items()}
+                for name, h in self.histograms.items()
+            }
+
+
+registry = Registry(
+    Histogram(
+        "hn_request_duration_seconds",
+        "Time taken to answer a request.",
+        ("route", "method", "status"),
+        LATENCY_BUCKETS,
+    ),
+    Histogram(
+        "hn_request_queries",
+        "SQL queries made by a request.",
+        ("route",),
+        QUERY_BUCKETS,
+    ),
+    Histogram(
+        "hn_request_db_duration_seconds",
+        "Time a request spent in SQL queries.",
+        ("route",),
+        LATENCY_BUCKETS,
+    ),
+    Histogram(
+        "hn_serializer_duration_seconds",
+        "Time a request spent building serializer data.",
+        ("route",),
+        LATENCY_BUCKETS,
+    ),
+)
+
+
+def record(
+    route: str, method: str, status: int, seconds: float, stats: RequestStats
+) -> bool:
+    """
+    Adds a finished request to `registry`.
+
+    Returns:
+        bool: whether this worker is due to `flush`.
+    """
+    with registry.lock:
+        registry["hn_request_duration_seconds"].observe(
+            (route, method, str(status)), seconds
+        )
+        registry["hn_request_queries"].observe((route,), stats.queries)
+        registry["hn_request_db_duration_seconds"].observe((route,), stats.db)
+        if stats.serializer:
+            registry["hn_serializer_duration_seconds"].observe(
+                (route,), stats.serializer
+            )
+        due = (
+            time.monotonic() - registry.flushed_at
+            >= settings.METRICS_FLUSH_INTERVAL
+        )
+        if due:
+            registry.flushed_at = time.monotonic()
+    return due
+
+
+_slot: int | None = None
+"""The slot this worker holds, if any."""
+
+
+def _claim(cache, ttl: int) -> int | None:
+    """Takes the first free slot for this worker, see `flush`."""
+    for slot in range(settings.METRICS_MAX_WORKERS):
+        if cache.add(SLOT_KEY.format(slot), WORKER, ttl):
+            return slot
+    logger.warning(
+        f"No free metrics slot for {WORKER}, "
+        f"raise METRICS_MAX_WORKERS ({settings.METRICS_MAX_WORKERS})."
+    )
+    return None
+
+
+def flush() -> None:
+    """
+    Publishes the snapshot of this worker to the cache, and \
+        extends the slot it is found by, claiming one if it lost it.
+    """
+    global _slot
+    cache = caches["default"]
+    ttl = settings.METRICS_FLUSH_INTERVAL * 6
+    cache.set(f"metrics:{WORKER}", registry.snapshot(), ttl)
+    key = None if _slot is None else SLOT_KEY.format(_slot)
+    held = key is not None and cache.get(key) == WORKER
+    # the slot may expire between the two calls: `touch` then fails
+    if not (held and cache.touch(key, ttl)):
+        _slot = _claim(cache, ttl)
+
+
+def collect() -> dict[str, dict[tuple, list]]:
+    """
+    Sums the snapshots of every worker holding a slot, this one \
+        with its live values.
+    """
+    cache = caches["default"]
+    slots = cache.get_many(
+        [SLOT_KEY.format(slot) for slot in range(settings.METRICS_MAX_WORKERS)]
+    )
+    workers = {w for w in slots.values() if w != WORKER}
+    snapshots = list(
+        cache.get_many([f"metrics:{w}" for w in workers]).values()
+    )
+    snapshots.append(registry.snapshot())
+
+    total: dict[str, dict[tuple, list]] = {}
+    for snapshot in snapshots:
+        for name, series in snapshot.items():
+            merged = total.setdefault(name, {})
+            for values, counts in series.items():
+                if values in merged:
+                    merged[values] = [
+                        a + b for a, b in zip(merged[values], counts)
+                    ]
+                else:
+                    merged[values] = list(counts)
+    return total
+
+
+def _label(value: str) -> str:
+    return value.replace("\\", r"\\").replace('"', r"\"").replace("\n", r"\n")
+
+
+def _labels(names: tuple, values: tuple, **extra: str) -> str:
+    pairs = [*zip(names, values), *extra.items()]
+    return ",".join(f'{name}="{_label(value)}"' for name, value in pairs)
+
+
+def exposition() -> str:
+    """The metrics of all workers, in the Prometheus text format."""
+    lines = []
+    for name, series in collect().items():
+        histogram = registry[name]
+        lines.append(f"# HELP {name} {histogram.doc}")
+        lines.append(f"# TYPE {name} histogram")
+        bounds = [*map(str, histogram.buckets), "+Inf"]
+        for values, counts in sorted(series.items()):
+            cumulative = 0
+            for bound, count in zip(bounds, counts):
+                cumulative += count
+                labels = _labels(histogram.labels, values, le=bound)
+                lines.append(f"{name}_bucket{{{labels}}} {cumulative}")
+            labels = _labels(histogram.labels, values)
+            lines.append(f"{name}_sum{{{labels}}} {counts[-1]}")
+            lines.append(f"{name}_count{{{labels}}} {cumulative}")
+    return "\n".join(lines) + "\n"
+
+
+def _count_query(execute, sql, params, many, context):
+    stats = current.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.queries += 1
+        stats.db += time.perf_counter() - started
+
+
+def _watch_connection(sender, connection, **kwargs) -> None:
+    if _count_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_count_query)
+
+
+@contextlib.contextmanager
+def serializing():
+    """
+    Adds the time spent in the block to the serializer time of \
+        the request running in this context, if any.
+    """
+    stats = current.get()
+    if stats is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        stats.serializer += time.perf_counter() - started
+
+
+class SerializerMetricsMixin:
+    """
+    `list` and `retrieve` of a generic API view, reading the \
+        `.data` of their serializer in a `serializing` block.
+    """
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        serializer = self.get_serializer(
+            queryset if page is None else page, many=True
+        )
+        with serializing():
+            data = serializer.data
+        if page is not None:
+            return self.get_paginated_response(data)
+        return Response(data)
+
+    def retrieve(self, request, *args, **kwargs):
+        serializer = self.get_serializer(self.get_object())
+        with serializing():
+            data = serializer.data
+        return Response(data)
+
+
+def install() -> None:
+    """Hooks the query counter into new database connections."""
+    connection_created.connect(_watch_connection)
@@ -0,0 +1,491 @@
+"""
+Maps raw Hacker News API payloads onto our Django models.
+
+The API returns every item as a flat JSON object; the `type` \
+    attribute tells us which of our multi-table models it \
+        belongs to.
+"""
+from __future__ import annotations
+
+import functools
+from collections import Counter
+from datetime import datetime
+from datetime import timedelta
+from typing import Any
+from typing import Iterable
+
+from django.db import connection
+from django.db import models
+from django.db import transaction
+from django.utils import timezone
+
+from api.lib import cache
+from api.lib import threads
+from api.lib.time import from_unix
+from api.models.models import Comment
+from api.models.models import HNUser
+from api.models.models import Item
+from api.models.models import Job
+from api.models.models import Poll
+from api.models.models import PollOption
+from api.models.models import Story
+from api.search import backends as search
+from api.search import index as search_index
+
+
+ITEM_MODELS: dict[str, type[Item]] = {
+    "story": Story,
+    "comment": Comment,
+    "job": Job,
+    "poll": Poll,
+    "pollopt": PollOption,
+}
+"""Maps the upstream `type` attribute to our models."""
+
+UPSERT_BATCH_SIZE = 1000
+"""Maximum number of rows sent in a single upsert statement."""
+
+THREAD_FIELDS = ("root", "path")
+"""Comment attributes maintained by `threads`, only written on insert."""
+
+PLAIN_TYPES = {
+    "AutoField",
+    "BigAutoField",
+    "BigIntegerField",
+    "BooleanField",
+    "CharField",
+    "IntegerField",
+    "PositiveIntegerField",
+    "TextField",
+}
+"""Internal types whose values reach the database driver as they \
+    are, so `upsert` need not prepare them."""
+
+
+def _coerce(field: models.Field, value: Any) -> Any:
+    """
+    Squeezes an upstream value into what `field` can store.
+
+    HN titles and urls are longer than some of our columns \
+        and a few attributes (e.g. `parts`) are lists where \
+            we store scalars.
+    """
+    if value is None or (
+        isinstance(value, (list, dict))
+        and not isinstance(field, models.JSONField)
+    ):
+        return None if field.null else field.get_default()
+    if field.max_length and isinstance(value, str):
+        return value[: field.max_length]
+    return value
+
+
+@functools.lru_cache(maxsize=None)
+def _columns(model: type[models.Model]) -> list[tuple[str, models.Field]]:
+    """The `(name, field)` of the columns of `model` set from payloads."""
+    return [
+        (field.name, field)
+        for field in model._meta.concrete_fields
+        if not field.auto_created
+    ]
+
+
+def item_fields(
+    model: type[models.Model], item: dict[str, Any], complete: bool = False
+) -> dict[str, Any]:
+    """
+    Returns the column values of `model` found in an API payload, \
+        keyed by attribute name (e.g. `by_id`).
+
+    Attributes missing from the payload are left out, so that \
+        model defaults apply on insert and stored values are \
+            kept on update. With `complete`, they are filled with \
+                their empty value instead, as the API omits empty \
+                    attributes.
+    """
+    values = dict(item)
+    if "time" in values:
+        values["time"] = from_unix(values["time"])
+    if model is PollOption and "poll" in values:
+        values["parent"] = values["poll"]
+
+    fields = {}
+    for name, field in _columns(model):
+        if name in values:
+            fields[field.attname] = _coerce(field, values[name])
+        elif complete:
+            fields[field.attname] = _coerce(field, None)
+    return fields
+
+
+def resolve(
+    item: dict[str, Any] | None,
+    complete: bool = False,
+    now: datetime | None = None,
+) -> tuple[type[Item], dict[str, Any]] | None:
+    """
+    Returns the model and column values for an API payload, \
+        or `None` if we don't store that kind of item. `now` is \
+            its sync time, the current time by default.
+    """
+    if not item or "id" not in item:
+        return None
+    model = ITEM_MODELS.get(item.get("type"))
+    if model is None:
+        return None
+    fields = item_fields(model, item, complete)
+    fields["synced_at"] = now or timezone.now()
+    return model, fields
+
+
+def save_item(item: dict[str, Any]) -> Item | None:
+    """
+    Creates or updates a single item (and its author).
+    """
+    resolved = resolve(item)
+    if resolved is None:
+        return None
+    model, fields = resolved
+    item_id = fields.pop("id")
+
+    if fields.get("by_id"):
+        HNUser.objects.get_or_create(uid=fields["by_id"])
+
+    obj, _ = model.objects.update_or_create(id=item_id, defaults=fields)
+    threads.update([item])
+    search.index_items([item])
+    search_index.index_items([item])
+    cache.bump_on_commit()
+    return obj
+
+
+def _batches(rows: list, size: int):
+    for start in range(0, len(rows), size):
+        yield rows[start : start + size]
+
+
+def _preparer(field: models.Field):
+    """
+    Returns the `get_db_prep_save` of `field`, or `None` when its \
+        values are sent unprepared (see `PLAIN_TYPES`).
+    """
+    target = field.target_field if field.is_relation else field
+    internal_type = target.get_internal_type()
+    if internal_type in PLAIN_TYPES:
+        return None
+    if internal_type == "DateTimeField":
+        # rows of a batch share their `synced_at` and `changed_at`
+        return functools.lru_cache(maxsize=1024)(field.get_db_prep_save)
+    return field.get_db_prep_save
+
+
+def upsert(
+    model: type[models.Model],
+    rows: list[dict[str, Any]],
+    update: bool = True,
+    track: tuple[str, str] | None = None,
+    keep: Iterable[str] = (),
+) -> int:
+    """
+    Inserts `rows` into the table of `model` (only its own table, \
+        not the parents'), updating the rows that already exist.
+
+    Every row must carry the same attributes. The rows are sent \
+        as multi-row `INSERT .. ON CONFLICT` statements, supported \
+            by both SQLite and Postgres, so a batch costs one \
+                query per `UPSERT_BATCH_SIZE` rows. On SQLite, whose \
+                    statements take at most 999 parameters, they go \
+                        through one `executemany` of a single-row \
+                            statement instead, which loops in C.
+
+    Args:
+        model (Model) - model whose table is written.
+
+        rows (list) - column values keyed by attribute name.
+
+        update (bool) - overwrite existing rows, or leave them be.
+
+        track (tuple) - `(digest, stamp)` attribute names: the \
+            stamp of a row is only overwritten when its digest \
+                changed.
+
+        keep (Iterable) - attribute names only written on insert.
+
+    Returns:
+        int: number of rows inserted or updated, as counted by \
+            the database; rows left be are not.
+    """
+    if not rows:
+        return 0
+
+    opts = model._meta
+    fields = [opts.get_field(name) for name in rows[0]]
+    pk = opts.pk
+    qn = connection.ops.quote_name
+
+    columns = ", ".join(qn(f.column) for f in fields)
+    table = qn(opts.db_table)
+    keep = set(keep)
+    assignments = {
+        f.attname: f"EXCLUDED.{qn(f.column)}"
+        for f in fields
+        if f is not pk and f.attname not in keep
+    }
+    if track:
+        digest, stamp = (qn(opts.get_field(name).column) for name in track)
+        assignments[track[1]] = (
+            f"CASE WHEN {table}.{digest} = EXCLUDED.{digest} "
+            f"THEN {table}.{stamp} ELSE EXCLUDED.{stamp} END"
+        )
+    updates = ", ".join(
+        f"{qn(opts.get_field(name).column)} = {value}"
+        for name, value in assignments.items()
+    )
+    action = f"UPDATE SET {updates}" if update and updates else "NOTHING"
+    row_sql = "(" + ", ".join(["%s"] * len(fields)) + ")"
+    conflict = f"ON CONFLICT ({qn(pk.column)}) DO {action}"
+
+    # the connection itself: every attribute read through the
+    # `django.db.connection` proxy costs a context lookup
+    db = transaction.get_connection()
+    prepare = [(field.attname, _preparer(field)) for field in fields]
+
+    def values(row: dict[str, Any]) -> list:
+        return [
+            row[attname] if prep is None else prep(row[attname], db)
+            for attname, prep in prepare
+        ]
+
+    written = 0
+    with db.cursor() as cursor:
+        if db.vendor == "sqlite":
+            cursor.executemany(
+                f"INSERT INTO {table} ({columns}) VALUES {row_sql} {conflict}",
+                [values(row) for row in rows],
+            )
+            return max(cursor.rowcount, 0)
+
+        max_params = db.features.max_query_params or 65535
+        size = max(1, min(UPSERT_BATCH_SIZE, max_params // len(fields)))
+        for batch in _batches(rows, size):
+            sql = (
+                f"INSERT INTO {table} ({columns}) "
+                f"VALUES {', '.join([row_sql] * len(batch))} {conflict}"
+            )
+            cursor.execute(
+                sql, [value for row in batch for value in values(row)]
+            )
+            written += max(cursor.rowcount, 0)
+    return written
+
+
+def _authors(uids) -> list[dict[str, Any]]:
+    now = timezone.now()
+    return [
+        {"uid": uid, "delay": 0, "created": now, "karma": 0, "submitted": []}
+        for uid in uids
+    ]
+
+
+def _group(items: list[dict[str, Any]]) -> tuple[dict, dict]:
+    """
+    Resolves a batch of payloads into the `Item` rows and the \
+        rows of each child table, keyed by id.
+    """
+    parents: dict[int, dict[str, Any]] = {}
+    children: dict[type[Item], dict[int, dict[str, Any]]] = {}
+    parent_fields = {f.attname for f in Item._meta.concrete_fields}
+    now = timezone.now()
+
+    for item in items:
+        resolved = resolve(item, complete=True, now=now)
+        if resolved is None:
+            continue
+        model, fields = resolved
+        fields["type"] = item["type"]
+        fields["digest"] = Item.digest_of(fields)
+        fields["changed_at"] = fields["synced_at"]
+        parents[fields["id"]] = {
+            k: v for k, v in fields.items() if k in parent_fields
+        }
+        child = {k: v for k, v in fields.items() if k not in parent_fields}
+        child["item_ptr_id"] = fields["id"]
+        children.setdefault(model, {})[fields["id"]] = child
+
+    # options can't be stored without their poll
+    options = children.get(PollOption, {})
+    if options:
+        polls = set(children.get(Poll, {})) | set(
+            Poll.objects.filter(
+                pk__in={o["parent_id"] for o in options.values()}
+            ).values_list("pk", flat=True)
+        )
+        for item_id, option in list(options.items()):
+            if option["parent_id"] not in polls:
+                del options[item_id], parents[item_id]
+    return parents, children
+
+
+def _write(parents: dict, children: dict, update: bool = True) -> Counter:
+    """
+    Upserts grouped rows, see `_group`.
+
+    Returns:
+        Counter: rows written to each child table, by `type`.
+    """
+    uids = {row["by_id"] for row in parents.values() if row["by_id"]}
+    upsert(HNUser, _authors(sorted(uids)), update=False)
+    upsert(
+        Item,
+        list(parents.values()),
+        update=update,
+        track=("digest", "changed_at"),
+    )
+    types = {model: name for name, model in ITEM_MODELS.items()}
+    return Counter(
+        {
+            types[model]: upsert(
+                model,
+                list(rows.values()),
+                update=update,
+                keep=THREAD_FIELDS if model is Comment else (),
+            )
+            for model, rows in children.items()
+        }
+    )
+
+
+@transaction.atomic
+def save_items(items) -> Counter:
+    """
+    Persists a batch of API payloads in one transaction.
+
+    Payloads are grouped by `type`: authors, the shared `Item` \
+        rows and then each child table are written with one \
+            bulk upsert each (see `upsert`), however many items \
+                the batch holds. The comment threads touched by the \
+                    batch and the search indexes are updated last, see \
+                        `threads.update` and `search.index_items`; the \
+                            BM25 index and the data version of the \
+                                response cache once the transaction \
+                                    commits.
+
+    Returns:
+        Counter: number of items stored, by `type`.
+    """
+    items = list(items)
+    parents, children = _group(items)
+    written = _write(parents, children)
+
+    threads.update(items)
+    stored = [item for item in items if item and item.get("id") in parents]
+    search.index_items(stored)
+    search_index.index_items(stored)
+    cache.bump_on_commit()
+    return written
+
+
+@transaction.atomic
+def insert_items(items) -> int:
+    """
+    Inserts a batch of new items, leaving the ones already \
+        stored untouched.
+
+    Unlike `save_items`, nothing is derived: comments must carry \
+        their `root` and `path`, and neither the search indexes \
+            nor the response cache are updated. Meant for bulk \
+                loads, see `manage.py generate_dataset`.
+
+    Returns:
+        int: number of items inserted.
+    """
+    parents, children = _group(list(items))
+    return sum(_write(parents, children, update=False).values())
+
+
+def profile_fields(profile: dict[str, Any]) -> dict[str, Any]:
+    """
+    Returns the `HNUser` column values of a `/user/<id>.json` payload.
+    """
+    now = timezone.now()
+    return {
+        "uid": profile["id"],
+        "karma": profile.get("karma") or 0,
+        "delay": profile.get("delay") or 0,
+        "submitted": profile.get("submitted") or [],
+        "created": now,
+        "synced_at": now,
+    }
+
+
+def save_profile(profile: dict[str, Any]) -> HNUser | None:
+    """
+    Creates or updates an author from its `/user/<id>.json` payload.
+    """
+    if not profile or "id" not in profile:
+        return None
+    fields = profile_fields(profile)
+    user, _ = HNUser.objects.update_or_create(
+        uid=fields.pop("uid"), defaults=fields
+    )
+    return user
+
+
+def save_profiles(profiles) -> int:
+    """
+    Creates or updates a batch of authors from their \
+        `/user/<id>.json` payloads, with one bulk upsert.
+
+    Returns:
+        int: number of profiles stored.
+    """
+    rows = {
+        profile["id"]: profile_fields(profile)
+        for profile in profiles
+        if profile and "id" in profile
+    }
+    return upsert(HNUser, list(rows.values()))
+
+
+@transaction.atomic
+def save_changes(items, profiles) -> tuple[Counter, int]:
+    """
+    Applies a batch of changed items and profiles in one transaction.
+
+    Returns:
+        tuple: number of items stored by `type`, and of profiles \
+            stored.
+    """
+    return save_items(items), save_profiles(profiles)
+
+
+def stale(
+    item_ids: list[int], uids: list[str], window: timedelta
+) -> tuple[list[int], list[str]]:
+    """
+    Drops the items and profiles refreshed less than `window` ago.
+    """
+    cutoff = timezone.now() - window
+    fresh_items = set(
+        Item.objects.filter(
+            id__in=item_ids, synced_at__gte=cutoff
+        ).values_list("id", flat=True)
+    )
+    fresh_users = set(
+        HNUser.objects.filter(uid__in=uids, synced_at__gte=cutoff).values_list(
+            "uid", flat=True
+        )
+    )
+    return (
+        [item_id for item_id in item_ids if item_id not in fresh_items],
+        [uid for uid in uids if uid not in fresh_users],
+    )
+
+
+def missing(item_ids: Iterable[int]) -> list[int]:
+    """Returns the ids of `item_ids` we haven't stored yet."""
+    item_ids = list(dict.fromkeys(item_ids))
+    stored = set(
+        Item.objects.filter(id__in=item_ids).values_list("id", flat=True)
+    )
+    return [item_id for item_id in item_ids if item_id not in stored]
@@ -0,0 +1,177 @@
+"""
+Fetches author profiles from `/user/<uid>.json` in batches.
+
+A `ProfileFetcher` requests all the uids of a batch concurrently \
+    through a `HackerNewsCollector`, so refreshing the \
+        authors of a whole page costs one round of requests. Fetched \
+            profiles are cached for `PROFILE_CACHE_TTL` seconds, \
+                concurrent fetches of one uid share a single request, \
+                    and profiles that can't be fetched fall back to the \
+                        stored `HNUser` row.
+
+Async code shares the long-lived fetcher of its event loop (see \
+    `get_fetcher`), so that requests in flight are joined across \
+        calls and the connection pool is reused; the collector's \
+            `refresh` runs its own. Sync code goes through \
+                `fetch_profiles`, as each `async_to_sync` call runs \
+                    on an event loop of its own.
+
+Usage:
+
+    found = await (await profiles.get_fetcher()).fetch_many(["pg"])
+    found = async_to_sync(profiles.fetch_profiles)(["pg", "dang"])
+"""
+from __future__ import annotations
+
+import asyncio
+from typing import Any
+from typing import Iterable
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from api.lib.cache import get_cache
+from api.lib.collector import HackerNewsCollector
+from api.models.models import HNUser
+
+
+CACHE_PREFIX = "profile:"
+
+_fetchers: dict[asyncio.AbstractEventLoop, asyncio.Task] = {}
+"""The shared fetcher of each event loop, being opened or open."""
+
+
+def stored_profiles(uids: Iterable[str]) -> dict[str, dict[str, Any]]:
+    """
+    Returns the stored profiles of `uids`, shaped like their \
+        `/user/<uid>.json` payloads.
+    """
+    return {
+        user.uid: {
+            "id": user.uid,
+            "created": int(user.created.timestamp()),
+            "karma": user.karma,
+            "delay": user.delay,
+            "submitted": user.submitted,
+        }
+        for user in HNUser.objects.filter(uid__in=list(uids))
+    }
+
+
+class ProfileFetcher:
+    """
+    Fetches profiles through `collector`, which owns the transport.
+
+    Args:
+        collector (HackerNewsCollector) - an entered collector.
+
+        ttl (int) - seconds fetched profiles stay cached, defaults \
+            to `PROFILE_CACHE_TTL`; 0 disables the cache.
+    """
+
+    def __init__(self, collector: HackerNewsCollector, ttl: int | None = None):
+        self.collector = collector
+        self.ttl = settings.PROFILE_CACHE_TTL if ttl is None else ttl
+        self.inflight: dict[str, asyncio.Future] = {}
+
+    async def fetch_many(
+        self, uids: Iterable[str], refresh: bool = False
+    ) -> dict[str, dict]:
+        """
+        Returns the profiles of `uids`, by uid. Uids that are \
+            neither fetched nor stored are left out.
+
+        Args:
+            uids (Iterable[str]) - the uids to fetch.
+
+            refresh (bool) - fetch every uid, even cached ones, and \
+                leave out the ones that can't be fetched instead of \
+                    reading their stored row: for the change feed, \
+                        which stores what it gets.
+        """
+        uids = list(dict.fromkeys(uids))
+        cache = get_cache()
+        found = {}
+        if self.ttl and not refresh:
+            cached = await cache.aget_many(
+                [CACHE_PREFIX + uid for uid in uids]
+            )
+            found = {
+                key[len(CACHE_PREFIX) :]: profile
+                for key, profile in cached.items()
+            }
+
+        missing = [uid for uid in uids if uid not in found]
+        # shielded, as other callers may have joined these requests
+        fetched = await asyncio.gather(
+            *(asyncio.shield(self.fetch(uid)) for uid in missing)
+        )
+        fresh = {
+            uid: profile for uid, profile in zip(missing, fetched) if profile
+        }
+        if fresh and self.ttl:
+            await cache.aset_many(
+                {
+                    CACHE_PREFIX + uid: profile
+                    for uid, profile in fresh.items()
+                },
+                self.ttl,
+            )
+        found.update(fresh)
+
+        failed = [uid for uid in missing if uid not in fresh]
+        if failed and not refresh:
+            found.update(await sync_to_async(stored_profiles)(failed))
+        return found
+
+    def fetch(self, uid: str) -> asyncio.Future:
+        """
+        Fetches one profile, joining the request in flight for \
+            `uid` if there is one.
+        """
+        future = self.inflight.get(uid)
+        if future is None:
+            future = asyncio.ensure_future(
+                self.collector.fetch_json(f"user/{uid}.json")
+            )
+            self.inflight[uid] = future
+            future.add_done_callback(lambda _: self.inflight.pop(uid, None))
+        return future
+
+
+async def get_fetcher() -> ProfileFetcher:
+    """
+    Returns the shared fetcher of the running event loop, opening \
+        its collector on first use. `close_fetcher` closes it.
+    """
+    loop = asyncio.get_running_loop()
+    if loop not in _fetchers:
+        _fetchers[loop] = loop.create_task(_open_fetcher())
+    # shielded: a cancelled caller mustn't cancel the others' fetcher
+    return await asyncio.shield(_fetchers[loop])
+
+
+async def _open_fetcher() -> ProfileFetcher:
+    collector = HackerNewsCollector()
+    await collector.__aenter__()
+    return ProfileFetcher(collector)
+
+
+async def close_fetcher() -> None:
+    """Closes the shared fetcher of the running event loop, if any."""
+    opening = _fetchers.pop(asyncio.get_running_loop(), None)
+    if opening is not None:
+        fetcher = await opening
+        await fetcher.collector.__aexit__(None, None, None)
+
+
+async def fetch_profiles(uids: Iterable[str], **options) -> dict[str, dict]:
+    """
+    Fetches the profiles of `uids` with a new collector, closed \
+        on return, see `ProfileFetcher.fetch_many`.
+
+    Returns:
+        dict: the profiles by uid.
+    """
+    async with HackerNewsCollector(**options) as collector:
+        return await ProfileFetcher(collector).fetch_many(uids)
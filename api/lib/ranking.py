@@ -0,0 +1,71 @@
+"""
+Precomputes the front page.
+
+Stories are ranked with the Hacker News gravity formula:
+
+    (points - 1) / (age in hours + 2) ** gravity
+
+over the stories of the last `FRONT_PAGE_WINDOW` hours, and the \
+    best `FRONT_PAGE_SIZE` are stored as `FrontPageRank` rows, so \
+        that a page of the front page is a primary key range scan \
+            instead of a sort of the item table.
+
+Usage:
+
+    ranking.rank_front_page()   # after each sync, see `api.tasks`
+"""
+from __future__ import annotations
+
+import heapq
+from datetime import datetime
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from api.lib import cache
+from api.models.models import FrontPageRank
+from api.models.models import Item
+
+
+def gravity(points: int | None, age: timedelta) -> float:
+    """The Hacker News ranking score of a story."""
+    hours = max(age.total_seconds(), 0) / 3600
+    return ((points or 0) - 1) / (hours + 2) ** settings.FRONT_PAGE_GRAVITY
+
+
+@transaction.atomic
+def rank_front_page(now: datetime | None = None) -> int:
+    """
+    Recomputes the front page, replacing the stored one.
+
+    Returns:
+        int: number of ranked stories.
+    """
+    now = now or timezone.now()
+    candidates = (
+        Item.objects.filter(
+            type="story",
+            time__gte=now - timedelta(hours=settings.FRONT_PAGE_WINDOW),
+            dead=False,
+            deleted=False,
+        )
+        .order_by()
+        .values_list("id", "story__score", "time")
+    )
+    best = heapq.nlargest(
+        settings.FRONT_PAGE_SIZE,
+        (
+            (gravity(points, now - time), -item_id)
+            for item_id, points, time in candidates
+        ),
+    )
+
+    FrontPageRank.objects.all().delete()
+    FrontPageRank.objects.bulk_create(
+        FrontPageRank(rank=rank, item_id=-item_id, score=score, ranked_at=now)
+        for rank, (score, item_id) in enumerate(best, start=1)
+    )
+    cache.bump_on_commit()
+    return len(best)
@@ -0,0 +1,360 @@
+"""
+Read-only fast path of the model serializers.
+
+DRF builds a model instance per row, then walks a tree of field \
+    objects for it (and, with `depth`, runs a query per related \
+        row). `RowSerializer` compiles a serializer class once into \
+            the `.values()` lookups it reads, related rows included \
+                through joins, and a converter per field; rendering \
+                    a row is then a loop over a tuple of plain values.
+
+The output matches the serializer's, key for key, for the \
+    fields it knows how to compile: model fields, primary key \
+        relations, `UnixTimeField` and nested model serializers. \
+            A nested serializer that can't be joined (e.g. one with \
+                many-to-many fields, like `auth.User`) is rendered \
+                    as its primary key; anything else raises \
+                        `Uncompilable`.
+
+A serializer can also be compiled for a subset of its fields, \
+    and with some relations expanded into nested objects: only \
+        the columns of those fields are selected, and tables are \
+            only joined for the relations rendered nested. The list \
+                endpoints take them from the query string, see \
+                    `for_request`:
+
+    /api/v1/stories/?fields=id,title,score
+    /api/v1/news/?fields=id,by,kids&expand=by,kids
+
+Usage:
+
+    rows = row_serializer(StorySerializer)
+    page = rows.values(Story.objects.all())[:30]
+    data = rows.render_many(page)
+"""
+from __future__ import annotations
+
+import functools
+from typing import Callable
+
+from django.conf import settings
+from django.db.models import Model
+from django.db.models import QuerySet
+from django.http import Http404
+from django.http import HttpRequest
+from rest_framework import serializers
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+
+from api.lib import aio
+from api.lib import metrics
+from api.lib.time import UnixTimeField
+
+
+PLAIN_FIELDS = (
+    serializers.BooleanField,
+    serializers.CharField,
+    serializers.ChoiceField,
+    serializers.FloatField,
+    serializers.IntegerField,
+    serializers.JSONField,
+    serializers.ModelField,
+    serializers.ReadOnlyField,
+)
+"""Serializer fields whose database values are already their \
+    representation."""
+
+
+class Uncompilable(Exception):
+    """Raised for serializers `RowSerializer` can't render."""
+
+
+def _unix(value) -> int:
+    return int(value.timestamp())
+
+
+def _iso(value) -> str:
+    # `DateTimeField.to_representation` for UTC datetimes
+    text = value.isoformat()
+    return text[:-6] + "Z" if text.endswith("+00:00") else text
+
+
+def _converter(field: serializers.Field) -> Callable | None:
+    """How to render the values of `field`, `None` for as they are."""
+    if isinstance(field, UnixTimeField):
+        return _unix
+    if isinstance(field, serializers.DateTimeField):
+        iso = getattr(field, "format", api_settings.DATETIME_FORMAT)
+        utc = settings.USE_TZ and settings.TIME_ZONE == "UTC"
+        if iso == api_settings.DATETIME_FORMAT == "iso-8601" and utc:
+            return _iso
+        return field.to_representation
+    if isinstance(field, serializers.RelatedField) and not isinstance(
+        field, serializers.PrimaryKeyRelatedField
+    ):
+        raise Uncompilable(f"Can't render {field!r} from a row.")
+    if isinstance(field, (serializers.PrimaryKeyRelatedField, PLAIN_FIELDS)):
+        return None
+    raise Uncompilable(f"Can't render {field!r} from a row.")
+
+
+class RowSerializer:
+    """
+    Renders `.values()` rows like `serializer_class` renders \
+        model instances, see the module docstring.
+
+    Args:
+        serializer_class (type) - a `ModelSerializer`.
+
+        fields (frozenset) - the keys to render, all by default. \
+            `id` may be asked for even if the serializer leaves \
+                it out.
+
+        expand (tuple) - `(key, serializer class)` of the keys \
+            to render as nested objects instead of ids: a \
+                foreign key is joined, a JSON list of ids (e.g. \
+                    `kids`) is fetched for the whole page at once.
+    """
+
+    def __init__(
+        self,
+        serializer_class: type[serializers.ModelSerializer],
+        fields: frozenset[str] | None = None,
+        expand: tuple[tuple[str, type], ...] = (),
+    ):
+        self.serializer_class = serializer_class
+        self.model = serializer_class.Meta.model
+        self.lookups: list[str] = []
+        self.lists: list[tuple[str, RowSerializer]] = []
+        self.plan = self.compile(
+            serializer_class(), self.model, "", fields, dict(expand)
+        )
+
+    def _lookup(self, name: str) -> int:
+        if name not in self.lookups:
+            self.lookups.append(name)
+        return self.lookups.index(name)
+
+    def _nested(self, serializer, prefix: str) -> list[tuple] | None:
+        compiled = len(self.lookups)
+        try:
+            return self.compile(serializer, serializer.Meta.model, prefix)
+        except Uncompilable:
+            # rendered as its primary key, without the joins
+            del self.lookups[compiled:]
+            return None
+
+    def compile(
+        self,
+        serializer: serializers.Serializer,
+        model: type[Model],
+        prefix: str,
+        fields: frozenset[str] | None = None,
+        expand: dict[str, type] | None = None,
+    ) -> list[tuple]:
+        """
+        Returns `(key, column, converter, nested plan)` for each \
+            readable field of `serializer` (among `fields`), in \
+                order.
+        """
+        expand = expand or {}
+        plan = []
+        if fields and "id" in fields and "id" not in serializer.fields:
+            plan.append(("id", self._lookup(prefix + "pk"), None, None))
+
+        for key, field in serializer.fields.items():
+            if field.write_only or (fields is not None and key not in fields):
+                continue
+            if field.source == "*" or "." in field.source:
+                raise Uncompilable(f"Can't render {key!r} from a row.")
+            model_field = model._meta.get_field(field.source)
+            if isinstance(field, serializers.ListSerializer):
+                raise Uncompilable(f"Can't render {key!r} from a row.")
+
+            if key in expand and not model_field.is_relation:
+                # a list of ids, swapped for their rows by `attach`
+                self.lists.append((key, row_serializer(expand[key])))
+                column = self._lookup(prefix + model_field.attname)
+                plan.append((key, column, None, None))
+                continue
+            if key in expand:
+                field = expand[key]()
+            if isinstance(field, serializers.ModelSerializer):
+                column = self._lookup(prefix + model_field.name)
+                nested = self._nested(field, f"{prefix}{model_field.name}__")
+                plan.append((key, column, None, nested))
+                continue
+
+            name = (
+                model_field.name
+                if model_field.is_relation
+                else model_field.attname
+            )
+            column = self._lookup(prefix + name)
+            plan.append((key, column, _converter(field), None))
+        return plan
+
+    def values(self, queryset: QuerySet, *extra: str) -> QuerySet:
+        """
+        `queryset` as the rows to render: named tuples, so that \
+            paginators read their position from them like from \
+                instances. `extra` lookups (e.g. the ordering of a \
+                    paginator) and `pk` are fetched too.
+        """
+        lookups = [*self.lookups, "pk", *extra]
+        return queryset.values_list(*dict.fromkeys(lookups), named=True)
+
+    def render(self, row: tuple, plan: list[tuple] | None = None) -> dict:
+        data = {}
+        for key, column, convert, nested in plan or self.plan:
+            value = row[column]
+            if value is None:
+                data[key] = None
+            elif nested is not None:
+                data[key] = self.render(row, nested)
+            else:
+                data[key] = value if convert is None else convert(value)
+        return data
+
+    def expansions(self, data: list[dict]):
+        """
+        Yields `(key, row serializer, queryset)` of the rows the \
+            expanded id lists of `data` refer to.
+        """
+        for key, rows in self.lists:
+            ids = {pk for item in data for pk in item[key] or ()}
+            if ids:
+                queryset = rows.model.objects.filter(pk__in=ids)
+                yield key, rows, rows.values(queryset)
+
+    @staticmethod
+    def attach(data: list[dict], key: str, rows, fetched) -> None:
+        """Swaps the ids under `key` for the `fetched` rows."""
+        found = {row.pk: rows.render(row) for row in fetched}
+        for item in data:
+            if item[key]:
+                item[key] = [found[pk] for pk in item[key] if pk in found]
+
+    def render_many(self, rows) -> list[dict]:
+        render = self.render
+        data = [render(row) for row in rows]
+        for key, nested, queryset in self.expansions(data):
+            self.attach(data, key, nested, queryset)
+        return data
+
+    async def arender_many(self, rows) -> list[dict]:
+        """`render_many`, fetching expansions from a coroutine."""
+        render = self.render
+        data = [render(row) for row in rows]
+        for key, nested, queryset in self.expansions(data):
+            self.attach(data, key, nested, await aio.fetch(queryset))
+        return data
+
+
+@functools.lru_cache(maxsize=256)
+def row_serializer(
+    serializer_class,
+    fields: frozenset[str] | None = None,
+    expand: tuple[tuple[str, type], ...] = (),
+) -> RowSerializer:
+    """The compiled `RowSerializer` of `serializer_class`."""
+    return RowSerializer(serializer_class, fields, expand)
+
+
+def names(value: str | None) -> frozenset[str] | None:
+    """The names of a comma separated list, `None` for no list."""
+    if value is None:
+        return None
+    return frozenset(filter(None, (name.strip() for name in value.split(","))))
+
+
+def narrow(
+    serializer_class,
+    fields: frozenset[str] | None,
+    expand: frozenset[str],
+    expansions: dict[str, type],
+) -> RowSerializer:
+    """
+    The `RowSerializer` of `serializer_class` for `fields` (all by \
+        default), with the `expand` keys (among `expansions`) \
+            rendered as nested objects.
+
+    Raises:
+        ValidationError: for unknown fields or expansions.
+    """
+    if fields is not None:
+        known = {key for key, *_ in row_serializer(serializer_class).plan}
+        unknown = fields - {"id", *known}
+        if unknown:
+            raise ValidationError({"fields": f"Unknown: {sorted(unknown)}."})
+    unknown = expand - set(expansions)
+    if unknown:
+        raise ValidationError({"expand": f"Unknown: {sorted(unknown)}."})
+    return row_serializer(
+        serializer_class,
+        fields,
+        tuple(sorted((key, expansions[key]) for key in expand)),
+    )
+
+
+def for_request(
+    serializer_class, request: HttpRequest, expansions: dict[str, type]
+) -> RowSerializer:
+    """`narrow` to the `?fields=` and `?expand=` of `request`."""
+    return narrow(
+        serializer_class,
+        names(request.GET.get("fields")),
+        names(request.GET.get("expand")) or frozenset(),
+        expansions,
+    )
+
+
+class RowReadMixin:
+    """
+    Serves `list` and `retrieve` of a generic API view from \
+        `.values()` rows, see `RowSerializer`, narrowed by \
+            `?fields=` and `?expand=` (among `expansions`); writes \
+                still go through its serializer.
+    """
+
+    expansions: dict[str, type] = {}
+
+    def row_serializer(self) -> RowSerializer:
+        return for_request(
+            self.get_serializer_class(), self.request, self.expansions
+        )
+
+    def get_rows(self, rows: RowSerializer) -> QuerySet:
+        ordering = getattr(self.paginator, "ordering", None) or ()
+        if isinstance(ordering, str):
+            ordering = (ordering,)
+        return rows.values(
+            self.filter_queryset(self.get_queryset()),
+            *(field.lstrip("-") for field in ordering),
+        )
+
+    def list(self, request, *args, **kwargs):
+        rows = self.row_serializer()
+        queryset = self.get_rows(rows)
+        page = self.paginate_queryset(queryset)
+        with metrics.serializing():
+            data = rows.render_many(queryset if page is None else page)
+        if page is not None:
+            return self.get_paginated_response(data)
+        return Response(data)
+
+    def retrieve(self, request, *args, **kwargs):
+        rows = self.row_serializer()
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        row = (
+            self.get_rows(rows)
+            .filter(**{self.lookup_field: self.kwargs[lookup_url_kwarg]})
+            .first()
+        )
+        if row is None:
+            raise Http404
+        self.check_object_permissions(request, row)
+        with metrics.serializing():
+            data = rows.render_many([row])[0]
+        return Response(data)
@@ -0,0 +1,178 @@
+"""
+A local stand-in for the Hacker News v0 API.
+
+Serves a `SyntheticDataset` over HTTP with the same url layout \
+    as `https://hacker-news.firebaseio.com/v0`, so pointing \
+        `HACKER_NEWSAPI_URI` at it lets us crawl and benchmark \
+            offline.
+
+The upstream's misbehaviour can be emulated too: every response \
+    can be delayed, a share of them failed with a 500 or 503, and \
+        requests beyond a rate limit refused with a 429, see \
+            `Conditions`. What was served is counted on `/_stats.json`.
+"""
+from __future__ import annotations
+
+import asyncio
+import math
+import random
+import time
+from collections import Counter
+from dataclasses import dataclass
+
+from aiohttp import web
+
+from api.lib.synthetic import SyntheticDataset
+
+
+@dataclass
+class Conditions:
+    """
+    Network conditions of the stand-in.
+
+    Arguments:
+        latency (float) - seconds added to every response.
+
+        jitter (float) - random extra seconds, up to this much.
+
+        error_rate (float) - share of requests failed with a \
+            500 or a 503, between 0 and 1.
+
+        rate_limit (float) - requests per second served before \
+            answering 429, 0 for no limit. Bursts of one second \
+                worth of requests (at least one) are allowed, and \
+                    refused requests say when to retry in `Retry-After`.
+
+        seed (int) - seed of the jitter and of the failures.
+    """
+
+    latency: float = 0.0
+    jitter: float = 0.0
+    error_rate: float = 0.0
+    rate_limit: float = 0.0
+    seed: int = 0
+
+
+class TokenBucket:
+    """
+    Allows `rate` requests per second, in bursts of `rate`, and \
+        of at least one request for rates below 1.
+    """
+
+    def __init__(self, rate: float):
+        self.rate = rate
+        self.capacity = max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def take(self) -> bool:
+        now = time.monotonic()
+        self.tokens = min(
+            self.capacity, self.tokens + (now - self.updated) * self.rate
+        )
+        self.updated = now
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+    def retry_after(self) -> int:
+        """Whole seconds until a request is allowed again."""
+        return max(1, math.ceil((1 - self.tokens) / self.rate))
+
+
+def create_app(
+    dataset: SyntheticDataset,
+    prefix: str = "/v0",
+    conditions: Conditions | None = None,
+) -> web.Application:
+    """
+    Builds the aiohttp application serving `dataset` under `prefix`.
+    """
+    conditions = conditions or Conditions()
+    rnd = random.Random(conditions.seed)
+    bucket = conditions.rate_limit and TokenBucket(conditions.rate_limit)
+    stats: Counter[str] = Counter()
+    started = time.monotonic()
+
+    @web.middleware
+    async def emulate(request: web.Request, handler) -> web.StreamResponse:
+        if request.path == "/_stats.json":
+            return await handler(request)
+        stats["requests"] += 1
+        if bucket and not bucket.take():
+            stats["throttled"] += 1
+            return web.json_response(
+                {"error": "rate limited"},
+                status=429,
+                headers={"Retry-After": str(bucket.retry_after())},
+            )
+        delay = conditions.latency + rnd.uniform(0, conditions.jitter)
+        if delay:
+            await asyncio.sleep(delay)
+        if rnd.random() < conditions.error_rate:
+            stats["failed"] += 1
+            return web.json_response(
+                {"error": "unavailable"}, status=rnd.choice((500, 503))
+            )
+        stats["served"] += 1
+        return await handler(request)
+
+    async def stats_view(request: web.Request) -> web.Response:
+        elapsed = time.monotonic() - started
+        return web.json_response(
+            {
+                **stats,
+                "seconds": elapsed,
+                "served_per_sec": stats["served"] / elapsed,
+            }
+        )
+
+    async def item(request: web.Request) -> web.Response:
+        data = dataset.get(int(request.match_info["id"]))
+        return web.json_response(data)
+
+    async def user(request: web.Request) -> web.Response:
+        return web.json_response(dataset.user(request.match_info["id"]))
+
+    async def updates(request: web.Request) -> web.Response:
+        return web.json_response(dataset.updates())
+
+    async def maxitem(request: web.Request) -> web.Response:
+        return web.json_response(dataset.maxitem)
+
+    async def stories(request: web.Request) -> web.Response:
+        return web.json_response(
+            dataset.story_list(request.match_info["name"])
+        )
+
+    app = web.Application(middlewares=[emulate])
+    app.add_routes(
+        [
+            web.get("/_stats.json", stats_view),
+            web.get(prefix + r"/item/{id:\d+}.json", item),
+            web.get(prefix + "/user/{id}.json", user),
+            web.get(prefix + "/maxitem.json", maxitem),
+            web.get(prefix + "/updates.json", updates),
+            web.get(
+                prefix + "/{name:(top|new|best|ask|show|job)stories}.json",
+                stories,
+            ),
+        ]
+    )
+    return app
+
+
+def run(
+    dataset: SyntheticDataset,
+    host: str = "127.0.0.1",
+    port: int = 8001,
+    conditions: Conditions | None = None,
+):
+    """Serves `dataset` until interrupted."""
+    web.run_app(
+        create_app(dataset, conditions=conditions),
+        host=host,
+        port=port,
+        print=None,
+    )
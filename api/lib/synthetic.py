@@ -0,0 +1,403 @@
+"""
+Deterministic, synthetic Hacker News data.
+
+Used by the local API stand-in (`manage.py hn_standin`) so the \
+    collector can be exercised and benchmarked without talking \
+        to the live Firebase endpoint, and by `manage.py \
+            generate_dataset` to fill a database at scale.
+"""
+from __future__ import annotations
+
+import random
+from bisect import bisect
+from collections import deque
+from itertools import accumulate
+from math import log
+from typing import Any
+from typing import Iterator
+
+from api.lib import threads
+
+
+class SyntheticDataset:
+    """
+    An in-memory set of HN items with ids `1..size`.
+
+    Items are shaped exactly like the upstream payloads: stories \
+        carry `kids`, comments point at their `parent`, polls list \
+            their `parts`. The same `seed` always yields the same data.
+
+    Args:
+        size (int) - number of items to generate.
+
+        seed (int) - seed for the random generator.
+
+        start (int) - unix timestamp of the first item.
+    """
+
+    STORY_RATIO = 0.12
+    JOB_RATIO = 0.005
+    POLL_RATIO = 0.002
+    USERS = 5000
+
+    def __init__(
+        self, size: int = 10_000, seed: int = 0, start: int = 1_600_000_000
+    ):
+        self.size = size
+        self.seed = seed
+        self.start = start
+        self.items: dict[int, dict[str, Any]] = {}
+        self.users: dict[str, dict[str, Any]] = {}
+        self._generate()
+        self._index_users()
+
+    def _generate(self) -> None:
+        rnd = random.Random(self.seed)
+        threads: list[int] = []
+        recent: list[int] = []
+        next_id = 1
+        now = self.start
+
+        while next_id <= self.size:
+            now += rnd.randint(0, 30)
+            roll = rnd.random()
+            item: dict[str, Any] = {
+                "id": next_id,
+                "by": f"user{rnd.randrange(self.USERS)}",
+                "time": now,
+            }
+
+            if not threads or roll < self.STORY_RATIO:
+                item.update(
+                    type="story",
+                    title=f"Synthetic story {next_id}",
+                    url=f"https://example.com/{next_id}",
+                    score=int(rnd.paretovariate(1.2)),
+                    descendants=0,
+                )
+                threads.append(next_id)
+                recent.append(next_id)
+            elif roll < self.STORY_RATIO + self.JOB_RATIO:
+                item.update(
+                    type="job",
+                    title=f"Synthetic job {next_id}",
+                    text="We are hiring.",
+                    url=f"https://example.com/jobs/{next_id}",
+                    score=1,
+                )
+            elif (
+                roll < self.STORY_RATIO + self.JOB_RATIO + self.POLL_RATIO
+                and next_id + 3 <= self.size
+            ):
+                item.update(
+                    type="poll",
+                    title=f"Synthetic poll {next_id}",
+                    text="",
+                    score=rnd.randint(1, 200),
+                    descendants=0,
+                    parts=[next_id + 1, next_id + 2, next_id + 3],
+                )
+                self.items[next_id] = item
+                for part in item["parts"]:
+                    self.items[part] = {
+                        "id": part,
+                        "by": item["by"],
+                        "time": now,
+                        "type": "pollopt",
+                        "poll": next_id,
+                        "title": f"Option {part - next_id}",
+                        "score": rnd.randint(0, 100),
+                    }
+                next_id += 4
+                continue
+            else:
+                # reply to a fresh thread or to a recent comment
+                if rnd.random() < 0.4:
+                    parent = rnd.choice(threads[-50:])
+                else:
+                    parent = rnd.choice(recent[-200:])
+                item.update(
+                    type="comment",
+                    parent=parent,
+                    text=f"Synthetic comment {next_id}",
+                )
+                self.items[parent].setdefault("kids", []).append(next_id)
+                recent.append(next_id)
+
+            self.items[next_id] = item
+            next_id += 1
+
+    def _index_users(self) -> None:
+        rnd = random.Random(self.seed)
+        for item in self.items.values():
+            user = self.users.setdefault(
+                item["by"],
+                {
+                    "id": item["by"],
+                    "created": item["time"],
+                    "karma": rnd.randint(1, 10_000),
+                    "submitted": [],
+                },
+            )
+            user["submitted"].append(item["id"])
+        for user in self.users.values():
+            user["submitted"].reverse()
+
+    @property
+    def maxitem(self) -> int:
+        return self.size
+
+    def get(self, item_id: int) -> dict[str, Any] | None:
+        return self.items.get(item_id)
+
+    def user(self, uid: str) -> dict[str, Any] | None:
+        return self.users.get(uid)
+
+    def updates(self, limit: int = 100) -> dict[str, list]:
+        """The most recently changed items and profiles."""
+        items = list(range(self.maxitem, max(self.maxitem - limit, 0), -1))
+        profiles = list(
+            dict.fromkeys(
+                self.items[i]["by"] for i in items if i in self.items
+            )
+        )
+        return {"items": items, "profiles": profiles}
+
+    def top_stories(self, limit: int = 500) -> list[int]:
+        stories = [
+            i["id"] for i in self.items.values() if i["type"] == "story"
+        ]
+        return stories[::-1][:limit]
+
+    def story_list(self, name: str, limit: int = 200) -> list[int]:
+        """
+        The ids of upstream list `name` (`topstories`, \
+            `newstories`, ...). Ask and show stories are every \
+                7th and 11th story, as synthetic titles don't say.
+        """
+        if name in ("topstories", "newstories"):
+            return self.top_stories()
+        if name == "jobstories":
+            ids = [i["id"] for i in self.items.values() if i["type"] == "job"]
+            return ids[::-1][:limit]
+
+        stories = self.top_stories(limit=self.size)
+        if name == "beststories":
+            stories.sort(key=lambda i: self.items[i]["score"], reverse=True)
+        elif name in ("askstories", "showstories"):
+            step = 7 if name == "askstories" else 11
+            stories = [i for i in stories if i % step == 0]
+        return stories[:limit]
+
+
+WORDS = (
+    "the of and to in is for that it on with as was this be are by not "
+    "at from or have an but they which you one all we can has more when "
+    "will there their if about would what so out up use into than them "
+    "some time other new could these two may first then do any like "
+    "my now over such our man me even most made after also did many "
+    "before must through back years where much your way well down "
+    "should because each just those people how too little state good "
+    "very make world still own see men work long get here between both "
+    "life being under never day same another know while last might us "
+    "great old year off come since against go came right used take "
+    "three startup python rust linux google apple data code open source "
+    "web app api database server security privacy model learning ai "
+    "design programming software hardware company market founder yc "
+    "release version browser javascript compiler memory performance "
+).split()
+"""Vocabulary of the generated titles and comments."""
+
+TEXT_WORDS = 1 << 16
+"""Length of the random text generated titles and comments are cut from."""
+
+
+class DatasetGenerator:
+    """
+    Streams a large synthetic dataset, shaped like the upstream \
+        payloads, without holding it in memory.
+
+    Distributions, roughly those of the real site:
+
+    - items arrive with exponential gaps, spread over `span` seconds;
+    - authors post with a Zipf-like activity (a few post a lot);
+    - story points follow a Pareto distribution;
+    - comments pick a thread among the `ACTIVE_THREADS` most \
+        recent ones with a weight of its points, then reply to \
+            one of its comments or to the story, which yields \
+                heavy-tailed, deep comment trees.
+
+    Exactly `size` items are generated, with consecutive ids. A \
+        thread is only emitted once it drops out of the active \
+            window, so that the story has its final `kids` and \
+                `descendants`. Comments carry their `root` and \
+                    `path` (see `Comment.path`), as \
+                        `persistence.insert_items` expects.
+
+    Args:
+        size (int) - number of items to generate.
+
+        users (int) - number of distinct authors.
+
+        start (int) - unix timestamp of the first item.
+
+        span (int) - seconds between the first and the last item.
+
+        first_id (int) - id of the first item.
+
+        seed (int) - seed for the random generator.
+    """
+
+    STORY_RATIO = 0.12
+    JOB_RATIO = 0.004
+    POLL_RATIO = 0.001
+    ASK_RATIO = 0.1
+    REPLY_RATIO = 0.6
+    DEAD_RATIO = 0.01
+    DELETED_RATIO = 0.005
+    ACTIVE_THREADS = 2000
+    MAX_POINTS = 5000
+
+    def __init__(
+        self,
+        size: int,
+        users: int,
+        start: int,
+        span: int,
+        first_id: int = 1,
+        seed: int = 0,
+    ):
+        self.size = size
+        self.users = users
+        self.start = start
+        self.span = span
+        self.first_id = first_id
+        self.rnd = random.Random(seed)
+        self._activity = list(
+            accumulate(1 / (rank + 1) ** 0.7 for rank in range(users))
+        )
+        # texts are slices of one long random text: a random word
+        # per word costs as much as the rest of an item
+        self._text = self.rnd.choices(WORDS, k=TEXT_WORDS)
+
+    def author(self) -> str:
+        rank = bisect(self._activity, self.rnd.random() * self._activity[-1])
+        return f"user{min(rank, self.users - 1)}"
+
+    def words(self, mean: float) -> str:
+        count = max(1, int(self.rnd.lognormvariate(log(mean), 0.8)))
+        start = self.rnd.randrange(TEXT_WORDS - min(count, TEXT_WORDS) + 1)
+        return " ".join(self._text[start : start + count])
+
+    def __iter__(self) -> Iterator[dict[str, Any]]:
+        rnd = self.rnd
+        gap = self.span / max(self.size, 1)
+        active: dict[int, dict[int, dict[str, Any]]] = {}
+        comments: dict[int, list[int]] = {}
+        order: deque[int] = deque()
+        slots: list[int] = []
+        now = float(self.start)
+        item_id = self.first_id
+        end = self.first_id + self.size
+
+        def retire(root: int) -> list[dict[str, Any]]:
+            nodes = active.pop(root)
+            comments.pop(root)
+            nodes[root]["descendants"] = len(nodes) - 1
+            return list(nodes.values())
+
+        while item_id < end:
+            now += rnd.expovariate(1 / gap) if gap else 0
+            roll = rnd.random()
+            item: dict[str, Any] = {
+                "id": item_id,
+                "by": self.author(),
+                "time": int(now),
+            }
+
+            if not active or roll < self.STORY_RATIO:
+                points = min(int(rnd.paretovariate(1.1)), self.MAX_POINTS)
+                item.update(type="story", score=points, descendants=0)
+                if rnd.random() < self.ASK_RATIO:
+                    item["title"] = "Ask HN: " + self.words(6)
+                    item["text"] = self.words(60)
+                else:
+                    item["title"] = self.words(8).capitalize()
+                    item["url"] = f"https://example.com/{item_id}"
+                active[item_id] = {item_id: item}
+                comments[item_id] = []
+                order.append(item_id)
+                slots.extend([item_id] * min(points, 100))
+                if len(order) > self.ACTIVE_THREADS:
+                    yield from retire(order.popleft())
+            elif roll < self.STORY_RATIO + self.JOB_RATIO:
+                item.update(
+                    type="job",
+                    title=self.words(6).capitalize(),
+                    text=self.words(40),
+                    url=f"https://example.com/jobs/{item_id}",
+                    score=1,
+                )
+                yield item
+            elif (
+                roll < self.STORY_RATIO + self.JOB_RATIO + self.POLL_RATIO
+                # without room for its options, a comment comes instead
+                and item_id + 3 < end
+            ):
+                parts = [item_id + 1, item_id + 2, item_id + 3]
+                item.update(
+                    type="poll",
+                    title=self.words(6).capitalize(),
+                    score=int(rnd.paretovariate(1.1)),
+                    descendants=0,
+                    parts=parts,
+                )
+                yield item
+                for rank, part in enumerate(parts, start=1):
+                    yield {
+                        "id": part,
+                        "by": item["by"],
+                        "time": item["time"],
+                        "type": "pollopt",
+                        "poll": item_id,
+                        "title": f"Option {rank}",
+                        "score": rnd.randint(0, item["score"]),
+                    }
+                item_id += 4
+                continue
+            else:
+                # a thread weighted by its points, retired ones are
+                # dropped from `slots` lazily
+                while True:
+                    index = rnd.randrange(len(slots))
+                    root = slots[index]
+                    if root in active:
+                        break
+                    slots[index] = slots[-1]
+                    slots.pop()
+                nodes = active[root]
+                siblings = comments[root]
+                if siblings and rnd.random() < self.REPLY_RATIO:
+                    parent = nodes[rnd.choice(siblings)]
+                else:
+                    parent = nodes[root]
+                kids = parent.setdefault("kids", [])
+                item.update(
+                    type="comment",
+                    parent=parent["id"],
+                    text=self.words(25),
+                    root=root,
+                    path=parent.get("path", "") + threads.encode(len(kids)),
+                )
+                if rnd.random() < self.DEAD_RATIO:
+                    item["dead"] = True
+                elif rnd.random() < self.DELETED_RATIO:
+                    item["deleted"] = True
+                kids.append(item_id)
+                nodes[item_id] = item
+                siblings.append(item_id)
+
+            item_id += 1
+
+        while order:
+            yield from retire(order.popleft())
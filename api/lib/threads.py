@@ -0,0 +1,325 @@
+"""
+Maintains the comment threads at ingest.
+
+Every comment stores the id of the story at the `root` of its \
+    thread and a materialized path (see `Comment.path`), so that \
+        `Comment.objects.thread(story)` returns a whole thread in \
+            display order with a single `(root, path)` index scan.
+
+A batch only touches the comments it changes: a new comment \
+    takes the stored path of its parent plus its own rank, and \
+        when the `kids` of a stored item reorder its replies, the \
+            subtrees of the replies that moved are re-prefixed, see \
+                `repath`. Whole threads are only recomputed when a \
+                    parent arrives after its replies, which were \
+                        stored without a path.
+
+Usage:
+
+    threads.update(items)       # after storing a batch of payloads
+    threads.repath([8863])      # re-rank the replies of an item
+    threads.rethread([8863])    # recompute the paths of a story
+    threads.rebuild([8863])     # and re-resolve which comments it holds
+"""
+from __future__ import annotations
+
+from collections import defaultdict
+from functools import reduce
+from operator import or_
+from typing import Any
+from typing import Iterable
+
+from django.db.models import Q
+
+from api.models.models import Comment
+from api.models.models import Item
+
+
+ROOT_TYPES = ("story", "poll")
+"""Item types that can have a comment thread."""
+
+DIGITS = "0123456789abcdefghijklmnopqrstuvwxyz"
+
+BATCH_SIZE = 500
+
+MOVES_PER_QUERY = 100
+"""Moved subtrees read per query by `repath`."""
+
+
+def encode(rank: int) -> str:
+    """Encodes a sibling rank as a fixed width path segment."""
+    segment = ""
+    for _ in range(Comment.PATH_WIDTH):
+        rank, digit = divmod(rank, len(DIGITS))
+        segment = DIGITS[digit] + segment
+    return segment
+
+
+def ranked(kids: list[int] | None, replies: Iterable[int]) -> list[int]:
+    """
+    Orders `replies` as siblings: in the order of their parent's \
+        `kids`, those missing from it last, oldest first.
+    """
+    listed = {kid: rank for rank, kid in enumerate(kids or ())}
+    return sorted(replies, key=lambda kid: (listed.get(kid, len(listed)), kid))
+
+
+def paths(
+    roots: dict[int, list[int]], rows: Iterable[tuple]
+) -> dict[int, str]:
+    """
+    Computes the path of every comment reachable from `roots`, \
+        with siblings ordered by `ranked`.
+
+    Args:
+        roots (dict) - the `kids` of each root item, by id.
+
+        rows (Iterable) - `(id, parent, kids)` of the comments.
+    """
+    kids_of = dict(roots)
+    children = defaultdict(list)
+    for comment_id, parent, kids in rows:
+        kids_of[comment_id] = kids or []
+        children[parent].append(comment_id)
+
+    result = {}
+    stack = [(root, "") for root in roots]
+    while stack:
+        node, prefix = stack.pop()
+        ordered = ranked(kids_of.get(node), children.get(node, ()))
+        for rank, kid in enumerate(ordered):
+            result[kid] = prefix + encode(rank)
+            stack.append((kid, result[kid]))
+    return result
+
+
+def rethread(story_ids: Iterable[int]) -> int:
+    """
+    Recomputes the paths of every comment under `story_ids`.
+
+    Returns:
+        int: number of comments whose path changed.
+    """
+    story_ids = set(story_ids)
+    if not story_ids:
+        return 0
+
+    roots = dict(
+        Item.objects.filter(id__in=story_ids).values_list("id", "kids")
+    )
+    rows = list(
+        Comment.objects.filter(root__in=story_ids)
+        .order_by()
+        .values_list("id", "parent", "kids", "path")
+    )
+    current = {row[0]: row[3] for row in rows}
+    computed = paths(roots, (row[:3] for row in rows))
+
+    changed = [
+        Comment(pk=comment_id, path=path)
+        for comment_id, path in computed.items()
+        if current.get(comment_id) != path
+    ]
+    Comment.objects.bulk_update(changed, ["path"], batch_size=BATCH_SIZE)
+    return len(changed)
+
+
+def _level(pending: set[int]) -> dict[int, tuple]:
+    """
+    The `(root, path, kids)` of the shallowest items of `pending` \
+        whose path is known: stories and polls, and threaded \
+            comments.
+    """
+    known = {}
+    rows = Item.objects.filter(id__in=pending).values_list(
+        "id", "type", "kids", "comment__root", "comment__path"
+    )
+    for item_id, type, kids, root, path in rows:
+        if type in ROOT_TYPES:
+            known[item_id] = (item_id, "", kids)
+        elif root and path:
+            known[item_id] = (root, path, kids)
+    if not known:
+        return {}
+    depth = min(len(path) for _, path, _ in known.values())
+    return {
+        item_id: row for item_id, row in known.items() if len(row[1]) == depth
+    }
+
+
+def repath(parent_ids: Iterable[int]) -> int:
+    """
+    Ranks the replies of `parent_ids` from the stored path and \
+        `kids` of each parent, moving the subtrees of the replies \
+            whose path changed.
+
+    Parents are handled a depth at a time, shallowest first, so \
+        that a parent's own move is stored before its replies are \
+            ranked. Parents without a path yet (replies waiting for \
+                theirs) are left to `update`.
+
+    Returns:
+        int: number of comments whose path changed.
+    """
+    pending = set(parent_ids)
+    changed = 0
+    while pending:
+        level = _level(pending)
+        if not level:
+            break
+        pending -= level.keys()
+
+        replies = defaultdict(list)
+        current = {}
+        for comment_id, parent, path in (
+            Comment.objects.filter(parent__in=level)
+            .order_by()
+            .values_list("id", "parent", "path")
+        ):
+            replies[parent].append(comment_id)
+            current[comment_id] = path
+
+        computed, moved = {}, []
+        for parent, (root, prefix, kids) in level.items():
+            for rank, kid in enumerate(ranked(kids, replies[parent])):
+                path = prefix + encode(rank)
+                if current[kid] != path:
+                    computed[kid] = path
+                    if current[kid]:
+                        moved.append((root, current[kid], path))
+
+        for start in range(0, len(moved), MOVES_PER_QUERY):
+            chunk = moved[start : start + MOVES_PER_QUERY]
+            below = Comment.objects.filter(
+                reduce(
+                    or_,
+                    (
+                        Q(root=root, path__startswith=old)
+                        for root, old, _ in chunk
+                    ),
+                )
+            ).values_list("id", "root", "path")
+            prefixes = {(root, old): new for root, old, new in chunk}
+            widths = {len(old) for _, old, _ in chunk}
+            for comment_id, root, path in below:
+                for width in widths:
+                    new = prefixes.get((root, path[:width]))
+                    if new is not None and len(path) > width:
+                        computed[comment_id] = new + path[width:]
+
+        Comment.objects.bulk_update(
+            [Comment(pk=cid, path=path) for cid, path in computed.items()],
+            ["path"],
+            batch_size=BATCH_SIZE,
+        )
+        changed += len(computed)
+    return changed
+
+
+def adopt(frontier: dict[int, int]) -> dict[int, int]:
+    """
+    Finds the comments below `frontier` that don't know their \
+        story yet, e.g. because they were collected before their \
+            parent, level by level.
+
+    Args:
+        frontier (dict) - the story of each known item, by id.
+
+    Returns:
+        dict: the story of each adopted comment, by id.
+    """
+    adopted: dict[int, int] = {}
+    while frontier:
+        orphans = Comment.objects.filter(
+            parent__in=frontier, root__isnull=True
+        ).values_list("id", "parent")
+        frontier = {
+            comment_id: frontier[parent] for comment_id, parent in orphans
+        }
+        adopted.update(frontier)
+    return adopted
+
+
+def update(items: Iterable[dict[str, Any]]) -> int:
+    """
+    Threads a batch of freshly stored API payloads.
+
+    Resolves the story of every comment in the batch (and of \
+        orphans waiting for one of them). The threads that adopted \
+            orphans are recomputed whole; elsewhere only the replies \
+                of the batch's items and of its comments' parents are \
+                    ranked, see `repath`.
+
+    Returns:
+        int: number of comments whose path changed.
+    """
+    roots: set[int] = set()
+    parents: dict[int, int | None] = {}
+    for item in items:
+        if not item:
+            continue
+        if item.get("type") == "comment":
+            parents[item["id"]] = item.get("parent")
+        elif item.get("type") in ROOT_TYPES:
+            roots.add(item["id"])
+
+    outside = {p for p in parents.values() if p and p not in parents}
+    known = dict(
+        Comment.objects.filter(id__in=outside).values_list("id", "root")
+    )
+    roots |= set(
+        Item.objects.filter(
+            id__in=outside - known.keys(), type__in=ROOT_TYPES
+        ).values_list("id", flat=True)
+    )
+
+    story_of: dict[int, int | None] = {}
+    for comment_id in parents:
+        chain = []
+        node = comment_id
+        while node in parents and node not in story_of:
+            chain.append(node)
+            node = parents[node]
+        if node in story_of:
+            story = story_of[node]
+        else:
+            story = node if node in roots else known.get(node)
+        for link in chain:
+            story_of[link] = story
+
+    resolved = {cid: story for cid, story in story_of.items() if story}
+    _save_roots(resolved)
+    adopted = adopt({**resolved, **{root: root for root in roots}})
+    _save_roots(adopted)
+
+    late = set(adopted.values())
+    changed = rethread(late)
+    thread_of = {**known, **resolved}
+    dirty = {
+        item_id
+        for item_id in (*resolved, *roots, *parents.values())
+        if item_id and thread_of.get(item_id, item_id) not in late
+    }
+    return changed + repath(dirty)
+
+
+def rebuild(story_ids: Iterable[int]) -> int:
+    """
+    Resolves the story of every comment under `story_ids` from \
+        scratch, then recomputes their paths.
+
+    Returns:
+        int: number of comments whose path changed.
+    """
+    story_ids = list(story_ids)
+    Comment.objects.filter(root__in=story_ids).update(root=None)
+    _save_roots(adopt({story: story for story in story_ids}))
+    return rethread(story_ids)
+
+
+def _save_roots(story_of: dict[int, int]) -> None:
+    Comment.objects.bulk_update(
+        [Comment(pk=cid, root=story) for cid, story in story_of.items()],
+        ["root"],
+        batch_size=BATCH_SIZE,
+    )
@@ -0,0 +1,55 @@
+"""
+Helpers for converting between Hacker News timestamps and \
+    Python datetimes.
+
+The upstream API represents every point in time as a Unix \
+    timestamp (seconds since the epoch, UTC).
+"""
+from __future__ import annotations
+
+from datetime import datetime
+from datetime import timezone
+from typing import Optional
+
+from rest_framework import serializers
+
+
+def from_unix(timestamp: Optional[int]) -> Optional[datetime]:
+    """
+    Converts a Unix timestamp into an aware UTC datetime.
+
+    Args:
+        timestamp (int): seconds since the epoch, as sent by HN.
+    """
+    if timestamp is None:
+        return None
+    return datetime.fromtimestamp(int(timestamp), tz=timezone.utc)
+
+
+def to_unix(value: Optional[datetime]) -> Optional[int]:
+    """
+    Converts a datetime back into a Unix timestamp.
+    """
+    if value is None:
+        return None
+    return int(value.timestamp())
+
+
+class UnixTimeField(serializers.Field):
+    """
+    Serializes datetimes as Unix timestamps, the format used \
+        by the Hacker News API.
+    """
+
+    default_error_messages = {
+        "invalid": "Time must be a Unix timestamp.",
+    }
+
+    def to_representation(self, value: datetime) -> Optional[int]:
+        return to_unix(value)
+
+    def to_internal_value(self, data) -> datetime:
+        try:
+            return from_unix(int(data))
+        except (TypeError, ValueError, OverflowError, OSError):
+            self.fail("invalid")
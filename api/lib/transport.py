@@ -0,0 +1,286 @@
+"""
+Pluggable transports under `HackerNewsCollector`.
+
+The collector asks its transport for `(status, body)` of paths \
+    relative to the API root. Three modes, picked by \
+        `HACKER_NEWS_TRANSPORT`:
+
+    passthrough   talks to `HACKER_NEWSAPI_URI` over HTTP.
+    record        does the same, and writes every successful \
+                      response to `HACKER_NEWS_RECORDING`.
+    replay        serves the recorded responses, without any \
+                      network access; unrecorded paths are 404s.
+
+A recording is a `ResponseStore`: one SQLite file, keyed (and \
+    indexed) by path, holding zlib bodies compressed against a \
+        preset dictionary of the keys every HN payload repeats, so \
+            an item takes about 60% of its JSON size.
+
+Usage:
+
+    python manage.py crawl --transport record --recording hn.rec
+    python manage.py crawl --transport replay --recording hn.rec
+"""
+from __future__ import annotations
+
+import sqlite3
+import zlib
+from pathlib import Path
+
+import aiohttp
+from django.conf import settings
+
+
+PASSTHROUGH, RECORD, REPLAY = "passthrough", "record", "replay"
+MODES = (PASSTHROUGH, RECORD, REPLAY)
+
+ZDICT = (
+    b'"descendants":0,"parts":[,"poll":"parent":"submitted":['
+    b'"created":"karma":"about":"delay":0,"deleted":true,"dead":true,'
+    b'"text":"<p>","type":"pollopt","type":"job","type":"poll",'
+    b'"url":"https://www.","url":"https://","title":"Show HN: ",'
+    b'"title":"Ask HN: ","score":1,"time":1,"type":"comment",'
+    b'"type":"story","kids":[,"id":{"by":"'
+)
+"""Preset zlib dictionary: strings common to the upstream payloads, \
+    the likeliest last."""
+
+FORMAT = 1
+"""Version of the store layout and of `ZDICT`."""
+
+FLUSH_EVERY = 500
+"""Recorded responses buffered before they are written."""
+
+
+class ResponseStore:
+    """
+    An on-disk map of API paths to recorded responses.
+
+    Writes are buffered and committed every `FLUSH_EVERY` \
+        responses and on `close`; a path recorded twice keeps its \
+            latest response.
+
+    Args:
+        path (str) - file of the store, created if missing.
+
+        readonly (bool) - open an existing store for replay.
+    """
+
+    def __init__(self, path: str | Path, readonly: bool = False):
+        self.path = Path(path)
+        if readonly:
+            uri = f"{self.path.resolve().as_uri()}?mode=ro"
+            self.db = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        else:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self.db = sqlite3.connect(self.path, check_same_thread=False)
+            self.db.executescript(
+                "CREATE TABLE IF NOT EXISTS response ("
+                " path TEXT PRIMARY KEY, status INTEGER, body BLOB"
+                ") WITHOUT ROWID;"
+                "CREATE TABLE IF NOT EXISTS meta ("
+                " key TEXT PRIMARY KEY, value INTEGER);"
+            )
+            self.db.execute(
+                "INSERT OR IGNORE INTO meta VALUES ('format', ?)", (FORMAT,)
+            )
+            self.db.commit()
+        (version,) = self.db.execute(
+            "SELECT value FROM meta WHERE key = 'format'"
+        ).fetchone()
+        if version != FORMAT:
+            raise ValueError(f"{self.path} has store format {version}.")
+        self.pending: list[tuple[str, int, bytes]] = []
+
+    def __len__(self) -> int:
+        self.flush()
+        return self.db.execute("SELECT COUNT(*) FROM response").fetchone()[0]
+
+    @staticmethod
+    def compress(body: bytes) -> bytes:
+        packer = zlib.compressobj(9, zdict=ZDICT)
+        return packer.compress(body) + packer.flush()
+
+    @staticmethod
+    def decompress(data: bytes) -> bytes:
+        unpacker = zlib.decompressobj(zdict=ZDICT)
+        return unpacker.decompress(data) + unpacker.flush()
+
+    def get(self, path: str) -> tuple[int, bytes] | None:
+        """The recorded `(status, body)` of `path`, if any."""
+        row = self.db.execute(
+            "SELECT status, body FROM response WHERE path = ?", (path,)
+        ).fetchone()
+        if row is None:
+            return None
+        return row[0], self.decompress(row[1])
+
+    def put(self, path: str, status: int, body: bytes) -> None:
+        self.pending.append((path, status, self.compress(body)))
+        if len(self.pending) >= FLUSH_EVERY:
+            self.flush()
+
+    def flush(self) -> None:
+        if self.pending:
+            with self.db:
+                self.db.executemany(
+                    "INSERT OR REPLACE INTO response VALUES (?, ?, ?)",
+                    self.pending,
+                )
+            self.pending = []
+
+    def close(self) -> None:
+        self.flush()
+        self.db.close()
+
+
+class Throttled(Exception):
+    """
+    The API refused a request, asking to retry it after \
+        `retry_after` seconds.
+    """
+
+    def __init__(self, status: int, retry_after: float):
+        super().__init__(status, retry_after)
+        self.status = status
+        self.retry_after = retry_after
+
+
+def retry_after(value: str | None) -> float | None:
+    """
+    The delay of a `Retry-After` header, in seconds; `None` if \
+        missing, or given as a date.
+    """
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        return None
+
+
+class Transport:
+    """
+    Fetches API paths. Used as an async context manager, which \
+        acquires and releases its resources.
+    """
+
+    async def __aenter__(self) -> Transport:
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        pass
+
+    async def get(self, path: str) -> tuple[int, bytes]:
+        """
+        Returns the status and body of `path`.
+
+        Raises:
+            aiohttp.ClientError, asyncio.TimeoutError: when the \
+                request failed, and may be retried.
+
+            Throttled: when the API asked to retry later.
+        """
+        raise NotImplementedError
+
+
+class HTTPTransport(Transport):
+    """
+    Talks to the API over one `aiohttp` connection pool.
+
+    Args:
+        base_url (str) - API root.
+
+        concurrency (int) - maximum number of open connections.
+
+        timeout (float) - per request timeout, in seconds.
+    """
+
+    def __init__(self, base_url: str, concurrency: int, timeout: float):
+        self.base_url = base_url.rstrip("/")
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.session: aiohttp.ClientSession | None = None
+
+    async def __aenter__(self) -> HTTPTransport:
+        connector = aiohttp.TCPConnector(
+            limit=self.concurrency, ttl_dns_cache=300
+        )
+        self.session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=self.timeout),
+        )
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.session.close()
+        self.session = None
+
+    async def get(self, path: str) -> tuple[int, bytes]:
+        async with self.session.get(f"{self.base_url}/{path}") as resp:
+            if resp.status in (429, 503):
+                delay = retry_after(resp.headers.get("Retry-After"))
+                if delay is not None:
+                    raise Throttled(resp.status, delay)
+            return resp.status, await resp.read()
+
+
+class RecordingTransport(Transport):
+    """
+    Wraps `inner`, writing its successful responses to `store`.
+    """
+
+    def __init__(self, inner: Transport, store: ResponseStore):
+        self.inner = inner
+        self.store = store
+
+    async def __aenter__(self) -> RecordingTransport:
+        await self.inner.__aenter__()
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        try:
+            await self.inner.__aexit__(*exc_info)
+        finally:
+            self.store.close()
+
+    async def get(self, path: str) -> tuple[int, bytes]:
+        status, body = await self.inner.get(path)
+        if status == 200:
+            self.store.put(path, status, body)
+        return status, body
+
+
+class ReplayTransport(Transport):
+    """Serves the responses recorded in `store`."""
+
+    def __init__(self, store: ResponseStore):
+        self.store = store
+
+    async def __aexit__(self, *exc_info) -> None:
+        self.store.close()
+
+    async def get(self, path: str) -> tuple[int, bytes]:
+        return self.store.get(path) or (404, b"")
+
+
+def get_transport(
+    base_url: str,
+    concurrency: int,
+    timeout: float,
+    mode: str | None = None,
+    recording: str | None = None,
+) -> Transport:
+    """
+    Builds the transport of `mode`, defaulting to the \
+        `HACKER_NEWS_TRANSPORT` and `HACKER_NEWS_RECORDING` settings.
+    """
+    mode = mode or settings.HACKER_NEWS_TRANSPORT
+    recording = recording or settings.HACKER_NEWS_RECORDING
+    if mode not in MODES:
+        raise ValueError(f"Unknown transport {mode!r}, expected {MODES}.")
+
+    if mode == REPLAY:
+        return ReplayTransport(ResponseStore(recording, readonly=True))
+    http = HTTPTransport(base_url, concurrency, timeout)
+    if mode == RECORD:
+        return RecordingTransport(http, ResponseStore(recording))
+    return http
@@ -0,0 +1,69 @@
+"""
+Runs one of the suites in `api.benchmarks`.
+
+    python manage.py benchmark persistence --sizes 10000 100000
+    python manage.py benchmark persistence --output results.json
+    python manage.py benchmark endpoints --compare results.json
+
+With `--compare`, the numbers that moved by more than \
+    `--threshold` since an earlier `--output` are listed on stderr.
+"""
+from __future__ import annotations
+
+import json
+from importlib import import_module
+
+from django.core.management.base import BaseCommand
+
+from api.benchmarks import compare
+from api.benchmarks import SUITES
+
+
+class Command(BaseCommand):
+    help = "Runs a benchmark suite and prints its results as JSON."
+
+    def add_arguments(self, parser):
+        parser.add_argument("suite", choices=sorted(SUITES))
+        parser.add_argument(
+            "--sizes",
+            type=int,
+            nargs="+",
+            help="Dataset sizes to measure, where the suite supports it.",
+        )
+        parser.add_argument("--output", help="Also write results here.")
+        parser.add_argument(
+            "--compare", help="Results of an earlier run to compare with."
+        )
+        parser.add_argument(
+            "--threshold",
+            type=float,
+            default=0.1,
+            help="Relative change worth reporting, with --compare.",
+        )
+
+    def handle(self, *args, **options):
+        suite = import_module(SUITES[options["suite"]])
+        kwargs = {"sizes": options["sizes"]} if options["sizes"] else {}
+        results = suite.run(**kwargs)
+
+        report = json.dumps(results, indent=2, default=str)
+        self.stdout.write(report)
+        if options["output"]:
+            with open(options["output"], "w") as fp:
+                fp.write(report)
+        if options["compare"]:
+            with open(options["compare"]) as fp:
+                baseline = json.load(fp)
+            self.report_changes(
+                compare(baseline, json.loads(report)), options["threshold"]
+            )
+
+    def report_changes(self, changes: dict, threshold: float) -> None:
+        for path, change in changes.items():
+            if change["change"] is None or abs(change["change"]) < threshold:
+                continue
+            self.stderr.write(
+                f"{path}: {change['before']:.6g} -> {change['after']:.6g} "
+                f"({change['change']:+.0%})",
+                self.style.WARNING,
+            )
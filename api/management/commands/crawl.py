@@ -0,0 +1,81 @@
+"""
+Runs the collector once and reports its throughput.
+
+    python manage.py crawl --concurrency 64 --max-items 20000
+    python manage.py crawl --base-url http://127.0.0.1:8001/v0 --no-save
+    python manage.py crawl --sync
+    python manage.py crawl --transport record --recording hn.rec
+    python manage.py crawl --transport replay --recording hn.rec --no-save
+"""
+from __future__ import annotations
+
+import asyncio
+
+from django.core.management.base import BaseCommand
+
+from api.lib import persistence
+from api.lib import transport
+from api.lib.collector import HackerNewsCollector
+
+
+class Command(BaseCommand):
+    help = "Crawls the Hacker News API and reports items/sec."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--base-url", help="API root to crawl.")
+        parser.add_argument("--concurrency", type=int)
+        parser.add_argument("--max-items", type=int)
+        parser.add_argument(
+            "--transport",
+            choices=transport.MODES,
+            help="Defaults to the HACKER_NEWS_TRANSPORT setting.",
+        )
+        parser.add_argument(
+            "--recording", help="Store to record to or replay from."
+        )
+        parser.add_argument(
+            "--seeds",
+            type=int,
+            nargs="*",
+            help="Item ids to start from, defaults to the top stories.",
+        )
+        parser.add_argument(
+            "--sync",
+            action="store_true",
+            help="Run an incremental sync, as the sync_db task does.",
+        )
+        parser.add_argument(
+            "--no-save",
+            action="store_true",
+            help="Only fetch, don't write to the database.",
+        )
+
+    def handle(self, *args, **options):
+        collector = HackerNewsCollector(
+            base_url=options["base_url"],
+            concurrency=options["concurrency"],
+            max_items=options["max_items"],
+            transport=options["transport"],
+            recording=options["recording"],
+        )
+        if options["sync"]:
+            asyncio.run(self._sync(collector))
+            self.stdout.write(f"Synced {collector.stats}")
+            return
+
+        items = asyncio.run(self._crawl(collector, options["seeds"]))
+        self.stdout.write(f"Fetched {collector.stats}")
+
+        if not options["no_save"]:
+            saved = persistence.save_items(items)
+            self.stdout.write(f"Saved {sum(saved.values())} items.")
+
+    async def _crawl(self, collector, seeds):
+        async with collector:
+            if not seeds:
+                seeds = await collector.fetch_json("topstories.json") or []
+            return await collector.crawl(seeds)
+
+    async def _sync(self, collector):
+        async with collector:
+            return await collector.sync()
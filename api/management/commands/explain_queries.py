@@ -0,0 +1,97 @@
+"""
+Prints the query plan of every hot query, to check that they use \
+    the indexes from `api.models.models` on the current database.
+
+    python manage.py explain_queries
+    python manage.py explain_queries --analyze   # Postgres only
+"""
+from __future__ import annotations
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Q
+from django.utils import timezone
+
+from api.models.models import Comment
+from api.models.models import FrontPageRank
+from api.models.models import Item
+from api.models.models import ListEntry
+from api.models.models import Story
+
+
+def hot_queries() -> dict:
+    """
+    The query shapes issued by `DisplayNewsView`, \
+        `GetLatestNewsAPIView` (with its `filterset_fields`, offset \
+            and keyset pages), the stories endpoint, the comment \
+                threads of `get_item_view` and the front page (its \
+                    slots and `ranking.rank_front_page`) and the story \
+                        lists, keyed by a short description.
+    """
+    now = timezone.now()
+    after = Q(time__gt=now) | Q(time=now, id__gt=0)
+    item = Item.objects.order_by("-id").first()
+    author = item.by_id if item else ""
+    reply = Comment.objects.exclude(root=None).order_by("-id").first()
+    reply = reply or Comment(id=0, root=0, path="0000")
+
+    return {
+        "home page": Item.objects.exclude(type="comment")
+        .exclude(type="pollopt")
+        .order_by("time")
+        .with_subtypes()[:25],
+        "home page, filtered by type": Item.objects.filter(type="story")
+        .order_by("time")
+        .with_subtypes()[:25],
+        "news, offset page": Item.objects.filter(time__isnull=False).order_by(
+            "time", "id"
+        )[500:510],
+        "news, first page": Item.objects.filter(time__isnull=False).order_by(
+            "time", "id"
+        )[:11],
+        "news, next page": Item.objects.filter(time__isnull=False)
+        .filter(after)
+        .order_by("time", "id")[:11],
+        "news, ?type=": Item.objects.filter(type="story", time__isnull=False)
+        .filter(after)
+        .order_by("time", "id")[:11],
+        "news, ?by=": Item.objects.filter(
+            by=author, time__isnull=False
+        ).order_by("time", "id")[:11],
+        "stories, next page": Story.objects.filter(time__isnull=False)
+        .filter(after)
+        .order_by("time", "id")[:11],
+        "item page, thread": Comment.objects.thread(Story(id=reply.root)),
+        "item page of a comment, thread": Comment.objects.thread(reply),
+        "front page, next page": FrontPageRank.objects.select_related(
+            "item"
+        ).filter(rank__gt=30)[:31],
+        "front page candidates": Item.objects.filter(
+            type="story", time__gte=now, dead=False, deleted=False
+        ).values_list("id", "story__score", "time"),
+        "story list, next page": ListEntry.objects.filter(name="top")
+        .select_related("item__story", "item__job", "item__poll")
+        .filter(rank__gt=30)
+        .order_by("rank")[:31],
+    }
+
+
+class Command(BaseCommand):
+    help = "Runs EXPLAIN on the hot queries of the API and the site."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--analyze",
+            action="store_true",
+            help="Execute the queries too (EXPLAIN ANALYZE, Postgres).",
+        )
+
+    def handle(self, *args, **options):
+        explain = {}
+        if options["analyze"] and connection.vendor == "postgresql":
+            explain["analyze"] = True
+
+        for name, queryset in hot_queries().items():
+            self.stdout.write(self.style.MIGRATE_HEADING(name))
+            self.stdout.write(queryset.explain(**explain))
+            self.stdout.write("")
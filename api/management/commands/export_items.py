@@ -0,0 +1,93 @@
+"""
+Dumps the items as NDJSON, like `/api/v1/news/export`, see \
+    `api.lib.export`.
+
+    python manage.py export_items --output items.ndjson.gz
+    python manage.py export_items --type story --since 1672531200 \
+        --fields id,by,time > stories.ndjson
+
+Output is gzipped with `--gzip` or a name ending in `.gz`; the rate \
+    is reported on stderr.
+"""
+from __future__ import annotations
+
+import json
+import sys
+import time
+from contextlib import nullcontext
+
+from django.core.management.base import BaseCommand
+from django.core.management.base import CommandError
+from rest_framework.exceptions import ValidationError
+
+from api.lib import export
+from api.lib.rows import names
+from api.lib.rows import narrow
+from api.serializers import BaseItemSerializer
+from api.serializers import EXPANSIONS
+
+
+FILTERS = ("type", "by", "since", "until")
+
+
+class Command(BaseCommand):
+    help = "Streams the items, filtered by type and time, as NDJSON."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--type")
+        parser.add_argument("--by", help="Id of the author.")
+        parser.add_argument(
+            "--since", type=int, help="Unix time of the oldest items."
+        )
+        parser.add_argument(
+            "--until", type=int, help="Unix time the items precede."
+        )
+        parser.add_argument("--fields", help="Keys to export, e.g. id,title.")
+        parser.add_argument("--expand", help="Relations to nest, e.g. by.")
+        parser.add_argument(
+            "--output", help="File written, stdout by default."
+        )
+        parser.add_argument("--gzip", action="store_true")
+        parser.add_argument("--chunk-size", type=int)
+
+    def handle(self, *args, **options):
+        params = {
+            name: options[name]
+            for name in FILTERS
+            if options[name] is not None
+        }
+        try:
+            queryset = export.items(params)
+            rows = narrow(
+                BaseItemSerializer,
+                names(options["fields"]),
+                names(options["expand"]) or frozenset(),
+                EXPANSIONS,
+            )
+        except ValidationError as exc:
+            raise CommandError(json.dumps(exc.detail))
+
+        written = 0
+
+        def counted(blocks):
+            nonlocal written
+            for block in blocks:
+                written += block.count(b"\n")
+                yield block
+
+        output = options["output"]
+        content = counted(export.lines(rows, queryset, options["chunk_size"]))
+        if options["gzip"] or (output or "").endswith(".gz"):
+            content = export.gzipped(content)
+
+        started = time.perf_counter()
+        with open(output, "wb") if output else nullcontext(
+            sys.stdout.buffer
+        ) as out:
+            for block in content:
+                out.write(block)
+        elapsed = time.perf_counter() - started
+        self.stderr.write(
+            f"Exported {written} items in {elapsed:.1f}s, "
+            f"{written / max(elapsed, 1e-9):.0f} items/sec."
+        )
@@ -0,0 +1,83 @@
+"""
+Fills the database with a large synthetic dataset, see \
+    `api.lib.synthetic.DatasetGenerator`.
+
+    python manage.py generate_dataset --items 10000000
+    python manage.py generate_dataset --items 100000 --days 30 --seed 1
+
+New ids start above the highest stored one, so runs add up. The \
+    search indexes and the front page are left alone: run \
+        `manage.py reindex` and the `rank_front_page` task after.
+"""
+from __future__ import annotations
+
+import time
+from itertools import islice
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Max
+from django.utils import timezone
+
+from api.lib import cache
+from api.lib import persistence
+from api.lib.synthetic import DatasetGenerator
+from api.models.models import Item
+
+
+SQLITE_CACHE_KB = 512 * 1024
+"""Page cache of the SQLite connection during the load: inserts \
+    slow down a lot once the indexes outgrow the default 2MB."""
+
+
+class Command(BaseCommand):
+    help = "Bulk-generates synthetic items with realistic distributions."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--items", type=int, default=1_000_000)
+        parser.add_argument(
+            "--users",
+            type=int,
+            help="Distinct authors, defaults to one per 20 items.",
+        )
+        parser.add_argument(
+            "--days",
+            type=int,
+            default=365,
+            help="Days the items are spread over, up to now.",
+        )
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--batch-size", type=int, default=50_000)
+
+    def handle(self, *args, **options):
+        size = options["items"]
+        span = options["days"] * 86400
+        first_id = (Item.objects.aggregate(last=Max("id"))["last"] or 0) + 1
+        generator = DatasetGenerator(
+            size=size,
+            users=options["users"] or max(size // 20, 1),
+            start=int(timezone.now().timestamp()) - span,
+            span=span,
+            first_id=first_id,
+            seed=options["seed"],
+        )
+
+        if connection.vendor == "sqlite":
+            with connection.cursor() as cursor:
+                cursor.execute(f"PRAGMA cache_size = -{SQLITE_CACHE_KB}")
+
+        items = iter(generator)
+        written = 0
+        started = time.perf_counter()
+        while batch := list(islice(items, options["batch_size"])):
+            written += persistence.insert_items(batch)
+            elapsed = time.perf_counter() - started
+            self.stdout.write(
+                f"{written}/{size} items, {written / elapsed:.0f} items/sec"
+            )
+
+        cache.bump_data_version()
+        self.stdout.write(
+            f"Generated items {first_id} to {first_id + size - 1} in "
+            f"{time.perf_counter() - started:.1f}s."
+        )
@@ -0,0 +1,71 @@
+"""
+Serves synthetic data with the layout of the Hacker News API.
+
+    python manage.py hn_standin --items 100000 --port 8001
+    HACKER_NEWSAPI_URI=http://127.0.0.1:8001/v0 python manage.py crawl
+
+    # a slow, flaky and rate limited upstream
+    python manage.py hn_standin --latency 0.05 --jitter 0.1 \
+        --error-rate 0.02 --rate-limit 500
+    curl http://127.0.0.1:8001/_stats.json
+"""
+from __future__ import annotations
+
+from django.core.management.base import BaseCommand
+
+from api.lib import standin
+from api.lib.synthetic import SyntheticDataset
+
+
+class Command(BaseCommand):
+    help = "Runs a local stand-in for the Hacker News API."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--host", default="127.0.0.1")
+        parser.add_argument("--port", type=int, default=8001)
+        parser.add_argument("--items", type=int, default=10_000)
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument(
+            "--latency",
+            type=float,
+            default=0.0,
+            help="Seconds added to every response.",
+        )
+        parser.add_argument(
+            "--jitter",
+            type=float,
+            default=0.0,
+            help="Random extra latency, up to this many seconds.",
+        )
+        parser.add_argument(
+            "--error-rate",
+            type=float,
+            default=0.0,
+            help="Share of requests answered with a 500 or a 503.",
+        )
+        parser.add_argument(
+            "--rate-limit",
+            type=float,
+            default=0.0,
+            help="Requests per second served before answering 429.",
+        )
+
+    def handle(self, *args, **options):
+        dataset = SyntheticDataset(size=options["items"], seed=options["seed"])
+        self.stdout.write(
+            f"Serving {dataset.size} items on "
+            f"http://{options['host']}:{options['port']}/v0"
+        )
+        conditions = standin.Conditions(
+            latency=options["latency"],
+            jitter=options["jitter"],
+            error_rate=options["error_rate"],
+            rate_limit=options["rate_limit"],
+            seed=options["seed"],
+        )
+        standin.run(
+            dataset,
+            host=options["host"],
+            port=options["port"],
+            conditions=conditions,
+        )
@@ -0,0 +1,90 @@
+"""
+Rebuilds the search indexes from the stored items, e.g. after \
+    upgrading a database collected before they existed.
+
+    python manage.py reindex
+"""
+from __future__ import annotations
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.core.management.base import CommandError
+from django.db import connection
+from django.db import transaction
+
+from api.models.models import Item
+from api.search import backends
+from api.search.index import InvertedIndex
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the full-text search indexes of every item."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument(
+            "--segment-size",
+            type=int,
+            default=100_000,
+            help="Items per segment of the BM25 index.",
+        )
+
+    def handle(self, *args, **options):
+        backend = backends.get_backend()
+        bm25 = settings.SEARCH_INDEX_PATH and InvertedIndex(
+            settings.SEARCH_INDEX_PATH
+        )
+        if backend is None and not bm25:
+            raise CommandError(f"No search index for {connection.vendor}.")
+        size = options["batch_size"]
+        items = (
+            Item.objects.with_subtypes()
+            .order_by("id")
+            .iterator(chunk_size=size)
+        )
+        indexed = 0
+        batch, segment = [], []
+        replace = True
+
+        def flush_segment():
+            nonlocal segment, replace
+            docs = [backends.document(item) for item in segment]
+            removed = [
+                item["id"] for item, doc in zip(segment, docs) if not doc
+            ]
+            bm25.add([doc for doc in docs if doc], removed, replace=replace)
+            segment, replace = [], False
+
+        with transaction.atomic():
+            if backend is not None:
+                with connection.cursor() as cursor:
+                    cursor.execute(f"DELETE FROM {backends.TABLE}")
+            for item in items:
+                obj = item.get_type()
+                batch.append(
+                    {
+                        "id": obj.id,
+                        "type": obj.type,
+                        "title": getattr(obj, "title", None),
+                        "text": getattr(obj, "text", None),
+                        "deleted": obj.deleted,
+                        "dead": obj.dead,
+                    }
+                )
+                if len(batch) >= size:
+                    if backend is not None:
+                        backends.index_items(batch)
+                    if bm25:
+                        segment += batch
+                        if len(segment) >= options["segment_size"]:
+                            flush_segment()
+                    indexed += len(batch)
+                    batch = []
+            if backend is not None:
+                backends.index_items(batch)
+            indexed += len(batch)
+            if bm25:
+                segment += batch
+                flush_segment()
+
+        self.stdout.write(f"Indexed {indexed} items.")
@@ -0,0 +1,35 @@
+"""
+Rebuilds the story and path of every stored comment, e.g. after \
+    upgrading a database collected before threads were stored.
+
+    python manage.py rethread
+"""
+from __future__ import annotations
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from api.lib import threads
+from api.models.models import Item
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the comment threads of every story and poll."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        roots = Item.objects.filter(type__in=threads.ROOT_TYPES).values_list(
+            "id", flat=True
+        )
+        roots = list(roots.order_by("id"))
+        size = options["batch_size"]
+        changed = 0
+
+        for start in range(0, len(roots), size):
+            batch = roots[start : start + size]
+            with transaction.atomic():
+                changed += threads.rebuild(batch)
+
+        self.stdout.write(f"Rethreaded {len(roots)} threads, {changed} paths.")
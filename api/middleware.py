@@ -0,0 +1,76 @@
+from __future__ import annotations
+
+import asyncio
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import HttpRequest
+from django.http import HttpResponse
+from django.utils.decorators import sync_and_async_middleware
+
+from api.lib import metrics
+
+
+UNMATCHED = "<unmatched>"
+"""Route of the requests that resolved to no view, e.g. 404s."""
+
+
+def route_of(request: HttpRequest) -> str:
+    """The URL pattern `request` resolved to, without regex anchors."""
+    match = request.resolver_match
+    if not match or not match.route:
+        return UNMATCHED
+    return match.route.replace("^", "").removesuffix("$")
+
+
+def _record(request, response, started, stats) -> bool:
+    return metrics.record(
+        route_of(request),
+        request.method,
+        response.status_code,
+        time.perf_counter() - started,
+        stats,
+    )
+
+
+@sync_and_async_middleware
+def metrics_middleware(get_response):
+    """
+    Records the latency, queries and serializer time of every \
+        request, see `api.lib.metrics`. Disabled by \
+            `METRICS_ENABLED = False`.
+    """
+    if not settings.METRICS_ENABLED:
+        raise MiddlewareNotUsed
+
+    if asyncio.iscoroutinefunction(get_response):
+
+        async def middleware(request: HttpRequest) -> HttpResponse:
+            stats = metrics.RequestStats()
+            token = metrics.current.set(stats)
+            started = time.perf_counter()
+            try:
+                response = await get_response(request)
+            finally:
+                metrics.current.reset(token)
+            if _record(request, response, started, stats):
+                await sync_to_async(metrics.flush)()
+            return response
+
+    else:
+
+        def middleware(request: HttpRequest) -> HttpResponse:
+            stats = metrics.RequestStats()
+            token = metrics.current.set(stats)
+            started = time.perf_counter()
+            try:
+                response = get_response(request)
+            finally:
+                metrics.current.reset(token)
+            if _record(request, response, started, stats):
+                metrics.flush()
+            return response
+
+    return middleware
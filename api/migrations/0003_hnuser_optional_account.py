@@ -0,0 +1,60 @@
+# Generated by Django 4.0.10 on 2026-10-18 09:52
+from __future__ import annotations
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations
+from django.db import models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        (
+            "api",
+            "0002_alter_item_by_alter_item_dead_alter_item_deleted_and_more",
+        ),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name="item",
+            options={"ordering": ["time"]},
+        ),
+        migrations.AlterField(
+            model_name="hnuser",
+            name="karma",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AlterField(
+            model_name="hnuser",
+            name="uid",
+            field=models.CharField(
+                max_length=25,
+                primary_key=True,
+                serialize=False,
+                unique=True,
+                verbose_name="Unique User ID",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="hnuser",
+            name="user",
+            field=models.OneToOneField(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="user",
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+        migrations.AlterField(
+            model_name="item",
+            name="time",
+            field=models.DateTimeField(
+                blank=True, default=django.utils.timezone.now, null=True
+            ),
+        ),
+    ]
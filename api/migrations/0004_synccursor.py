@@ -0,0 +1,29 @@
+# Generated by Django 4.0.10 on 2026-10-18 09:53
+from __future__ import annotations
+
+from django.db import migrations
+from django.db import models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0003_hnuser_optional_account"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SyncCursor",
+            fields=[
+                (
+                    "name",
+                    models.CharField(
+                        max_length=40, primary_key=True, serialize=False
+                    ),
+                ),
+                ("high_water", models.PositiveIntegerField(default=0)),
+                ("backfill", models.PositiveIntegerField(default=0)),
+                ("updated", models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.0.10 on 2026-10-18 09:55
+from __future__ import annotations
+
+from django.db import migrations
+from django.db import models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0004_synccursor"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="hnuser",
+            name="synced_at",
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="item",
+            name="synced_at",
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.0.10 on 2026-10-18 10:04
+from __future__ import annotations
+
+from django.db import migrations
+from django.db import models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0005_synced_at"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="comment",
+            index=models.Index(fields=["parent"], name="comment_parent_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="item",
+            index=models.Index(fields=["time", "id"], name="item_time_id_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="item",
+            index=models.Index(
+                fields=["type", "time", "id"], name="item_type_time_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="item",
+            index=models.Index(fields=["by", "time"], name="item_by_time_idx"),
+        ),
+    ]
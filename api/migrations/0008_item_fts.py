@@ -0,0 +1,54 @@
+"""
+Creates the full-text index of `api.search.backends`.
+
+Items stored before this migration are indexed with:
+
+    python manage.py reindex
+"""
+from __future__ import annotations
+
+from django.db import migrations
+
+
+SQLITE = {
+    "create": [
+        "CREATE VIRTUAL TABLE api_item_fts USING fts5("
+        "type UNINDEXED, title, text, tokenize='porter unicode61')",
+    ],
+    "drop": ["DROP TABLE api_item_fts"],
+}
+
+POSTGRES = {
+    "create": [
+        "CREATE TABLE api_item_fts ("
+        "item_id integer PRIMARY KEY, "
+        "type varchar(10) NOT NULL, "
+        "document tsvector NOT NULL)",
+        "CREATE INDEX api_item_fts_document_idx "
+        "ON api_item_fts USING GIN (document)",
+        "CREATE INDEX api_item_fts_type_idx ON api_item_fts (type)",
+    ],
+    "drop": ["DROP TABLE api_item_fts"],
+}
+
+STATEMENTS = {"sqlite": SQLITE, "postgresql": POSTGRES}
+
+
+def run(action):
+    def operation(apps, schema_editor):
+        statements = STATEMENTS.get(schema_editor.connection.vendor)
+        for sql in (statements or {}).get(action, ()):
+            schema_editor.execute(sql)
+
+    return operation
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0007_comment_threads"),
+    ]
+
+    operations = [
+        migrations.RunPython(run("create"), run("drop")),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 4.0.10 on 2026-10-18 10:32
+from __future__ import annotations
+
+from django.db import migrations
+from django.db import models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0008_item_fts"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="item",
+            name="changed_at",
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="item",
+            name="digest",
+            field=models.CharField(
+                blank=True, default="", editable=False, max_length=40
+            ),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 4.0.10 on 2026-10-18 10:33
+from __future__ import annotations
+
+import django.db.models.deletion
+from django.db import migrations
+from django.db import models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0009_item_digest"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="FrontPageRank",
+            fields=[
+                (
+                    "rank",
+                    models.PositiveIntegerField(
+                        primary_key=True, serialize=False
+                    ),
+                ),
+                ("score", models.FloatField()),
+                ("ranked_at", models.DateTimeField()),
+                (
+                    "item",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="front_page_rank",
+                        to="api.story",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["rank"],
+            },
+        ),
+    ]
@@ -0,0 +1,69 @@
+# Generated by Django 4.0.10 on 2026-10-18 10:36
+from __future__ import annotations
+
+import django.db.models.deletion
+from django.db import migrations
+from django.db import models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0010_front_page_rank"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ListEntry",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "name",
+                    models.CharField(
+                        choices=[
+                            ("top", "top"),
+                            ("new", "new"),
+                            ("best", "best"),
+                            ("ask", "ask"),
+                            ("show", "show"),
+                            ("job", "job"),
+                        ],
+                        max_length=8,
+                    ),
+                ),
+                ("rank", models.PositiveIntegerField()),
+                (
+                    "item",
+                    models.ForeignKey(
+                        db_constraint=False,
+                        on_delete=django.db.models.deletion.DO_NOTHING,
+                        related_name="list_entries",
+                        to="api.item",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["name", "rank"],
+            },
+        ),
+        migrations.AddIndex(
+            model_name="listentry",
+            index=models.Index(
+                fields=["name", "rank"], name="list_entry_rank_idx"
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="listentry",
+            constraint=models.UniqueConstraint(
+                fields=("name", "item"), name="list_entry_item_uniq"
+            ),
+        ),
+    ]
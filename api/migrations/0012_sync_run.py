@@ -0,0 +1,60 @@
+# Generated by Django 4.0.10 on 2026-10-18 11:03
+from __future__ import annotations
+
+from django.db import migrations
+from django.db import models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0011_list_entry"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SyncRun",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "kind",
+                    models.CharField(
+                        choices=[("sync", "sync"), ("changes", "changes")],
+                        max_length=8,
+                    ),
+                ),
+                ("started_at", models.DateTimeField()),
+                ("seconds", models.FloatField()),
+                ("fetched", models.PositiveIntegerField(default=0)),
+                ("failed", models.PositiveIntegerField(default=0)),
+                ("retries", models.PositiveIntegerField(default=0)),
+                ("requests", models.PositiveIntegerField(default=0)),
+                ("fetch_p50", models.FloatField(null=True)),
+                ("fetch_p95", models.FloatField(null=True)),
+                ("fetch_p99", models.FloatField(null=True)),
+                ("fetch_seconds", models.FloatField(default=0.0)),
+                ("parse_seconds", models.FloatField(default=0.0)),
+                ("write_seconds", models.FloatField(default=0.0)),
+                ("rows", models.JSONField(default=dict)),
+                ("backlog", models.PositiveIntegerField(null=True)),
+                ("error", models.CharField(blank=True, max_length=200)),
+            ],
+            options={
+                "ordering": ["-started_at"],
+            },
+        ),
+        migrations.AddIndex(
+            model_name="syncrun",
+            index=models.Index(
+                fields=["kind", "-started_at"], name="sync_run_kind_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.0.10 on 2026-10-18 11:23
+from __future__ import annotations
+
+from django.db import migrations
+from django.db import models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0012_sync_run"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="synccursor",
+            name="locked_until",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="synccursor",
+            name="retry",
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
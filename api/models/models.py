@@ -11,20 +11,24 @@ Models here, are represented as Python Dataclasses, \
 #  models.py
 
 
+import hashlib
+import json
+from datetime import timedelta
 from logging import getLogger
 from typing import Dict
+from typing import Iterable
 from django.utils import timezone
 
 
 from django.db import models
+from django.db.models import Q
 from django.utils.translation import gettext_lazy as _
 from rest_framework.serializers import Serializer
 from django.urls import reverse
-import requests
 from django.contrib.auth.models import AbstractUser
 
-from rest_framework import status
 from django.conf import settings
+from asgiref.sync import async_to_sync
 
 from django.contrib.auth import get_user_model
 from django.shortcuts import get_object_or_404
@@ -122,18 +126,26 @@ class HNUser(models.Model):
 
         submitted (Iterable[int]) - list of the user's stories \
             polls and comments.
+
+        synced_at (datetime.datetime) - when the profile was last \
+            fetched from the API.
     """
 
     uid = models.CharField(
         _("Unique User ID"), max_length=25, primary_key=True, unique=True
     )
     user = models.OneToOneField(
-        User, related_name="user", on_delete=models.CASCADE
+        User,
+        related_name="user",
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
     )
     delay = models.IntegerField(default=0)
     created = models.DateTimeField(auto_now=True)
-    karma = models.PositiveIntegerField()
+    karma = models.PositiveIntegerField(default=0)
     submitted = models.JSONField(default=list)
+    synced_at = models.DateTimeField(null=True, blank=True, editable=False)
 
     USERNAME_FIELD = "uid"
 
@@ -162,31 +174,49 @@ class HNUser(models.Model):
         """
         return get_object_or_404(HNUser, pk=uid)
 
-    def fetch_user_details(self, uid: str) -> dict:
+    def fetch_user_details(self, uid: str) -> dict | None:
         """
         Fetch user details from Hacker News Public API.
 
+        Falls back to the stored profile when the API can't be \
+            reached, see `api.lib.profiles`, which also fetches \
+                many profiles at once.
+
+        For sync callers: `async_to_sync` raises `RuntimeError` \
+            on a thread running an event loop, so async views \
+                await `afetch_user_details` instead.
+
         Args:
             uid (int) - the user's uid
         Returns:
             data (Dict) - Json data fetched from their API.
         """
-        url = f"{BASE_URL}/user/{uid}.json"
-        try:
-            response = requests.request("GET", url=url)
-        except ConnectionError:
-            logger.info(
-                f"Error fetching data from API. "
-                f"Please check your internet connection."
-            )
-            # instead of reeturning an empty object we could \
-            # return objct in the db
-            # return {}
-            return HNUser.retrieve_profile_from_db(uid)
+        from api.lib import profiles
+
+        return async_to_sync(profiles.fetch_profiles)([uid]).get(uid)
 
-        if response.status_code == status.HTTP_200_OK:
-            data = response.json()
-            return data
+    async def afetch_user_details(self, uid: str) -> dict | None:
+        """
+        `fetch_user_details`, from async code, through the shared \
+            fetcher of the event loop.
+        """
+        from api.lib import profiles
+
+        fetcher = await profiles.get_fetcher()
+        return (await fetcher.fetch_many([uid])).get(uid)
+
+
+class ItemQuerySet(models.QuerySet):
+    def with_subtypes(self) -> ItemQuerySet:
+        """
+        Joins the child tables (Story, Comment, ...) so that \
+            `Item.get_type` doesn't need a query per row.
+        """
+        return self.select_related(*SUBTYPES)
+
+
+SUBTYPES = ("job", "story", "comment", "poll", "polloption")
+"""Reverse one-to-one accessors of the models inheriting from Item."""
 
 
 class Item(models.Model):
@@ -198,20 +228,76 @@ class Item(models.Model):
     )
     kids = models.JSONField(default=list)
     dead = models.BooleanField(default=False)
-    time = models.DateTimeField(blank=True, null=True, default=timezone.now())
+    time = models.DateTimeField(blank=True, null=True, default=timezone.now)
     by = models.ForeignKey(
         to=HNUser, on_delete=models.CASCADE, related_name="by_user", null=True
     )
+    synced_at = models.DateTimeField(null=True, blank=True, editable=False)
+    digest = models.CharField(
+        max_length=40, blank=True, default="", editable=False
+    )
+    changed_at = models.DateTimeField(null=True, blank=True, editable=False)
+
+    objects = ItemQuerySet.as_manager()
+
+    DERIVED_FIELDS = frozenset(
+        ["synced_at", "digest", "changed_at", "root", "path"]
+    )
+    """Attributes maintained by us, left out of the digest."""
 
     class Meta:
         ordering = ["time"]
+        indexes = [
+            # keyset pagination and the default ordering
+            models.Index(fields=["time", "id"], name="item_time_id_idx"),
+            # `?type=` filters and the home page filters
+            models.Index(
+                fields=["type", "time", "id"], name="item_type_time_idx"
+            ),
+            # `?by=` filters
+            models.Index(fields=["by", "time"], name="item_by_time_idx"),
+        ]
 
     def __str__(self) -> str:
         return f"{self.id}. Type: {self.type}"
 
+    def save(self, *args, **kwargs):
+        digest = self.compute_digest()
+        if digest != self.digest or self.changed_at is None:
+            self.digest, self.changed_at = digest, timezone.now()
+        return super().save(*args, **kwargs)
+
+    @classmethod
+    def digest_of(cls, values: Dict[str, object]) -> str:
+        """
+        Hashes the column values of an item, keyed by attribute \
+            name, into its version: the digest only changes when \
+                the content of the item does.
+        """
+        content = {
+            name: value
+            for name, value in values.items()
+            if name not in cls.DERIVED_FIELDS
+        }
+        raw = json.dumps(content, sort_keys=True, default=str)
+        return hashlib.sha1(raw.encode()).hexdigest()
+
+    def compute_digest(self) -> str:
+        return self.digest_of(
+            {
+                field.attname: getattr(self, field.attname)
+                for field in self._meta.concrete_fields
+                if not field.auto_created
+            }
+        )
+
     def get_type(self) -> models.Model:
         """Display the item type in our template.
 
+        The subtype is read from the joined child table when the \
+            item was loaded through `Item.objects.with_subtypes()`, \
+                otherwise it costs one query.
+
         Returns:
             models.Model: Returns a Django Model \
                 that can be interfaced by Django's ORM.
@@ -224,7 +310,9 @@ class Item(models.Model):
             "job": Job,
         }
         model_cls = model_type_mapping.get(self.type)
-        return model_cls.objects.get(id=self.id)
+        if model_cls is None or isinstance(self, model_cls):
+            return self
+        return getattr(self, model_cls._meta.model_name)
 
     def get_absolute_url(self) -> str:
         return reverse("newsapp:get-items", kwargs={"id": self.id})
@@ -284,7 +372,22 @@ class Story(Item):
 
     def save(self, *args, **kwargs):
         self.type = "story"
-        return super().save(**args, **kwargs)
+        return super().save(*args, **kwargs)
+
+
+class CommentQuerySet(ItemQuerySet):
+    def thread(self, item: Item) -> CommentQuerySet:
+        """
+        Every comment below `item` (a story, poll or comment), \
+            in display order, with one indexed query.
+        """
+        if isinstance(item, Comment):
+            thread = self.filter(
+                root=item.root, path__startswith=item.path
+            ).exclude(id=item.id)
+        else:
+            thread = self.filter(root=item.id)
+        return thread.order_by("path")
 
 
 class Comment(Item):
@@ -296,14 +399,39 @@ class Comment(Item):
             either another comment or the relevant story. \
                 For pollopts, the relevant poll
         text (str) - the comment, story or poll text HTML.
+
+        root (int) - the story (or poll) at the root of the thread.
+
+        path (str) - materialized path of the comment in its \
+            thread: the position of each ancestor among its \
+                siblings, in `kids` order, `PATH_WIDTH` base 36 \
+                    digits each. Sorting a thread by path gives \
+                        the display order.
     """
 
+    PATH_WIDTH = 4
+
     parent = models.PositiveIntegerField(null=True, blank=True)
     text = models.TextField(blank=True, null=True)
+    root = models.PositiveIntegerField(null=True, blank=True)
+    path = models.CharField(max_length=1024, blank=True, default="")
+
+    objects = CommentQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["parent"], name="comment_parent_idx"),
+            models.Index(fields=["root", "path"], name="comment_thread_idx"),
+        ]
 
     def __str__(self):
         return f"Comment: {self.text} on {self.parent}"
 
+    @property
+    def depth(self) -> int:
+        """Nesting level in the thread, top level comments are 0."""
+        return max(len(self.path) // self.PATH_WIDTH - 1, 0)
+
     def save(self, *args, **kwargs) -> None:
         self.type = "comment"
         return super().save(*args, **kwargs)
@@ -353,3 +481,287 @@ class PollOption(Item):
     def save(self, *args, **kwargs) -> None:
         self.type = "pollopt"
         return super().save(*args, **kwargs)
+
+
+class SyncCursor(models.Model):
+    """
+    Progress of the collector through the upstream id space.
+
+    Args:
+        name (str) - the cursor's name, one per crawled id space.
+
+        high_water (int) - the highest `maxitem` collected so far. \
+            Each sync only fetches ids above it.
+
+        backfill (int) - the highest id not yet collected below \
+            the range we started from. Works down towards zero \
+                in bounded slices.
+
+        retry (dict) - ids the cursor moved past but that failed \
+            to be collected, with the number of runs they failed \
+                in; retried by the next runs, see `requeue`.
+
+        locked_until (datetime) - end of the lease of the run \
+            using the cursor, see `acquire`.
+    """
+
+    ITEMS = "items"
+
+    MAX_ATTEMPTS = 5
+    """Runs an id may fail in before it is given up on."""
+
+    name = models.CharField(max_length=40, primary_key=True)
+    high_water = models.PositiveIntegerField(default=0)
+    backfill = models.PositiveIntegerField(default=0)
+    retry = models.JSONField(default=dict, blank=True)
+    locked_until = models.DateTimeField(null=True, blank=True)
+    updated = models.DateTimeField(auto_now=True)
+
+    def __str__(self) -> str:
+        return (
+            f"{self.name}: collected up to {self.high_water}, "
+            f"backfilling from {self.backfill}"
+        )
+
+    def advance(
+        self, maxitem: int, limit: int, backfill_slice: int
+    ) -> tuple[range, range]:
+        """
+        Moves the cursor forward and returns the ids to collect.
+
+        New ids above the watermark are capped at `limit` per \
+            run; older ids are taken `backfill_slice` at a time, \
+                newest first.
+
+        Returns:
+            tuple: the new id range and the backfill id range.
+        """
+        if not self.high_water:
+            # first run, start from the most recent `limit` ids
+            self.high_water = self.backfill = max(maxitem - limit, 0)
+
+        start = self.high_water + 1
+        self.high_water = min(maxitem, self.high_water + limit)
+        new_ids = range(start, self.high_water + 1)
+
+        stop = self.backfill
+        self.backfill = max(stop - backfill_slice, 0)
+        backfill_ids = range(stop, self.backfill, -1)
+
+        return new_ids, backfill_ids
+
+    @property
+    def retry_ids(self) -> list[int]:
+        return sorted(map(int, self.retry))
+
+    def requeue(self, attempted: Iterable[int], failed: Iterable[int]):
+        """
+        Keeps the `failed` ids among `attempted` to retry next run, \
+            and forgets the retried ids that were collected.
+
+        Returns:
+            list: the ids that failed in `MAX_ATTEMPTS` runs, and \
+                are given up on.
+        """
+        previous = {int(key): runs for key, runs in self.retry.items()}
+        retry = dict(previous)
+        attempted = set(attempted)
+        for item_id in attempted:
+            retry.pop(item_id, None)
+        given_up = []
+        for item_id in sorted(attempted.intersection(failed)):
+            runs = previous.get(item_id, 0) + 1
+            if runs >= self.MAX_ATTEMPTS:
+                given_up.append(item_id)
+            else:
+                retry[item_id] = runs
+        self.retry = {str(item_id): runs for item_id, runs in retry.items()}
+        return given_up
+
+    @classmethod
+    def acquire(cls, name: str, lease: timedelta) -> SyncCursor | None:
+        """
+        Leases the cursor `name` to the calling run for `lease`, \
+            with a single conditional update, so that overlapping \
+                runs can't both get it.
+
+        Returns:
+            SyncCursor: the leased cursor, or `None` if another run \
+                holds it.
+        """
+        cls.objects.get_or_create(name=name)
+        now = timezone.now()
+        taken = (
+            cls.objects.filter(name=name)
+            .filter(Q(locked_until=None) | Q(locked_until__lte=now))
+            .update(locked_until=now + lease)
+        )
+        return cls.objects.get(name=name) if taken else None
+
+    def release(self) -> None:
+        """Ends the lease of `acquire`, unless it expired and was taken."""
+        SyncCursor.objects.filter(
+            name=self.name, locked_until=self.locked_until
+        ).update(locked_until=None)
+
+
+class FrontPageRank(models.Model):
+    """
+    A slot of the precomputed front page, see `api.lib.ranking`.
+
+    Args:
+        rank (int) - position on the front page, from 1.
+
+        item (Story) - the story holding the slot.
+
+        score (float) - its gravity score when it was ranked.
+    """
+
+    rank = models.PositiveIntegerField(primary_key=True)
+    item = models.OneToOneField(
+        Story, on_delete=models.CASCADE, related_name="front_page_rank"
+    )
+    score = models.FloatField()
+    ranked_at = models.DateTimeField()
+
+    class Meta:
+        ordering = ["rank"]
+
+    def __str__(self) -> str:
+        return f"#{self.rank}: {self.item_id} ({self.score:.3f})"
+
+
+class ListEntry(models.Model):
+    """
+    A slot of one of the upstream story lists (`/topstories.json`, \
+        `/newstories.json`, ...), see `api.lib.lists`.
+
+    The item is not a foreign key constraint: a list may rank \
+        items we haven't collected yet, those slots are skipped \
+            when joined.
+
+    Args:
+        name (str) - the list, e.g. `top`.
+
+        rank (int) - position in the list, from 1.
+
+        item (Item) - the item holding the slot.
+    """
+
+    LISTS = {
+        "top": "topstories",
+        "new": "newstories",
+        "best": "beststories",
+        "ask": "askstories",
+        "show": "showstories",
+        "job": "jobstories",
+    }
+    """Maps our list names to their upstream endpoints."""
+
+    name = models.CharField(
+        max_length=8, choices=[(name, name) for name in LISTS]
+    )
+    rank = models.PositiveIntegerField()
+    item = models.ForeignKey(
+        Item,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        related_name="list_entries",
+    )
+
+    class Meta:
+        ordering = ["name", "rank"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["name", "item"], name="list_entry_item_uniq"
+            )
+        ]
+        indexes = [
+            models.Index(fields=["name", "rank"], name="list_entry_rank_idx")
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.name} #{self.rank}: {self.item_id}"
+
+
+class SyncRun(models.Model):
+    """
+    Stage timings of one collector run, see `CrawlStats`.
+
+    Args:
+        kind (str) - `sync` (new ids, backfill and story lists) or \
+            `changes` (the change feed).
+
+        seconds (float) - wall time of the whole run.
+
+        fetched, failed, retries (int) - item and profile requests \
+            that succeeded, gave up, and were retried.
+
+        requests (int) - upstream responses received.
+
+        fetch_p50, fetch_p95, fetch_p99 (float) - percentiles of \
+            the upstream response times, in milliseconds.
+
+        fetch_seconds (float) - wall time spent crawling.
+
+        parse_seconds (float) - CPU time spent decoding responses.
+
+        write_seconds (float) - wall time of the database \
+            transactions storing the run.
+
+        rows (dict) - items (and `user` profiles) stored, by type.
+
+        backlog (int) - ids left to collect after the run: above \
+            the watermark, and below it still to backfill.
+
+        error (str) - why the run failed, if it did.
+    """
+
+    SYNC, CHANGES = "sync", "changes"
+
+    kind = models.CharField(
+        max_length=8, choices=[(SYNC, SYNC), (CHANGES, CHANGES)]
+    )
+    started_at = models.DateTimeField()
+    seconds = models.FloatField()
+    fetched = models.PositiveIntegerField(default=0)
+    failed = models.PositiveIntegerField(default=0)
+    retries = models.PositiveIntegerField(default=0)
+    requests = models.PositiveIntegerField(default=0)
+    fetch_p50 = models.FloatField(null=True)
+    fetch_p95 = models.FloatField(null=True)
+    fetch_p99 = models.FloatField(null=True)
+    fetch_seconds = models.FloatField(default=0.0)
+    parse_seconds = models.FloatField(default=0.0)
+    write_seconds = models.FloatField(default=0.0)
+    rows = models.JSONField(default=dict)
+    backlog = models.PositiveIntegerField(null=True)
+    error = models.CharField(max_length=200, blank=True)
+
+    class Meta:
+        ordering = ["-started_at"]
+        indexes = [
+            models.Index(
+                fields=["kind", "-started_at"], name="sync_run_kind_idx"
+            )
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.kind} at {self.started_at:%Y-%m-%d %H:%M:%S}"
+
+    @property
+    def items_per_sec(self) -> float:
+        return self.fetched / self.seconds if self.seconds else 0.0
+
+    @property
+    def bottleneck(self) -> str:
+        """
+        The stage the run spent the most time in: `network`, `cpu` \
+            or `database`.
+        """
+        stages = {
+            "network": self.fetch_seconds - self.parse_seconds,
+            "cpu": self.parse_seconds,
+            "database": self.write_seconds,
+        }
+        return max(stages, key=stages.get)
@@ -0,0 +1,253 @@
+from __future__ import annotations
+
+from datetime import datetime
+from datetime import timedelta
+from datetime import timezone
+
+from asgiref.sync import sync_to_async
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import Cursor
+from rest_framework.pagination import CursorPagination
+from rest_framework.pagination import LimitOffsetPagination
+from rest_framework.response import Response
+
+from api.lib import aio
+
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+class WindowPagination(CursorPagination):
+    """
+    Base of our cursor paginations.
+
+    A page is computed in two steps: `window` narrows the \
+        queryset to the rows of the page (plus one, to tell whether \
+            there is more) without touching the database, and \
+                `set_page` takes the fetched rows. `paginate_queryset` \
+                    fetches them in between, `apaginate_queryset` \
+                        does the same from async views.
+    """
+
+    page_size_query_param = "limit"
+    max_page_size = 100
+
+    def paginate_queryset(self, queryset, request, view=None):
+        window = self.window(queryset, request)
+        if window is None:
+            return None
+        return self.set_page(list(window))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        window = self.window(queryset, request)
+        if window is None:
+            return None
+        return self.set_page(await aio.fetch(window))
+
+    def window(self, queryset, request):
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.cursor = self.decode_cursor(request)
+        self.reverse = bool(self.cursor and self.cursor.reverse)
+        self.position = self.cursor and self.decode_position(
+            self.cursor.position
+        )
+        return self.filter_window(queryset)[: self.page_size + 1]
+
+    def filter_window(self, queryset):
+        """Orders `queryset` and positions it after the cursor."""
+        raise NotImplementedError
+
+    def set_page(self, results: list) -> list:
+        has_more = len(results) > self.page_size
+        self.page = results[: self.page_size]
+        if self.reverse:
+            self.page.reverse()
+
+        positioned = self.position is not None
+        self.has_next = has_more if not self.reverse else positioned
+        self.has_previous = has_more if self.reverse else positioned
+        return self.page
+
+    def get_paginated_data(self, data) -> dict:
+        """The body of `get_paginated_response`."""
+        return {
+            "next": self.get_next_link(),
+            "previous": self.get_previous_link(),
+            "results": data,
+        }
+
+
+class KeysetPagination(WindowPagination):
+    """
+    Opaque cursor pagination keyed on `(time, id)`.
+
+    DRF's `CursorPagination` positions on a single field and \
+        falls back to offsets for ties. Here the cursor holds \
+            both the time and the id of the last row seen, so every \
+                page is a `WHERE (time, id) > cursor` range scan that \
+                    costs the same as the first one, with no `COUNT(*)`, \
+                        and rows inserted meanwhile never shift a page.
+
+    Items without a `time` can't be positioned: views leave them \
+        out of the querysets they page.
+    """
+
+    ordering = ("time", "id")
+
+    def filter_window(self, queryset):
+        prefix = "-" if self.reverse else ""
+        queryset = queryset.order_by(
+            *(prefix + field for field in self.ordering)
+        )
+        if self.position:
+            time, pk = self.position
+            lookup = "lt" if self.reverse else "gt"
+            queryset = queryset.filter(
+                Q(**{f"time__{lookup}": time})
+                | Q(time=time, **{f"id__{lookup}": pk})
+            )
+        return queryset
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        position = self.encode_position(self.page[-1])
+        return self.encode_cursor(Cursor(0, False, position))
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        position = self.encode_position(self.page[0])
+        return self.encode_cursor(Cursor(0, True, position))
+
+    def encode_position(self, instance) -> str:
+        delta = instance.time - EPOCH
+        micros = (delta.days * 86400 + delta.seconds) * 10**6
+        return f"{micros + delta.microseconds}:{instance.pk}"
+
+    def decode_position(self, position: str | None):
+        if position is None:
+            return None
+        try:
+            micros, pk = (int(part) for part in position.split(":"))
+            return EPOCH + timedelta(microseconds=micros), pk
+        except (ValueError, OverflowError):
+            raise NotFound(self.invalid_cursor_message)
+
+
+class KeysetOrOffsetPagination(LimitOffsetPagination):
+    """
+    DRF's `?limit=&offset=` pages, with a `count`, ordered on \
+        `(time, id)`; or `KeysetPagination` pages once the request \
+            has a `?cursor=`, empty for the first page:
+
+        /api/v1/news/?limit=100&offset=500
+        /api/v1/news/?limit=100&cursor=
+
+    Offsets stay the default for the clients paging that way; deep \
+        offsets scan every row they skip, cursors don't.
+    """
+
+    keyset_class = KeysetPagination
+    ordering = KeysetPagination.ordering
+    mode: KeysetPagination | None = None
+
+    def keyset(self, request) -> KeysetPagination | None:
+        """The keyset paginator of `request`, if it has a cursor."""
+        if self.keyset_class.cursor_query_param in request.query_params:
+            self.mode = self.keyset_class()
+        else:
+            self.mode = None
+        return self.mode
+
+    def paginate_queryset(self, queryset, request, view=None):
+        keyset = self.keyset(request)
+        if keyset is not None:
+            return keyset.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(
+            queryset.order_by(*self.ordering), request, view
+        )
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        keyset = self.keyset(request)
+        if keyset is not None:
+            return await keyset.apaginate_queryset(queryset, request, view)
+        return await sync_to_async(super().paginate_queryset)(
+            queryset.order_by(*self.ordering), request, view
+        )
+
+    def get_paginated_data(self, data) -> dict:
+        """The body of `get_paginated_response`."""
+        if self.mode is not None:
+            return self.mode.get_paginated_data(data)
+        return {
+            "count": self.count,
+            "next": self.get_next_link(),
+            "previous": self.get_previous_link(),
+            "results": data,
+        }
+
+    def get_paginated_response(self, data):
+        return Response(self.get_paginated_data(data))
+
+
+class RankPagination(WindowPagination):
+    """
+    Opaque cursor pagination over a dense rank, e.g. the slots \
+        of the front page.
+
+    The cursor holds the last rank seen, so a page is a \
+        `WHERE rank > cursor` primary key range scan of exactly \
+            one page, whatever its depth.
+    """
+
+    ordering = "rank"
+    page_size = 30
+
+    def filter_window(self, queryset):
+        field = self.ordering
+        queryset = queryset.order_by(f"-{field}" if self.reverse else field)
+        if self.position is not None:
+            lookup = "lt" if self.reverse else "gt"
+            queryset = queryset.filter(**{f"{field}__{lookup}": self.position})
+        return queryset
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        position = str(getattr(self.page[-1], self.ordering))
+        return self.encode_cursor(Cursor(0, False, position))
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        position = str(getattr(self.page[0], self.ordering))
+        return self.encode_cursor(Cursor(0, True, position))
+
+    def decode_position(self, position: str | None):
+        if position is None:
+            return None
+        try:
+            return int(position)
+        except ValueError:
+            raise NotFound(self.invalid_cursor_message)
+
+
+class ThreadPagination(RankPagination):
+    """
+    Cursor pagination over a comment thread in display order, \
+        positioned on the materialized path of the last comment \
+            seen (see `Comment.path`).
+    """
+
+    ordering = "path"
+    page_size = 100
+    max_page_size = 500
+
+    def decode_position(self, position: str | None):
+        return position
@@ -0,0 +1,240 @@
+"""
+Full-text search backends.
+
+Items are tokenised into a dedicated index table as the \
+    collector stores them (see `index_items`):
+
+    * SQLite: an FTS5 virtual table, ranked with `bm25()`.
+    * Postgres: a weighted `tsvector` column under a GIN index, \
+        ranked with `ts_rank_cd()`.
+
+The tables are created by the `0008_item_fts` migration.
+"""
+from __future__ import annotations
+
+import html
+import re
+from typing import Any
+from typing import Iterable
+
+from django.db import connection
+from django.utils.html import strip_tags
+
+
+TABLE = "api_item_fts"
+
+SEARCHABLE_TYPES = ("story", "job", "poll", "pollopt", "comment")
+
+BATCH_SIZE = 250
+
+
+def _plain(value: str | None) -> str:
+    """Item text is HTML, index what a reader sees."""
+    return html.unescape(strip_tags(value or ""))
+
+
+def document(item: dict[str, Any]) -> tuple[int, str, str, str] | None:
+    """
+    Returns the `(id, type, title, text)` to index for an API \
+        payload, or `None` if it shouldn't be searchable.
+    """
+    if not item or item.get("type") not in SEARCHABLE_TYPES:
+        return None
+    if item.get("deleted") or item.get("dead"):
+        return None
+    return (
+        item["id"],
+        item["type"],
+        _plain(item.get("title")),
+        _plain(item.get("text")),
+    )
+
+
+class FullTextBackend:
+    """
+    Base class of the search backends.
+
+    Subclasses provide the SQL; batching and query parsing are \
+        shared.
+    """
+
+    vendor: str = ""
+
+    filters_root = True
+    """Whether `search` and `count` can match a single thread."""
+
+    def index(self, docs: list[tuple[int, str, str, str]]) -> None:
+        with connection.cursor() as cursor:
+            for start in range(0, len(docs), BATCH_SIZE):
+                batch = docs[start : start + BATCH_SIZE]
+                cursor.execute(
+                    self.upsert_sql(len(batch)),
+                    [value for doc in batch for value in doc],
+                )
+
+    def remove(self, ids: list[int]) -> None:
+        if not ids:
+            return
+        placeholders = ", ".join(["%s"] * len(ids))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"DELETE FROM {TABLE} WHERE {self.id_column} "
+                f"IN ({placeholders})",
+                ids,
+            )
+
+    def search(
+        self,
+        text: str,
+        types: Iterable[str] = (),
+        root: int | None = None,
+        path: str = "",
+        limit: int = 25,
+        offset: int = 0,
+    ) -> list[tuple[int, float]]:
+        """
+        Returns `(id, rank)` of the best matches, best first.
+
+        Args:
+            text (str) - the query, as typed by the user.
+
+            types (Iterable[str]) - only match these item types.
+
+            root (int) - only match comments of this thread.
+
+            path (str) - only match the comments of `root` below \
+                the one at this path, see `Comment.path`.
+        """
+        sql, params = self.match_sql(text, types, root, path)
+        if sql is None:
+            return []
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"{sql} ORDER BY rank {self.rank_order} LIMIT %s OFFSET %s",
+                params + [limit, offset],
+            )
+            return cursor.fetchall()
+
+    def count(
+        self,
+        text: str,
+        types: Iterable[str] = (),
+        root: int | None = None,
+        path: str = "",
+    ) -> int:
+        sql, params = self.match_sql(text, types, root, path)
+        if sql is None:
+            return 0
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT COUNT(*) FROM ({sql}) matches", params)
+            return cursor.fetchone()[0]
+
+    def _filters(self, types, root, path) -> tuple[str, str, list]:
+        joins, where, params = "", "", []
+        types = list(types)
+        if types:
+            where += f" AND fts.type IN ({', '.join(['%s'] * len(types))})"
+            params += types
+        if root is not None:
+            joins = (
+                f" JOIN api_comment comment "
+                f"ON comment.item_ptr_id = fts.{self.id_column}"
+            )
+            where += " AND comment.root = %s"
+            params.append(root)
+        if path:
+            # paths are base 36 digits, `_` asks for one more level
+            where += " AND comment.path LIKE %s"
+            params.append(path + "_%")
+        return joins, where, params
+
+
+class SQLiteBackend(FullTextBackend):
+    vendor = "sqlite"
+    id_column = "rowid"
+    rank_order = "ASC"  # bm25() is lower for better matches
+
+    TITLE_WEIGHT = 10.0
+
+    def upsert_sql(self, rows: int) -> str:
+        values = ", ".join(["(%s, %s, %s, %s)"] * rows)
+        return (
+            f"INSERT OR REPLACE INTO {TABLE} (rowid, type, title, text) "
+            f"VALUES {values}"
+        )
+
+    def match_sql(self, text, types, root, path):
+        terms = re.findall(r"\w+", text or "")
+        if not terms:
+            return None, []
+        # every term must match; quoting keeps FTS5 syntax out of reach
+        query = " ".join('"' + term + '"' for term in terms) + "*"
+        joins, where, params = self._filters(types, root, path)
+        sql = (
+            f"SELECT fts.rowid AS id, "
+            f"bm25({TABLE}, 0, {self.TITLE_WEIGHT}, 1.0) AS rank "
+            f"FROM {TABLE} fts{joins} WHERE {TABLE} MATCH %s{where}"
+        )
+        return sql, [query] + params
+
+
+class PostgresBackend(FullTextBackend):
+    vendor = "postgresql"
+    id_column = "item_id"
+    rank_order = "DESC"
+
+    CONFIG = "english"
+
+    def upsert_sql(self, rows: int) -> str:
+        row = (
+            f"(%s, %s, setweight(to_tsvector('{self.CONFIG}', %s), 'A') || "
+            f"setweight(to_tsvector('{self.CONFIG}', %s), 'B'))"
+        )
+        return (
+            f"INSERT INTO {TABLE} (item_id, type, document) "
+            f"VALUES {', '.join([row] * rows)} "
+            f"ON CONFLICT (item_id) DO UPDATE SET "
+            f"type = EXCLUDED.type, document = EXCLUDED.document"
+        )
+
+    def match_sql(self, text, types, root, path):
+        if not (text or "").strip():
+            return None, []
+        joins, where, params = self._filters(types, root, path)
+        sql = (
+            f"SELECT fts.item_id AS id, "
+            f"ts_rank_cd(fts.document, query) AS rank "
+            f"FROM {TABLE} fts{joins}, "
+            f"websearch_to_tsquery('{self.CONFIG}', %s) query "
+            f"WHERE fts.document @@ query{where}"
+        )
+        return sql, [text] + params
+
+
+BACKENDS = {
+    backend.vendor: backend for backend in (SQLiteBackend, PostgresBackend)
+}
+
+
+def get_backend() -> FullTextBackend | None:
+    """The backend for the default database, if it has one."""
+    backend = BACKENDS.get(connection.vendor)
+    return backend() if backend else None
+
+
+def index_items(items: Iterable[dict[str, Any]]) -> None:
+    """
+    Brings the index up to date with a batch of stored payloads.
+    """
+    backend = get_backend()
+    if backend is None:
+        return
+    docs, removed = [], []
+    for item in items:
+        doc = document(item)
+        if doc is not None:
+            docs.append(doc)
+        elif item and "id" in item:
+            removed.append(item["id"])
+    backend.remove(removed)
+    backend.index(docs)
@@ -0,0 +1,657 @@
+"""
+An embedded, memory-mapped BM25 inverted index.
+
+The index lives in a directory (`settings.SEARCH_INDEX_PATH`, \
+    unset by default: deployments mount one, see \
+        `docker-compose.yml`) of immutable segment files listed by \
+            a small `manifest.json`:
+
+    * The sync task appends a segment for every committed batch \
+        (see `index_items`): a newer segment masks the documents \
+            of older ones, and an empty document is a tombstone.
+    * Small segments are merged into their older neighbour as \
+        they pile up, so a handful of segments hold everything; \
+            after a sync that is the `merge_search_index` task's \
+                job, off the sync's own commit.
+    * Replaced segments are deleted by a later commit, once \
+        `RETIRE_AFTER` seconds have passed, so that a reader \
+            which loaded the previous manifest can still map them.
+    * Web workers `mmap` the segments read-only: the arrays are \
+        used in place through `memoryview`s, nothing is loaded or \
+            copied, and the pages are shared between processes.
+
+Segment layout (little-endian, sections aligned on 8 bytes):
+
+    header      magic, document, live document and term counts, \
+                    total length and the offset of every section
+    ids         uint32[documents], sorted
+    lengths     uint32[documents], tokens per document
+    types       uint8[documents], see `TYPES` (0 is a tombstone)
+    terms       uint32[terms + 1] offsets into the term blob
+    blob        the utf-8 terms, sorted
+    postings    uint32[terms * PARTITIONS + 1] offsets into `docs` \
+                    and `tfs`: the postings of a term are grouped \
+                        by item type, so filtered queries only read \
+                            their own types
+    docs        uint32[postings], document ordinals
+    tfs         uint16[postings], term frequencies
+"""
+from __future__ import annotations
+
+import bisect
+import contextlib
+import fcntl
+import heapq
+import itertools
+import json
+import math
+import mmap
+import os
+import re
+import struct
+import time
+from array import array
+from collections import Counter
+from collections import OrderedDict
+from operator import itemgetter
+from pathlib import Path
+from typing import Any
+from typing import Iterable
+from typing import Iterator
+from typing import List
+from typing import Tuple
+
+from django.conf import settings
+from django.db import transaction
+
+from api.search.backends import document
+
+
+MAGIC = b"HNBM25\x00\x02"
+
+HEADER = struct.Struct("<8sIIIQ8Q")
+
+TYPES = {"story": 1, "job": 2, "poll": 3, "pollopt": 4, "comment": 5}
+"""Item types stored per document, to filter matches without \
+    touching the database."""
+
+TOMBSTONE = 0
+
+PARTITIONS = max(TYPES.values()) + 1
+
+MERGE_FACTOR = 4
+"""A segment is merged into its older neighbour once it holds at \
+    least 1/MERGE_FACTOR of its documents."""
+
+MAX_SEGMENTS = 10
+
+RETIRE_AFTER = 60
+"""Seconds a replaced segment is kept on disk for late readers."""
+
+TITLE_BOOST = 2
+"""Title tokens count this many times."""
+
+K1 = 1.2
+B = 0.75
+
+CACHE_SIZE = 64
+"""Number of scored queries kept per process, for pagination."""
+
+MAX_TERM_BYTES = 64
+
+STOPWORDS = frozenset(
+    "a an and are as at be but by for if in into is it no not of on or "
+    "such that the their then there these they this to was will with".split()
+)
+
+TOKEN = re.compile(r"\w+")
+
+Postings = List[Tuple[array, array]]
+"""The `(ordinals, frequencies)` of a term, by item type."""
+
+
+def tokenize(text: str) -> list[str]:
+    return [
+        token
+        for token in TOKEN.findall(text.lower())
+        if len(token) > 1
+        and token not in STOPWORDS
+        and len(token.encode()) <= MAX_TERM_BYTES
+    ]
+
+
+def _postings() -> Postings:
+    return [(array("I"), array("H")) for _ in range(PARTITIONS)]
+
+
+def _align(offset: int) -> int:
+    return (offset + 7) & ~7
+
+
+def write_segment(
+    path: Path,
+    ids: Iterable[int],
+    lengths: Iterable[int],
+    types: Iterable[int],
+    terms: Iterable[tuple[bytes, Postings]],
+) -> None:
+    """
+    Writes a segment file.
+
+    Args:
+        ids, lengths, types (Iterable) - the documents, sorted by id.
+
+        terms (Iterable) - `(term, postings)`, sorted by term.
+    """
+    ids, lengths = array("I", ids), array("I", lengths)
+    types = array("B", types)
+    term_offsets, blob = array("I", [0]), bytearray()
+    post_offsets, docs, tfs = array("I", [0]), array("I"), array("H")
+    for term, postings in terms:
+        blob += term
+        term_offsets.append(len(blob))
+        for ordinals, frequencies in postings:
+            docs.extend(ordinals)
+            tfs.extend(frequencies)
+            post_offsets.append(len(docs))
+
+    sections = [ids, lengths, types, term_offsets, blob, post_offsets]
+    sections += [docs, tfs]
+    offsets, position = [], _align(HEADER.size)
+    for section in sections:
+        offsets.append(position)
+        position = _align(position + len(memoryview(section).cast("B")))
+
+    tmp = path.with_suffix(".tmp")
+    with open(tmp, "wb") as out:
+        out.write(
+            HEADER.pack(
+                MAGIC,
+                len(ids),
+                len(types) - types.count(TOMBSTONE),
+                len(term_offsets) - 1,
+                sum(lengths),
+                *offsets,
+            )
+        )
+        for offset, section in zip(offsets, sections):
+            out.write(b"\0" * (offset - out.tell()))
+            out.write(memoryview(section).cast("B"))
+        out.flush()
+        os.fsync(out.fileno())
+    os.replace(tmp, path)
+
+
+class Segment:
+    """A read-only view over a memory-mapped segment file."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        with open(path, "rb") as file:
+            self._mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(self._mmap)
+        header = HEADER.unpack_from(view)
+        if header[0] != MAGIC:
+            raise ValueError(f"{path} is not a search index segment")
+        documents, self.live, terms, self.total_length = header[1:5]
+        offsets = header[5:]
+
+        def section(index, fmt, count):
+            size = struct.calcsize(fmt)
+            start = offsets[index]
+            return view[start : start + count * size].cast(fmt)
+
+        self.ids = section(0, "I", documents)
+        self.lengths = section(1, "I", documents)
+        self.types = section(2, "B", documents)
+        self.term_offsets = section(3, "I", terms + 1)
+        self.blob = section(4, "B", self.term_offsets[-1])
+        self.post_offsets = section(5, "I", terms * PARTITIONS + 1)
+        postings = self.post_offsets[-1]
+        self.docs = section(6, "I", postings)
+        self.tfs = section(7, "H", postings)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @property
+    def term_count(self) -> int:
+        return len(self.term_offsets) - 1
+
+    def term(self, index: int) -> bytes:
+        start, stop = self.term_offsets[index], self.term_offsets[index + 1]
+        return self.blob[start:stop].tobytes()
+
+    def find(self, term: bytes) -> int | None:
+        """Binary searches the term dictionary, in place."""
+        low, high = 0, self.term_count
+        while low < high:
+            middle = (low + high) // 2
+            if self.term(middle) < term:
+                low = middle + 1
+            else:
+                high = middle
+        if low < self.term_count and self.term(low) == term:
+            return low
+        return None
+
+    def frequency(self, index: int) -> int:
+        """Number of documents holding a term, of any type."""
+        offsets = self.post_offsets
+        return offsets[(index + 1) * PARTITIONS] - offsets[index * PARTITIONS]
+
+    def postings(self, index: int, kind: int) -> tuple[memoryview, memoryview]:
+        """The ordinals and frequencies of a term in documents of `kind`."""
+        position = index * PARTITIONS + kind
+        start, stop = self.post_offsets[position : position + 2]
+        return self.docs[start:stop], self.tfs[start:stop]
+
+    def ordinal(self, item_id: int) -> int | None:
+        position = bisect.bisect_left(self.ids, item_id)
+        if position < len(self.ids) and self.ids[position] == item_id:
+            return position
+        return None
+
+    def terms(self) -> Iterator[tuple[bytes, int]]:
+        for index in range(self.term_count):
+            yield self.term(index), index
+
+
+def build(
+    docs: Iterable[tuple[int, str, str, str]], removed: Iterable[int] = ()
+):
+    """
+    Tokenizes documents into the arguments of `write_segment`.
+
+    Args:
+        docs (Iterable) - `(id, type, title, text)`, see \
+            `backends.document`.
+
+        removed (Iterable) - ids to tombstone.
+    """
+    rows = {item_id: (TOMBSTONE, Counter()) for item_id in removed}
+    for item_id, kind, title, text in docs:
+        counts = Counter(tokenize(text))
+        for token in tokenize(title):
+            counts[token] += TITLE_BOOST
+        rows[item_id] = (TYPES.get(kind, TOMBSTONE), counts)
+
+    ids = sorted(rows)
+    lengths, types = [], []
+    postings: dict[str, Postings] = {}
+    for ordinal, item_id in enumerate(ids):
+        kind, counts = rows[item_id]
+        types.append(kind)
+        lengths.append(sum(counts.values()))
+        for token, tf in counts.items():
+            if token not in postings:
+                postings[token] = _postings()
+            ordinals, tfs = postings[token][kind]
+            ordinals.append(ordinal)
+            tfs.append(min(tf, 0xFFFF))
+    terms = ((token.encode(), postings[token]) for token in postings)
+    return ids, lengths, types, sorted(terms, key=itemgetter(0))
+
+
+def merge(older: Segment, newer: Segment, base: bool):
+    """
+    Merges two adjacent segments into the arguments of \
+        `write_segment`; documents of `newer` mask those of \
+            `older`. Tombstones are dropped when merging into the \
+                `base` (oldest) segment, as there is nothing left \
+                    for them to mask.
+    """
+    sources = (older, newer)
+    entries = [
+        (item_id, 0, ordinal)
+        for ordinal, item_id in enumerate(older.ids)
+        if newer.ordinal(item_id) is None
+    ]
+    entries += [
+        (item_id, 1, ordinal) for ordinal, item_id in enumerate(newer.ids)
+    ]
+    entries.sort()
+
+    # old ordinal -> merged ordinal, -1 for dropped documents
+    remap = (array("i", [-1]) * len(older), array("i", [-1]) * len(newer))
+    ids, lengths, types = array("I"), array("I"), array("B")
+    for item_id, source, ordinal in entries:
+        kind = sources[source].types[ordinal]
+        if base and kind == TOMBSTONE:
+            continue
+        remap[source][ordinal] = len(ids)
+        ids.append(item_id)
+        lengths.append(sources[source].lengths[ordinal])
+        types.append(kind)
+
+    def terms():
+        merged = heapq.merge(
+            ((term, 0, index) for term, index in older.terms()),
+            ((term, 1, index) for term, index in newer.terms()),
+        )
+        for term, group in itertools.groupby(merged, key=itemgetter(0)):
+            found = [(source, index) for _, source, index in group]
+            postings = _postings()
+            for kind in range(PARTITIONS):
+                pairs = []
+                for source, index in found:
+                    mapping = remap[source]
+                    docs, tfs = sources[source].postings(index, kind)
+                    pairs += [
+                        (mapping[ordinal], tf)
+                        for ordinal, tf in zip(docs, tfs)
+                        if mapping[ordinal] >= 0
+                    ]
+                pairs.sort()
+                ordinals, frequencies = postings[kind]
+                ordinals.extend(pair[0] for pair in pairs)
+                frequencies.extend(pair[1] for pair in pairs)
+            yield term, postings
+
+    return ids, lengths, types, terms()
+
+
+class InvertedIndex:
+    """
+    The BM25 index stored in `path`.
+
+    Readers reopen the segments whenever the manifest changes; \
+        writers serialize on a lock file, so the sync task and a \
+            `manage.py reindex` can't interleave.
+
+    Implements the `search`/`count` interface of \
+        `backends.FullTextBackend`, so that `SearchResults` can \
+            paginate its matches, but not their `root` and `path` \
+                filters: the index doesn't know the threads of comments.
+    """
+
+    filters_root = False
+
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+        self.manifest_path = self.path / "manifest.json"
+        self.segments: list[Segment] = []
+        self.generation = -1
+        self._stamp = None
+        self._cache: OrderedDict = OrderedDict()
+
+    # reading
+
+    def exists(self) -> bool:
+        return self.manifest_path.exists()
+
+    def _manifest(self) -> dict[str, Any]:
+        try:
+            return json.loads(self.manifest_path.read_text())
+        except FileNotFoundError:
+            return {"generation": 0, "segments": [], "retired": []}
+
+    def refresh(self) -> None:
+        """Maps the current segments if the manifest changed."""
+        try:
+            self._refresh()
+        except FileNotFoundError:
+            # a segment retired for longer than `RETIRE_AFTER`
+            # since we read the manifest: read the new one
+            self._stamp = None
+            self._refresh()
+
+    def _refresh(self) -> None:
+        try:
+            stamp = self.manifest_path.stat().st_mtime_ns
+        except FileNotFoundError:
+            stamp = None
+        if stamp == self._stamp and self.generation >= 0:
+            return
+        manifest = self._manifest()
+        if manifest["generation"] == self.generation:
+            self._stamp = stamp
+            return
+        opened = {segment.path.name: segment for segment in self.segments}
+        segments = [
+            opened.pop(name, None) or Segment(self.path / name)
+            for name in manifest["segments"]
+        ]
+        self.segments = segments
+        self.generation = manifest["generation"]
+        self._stamp = stamp
+        self._cache.clear()
+        self._prepare()
+
+    def _prepare(self) -> None:
+        """
+        Collects the ids masked in each segment (those present in \
+            a newer one) and the collection statistics of BM25.
+        """
+        self.masked: list[frozenset[int]] = []
+        newer: set[int] = set()
+        documents = length = 0
+        for segment in reversed(self.segments):
+            masked = frozenset(newer)
+            self.masked.insert(0, masked)
+            documents += segment.live
+            length += segment.total_length
+            for item_id in masked:
+                ordinal = segment.ordinal(item_id)
+                if ordinal is None:
+                    continue
+                if segment.types[ordinal] != TOMBSTONE:
+                    documents -= 1
+                length -= segment.lengths[ordinal]
+            newer.update(segment.ids)
+        self.documents = documents
+        self.average_length = length / documents if documents else 1.0
+
+    def scores(self, text: str, types: Iterable[str] = ()) -> dict[int, float]:
+        """
+        Returns the BM25 score of every document of `types` \
+            matching any term of `text`, by id.
+        """
+        self.refresh()
+        kinds = sorted({TYPES[kind] for kind in types if kind in TYPES})
+        kinds = kinds or sorted(TYPES.values())
+        key = (text, tuple(kinds))
+        if key in self._cache:
+            self._cache.move_to_end(key)
+            return self._cache[key]
+
+        scores: dict[int, float] = {}
+        get = scores.get
+        constant = K1 * (1 - B)
+        scale = K1 * B / self.average_length
+        for term in {token.encode() for token in tokenize(text)}:
+            found = [
+                (segment, masked, segment.find(term))
+                for segment, masked in zip(self.segments, self.masked)
+            ]
+            found = [entry for entry in found if entry[2] is not None]
+            frequency = sum(
+                segment.frequency(index) for segment, _, index in found
+            )
+            if not frequency:
+                continue
+            idf = math.log(
+                1 + (self.documents - frequency + 0.5) / (frequency + 0.5)
+            )
+            weight = idf * (K1 + 1)
+            for segment, masked, index in found:
+                ids, lengths = segment.ids, segment.lengths
+                for kind in kinds:
+                    docs, tfs = segment.postings(index, kind)
+                    for ordinal, tf in zip(docs, tfs):
+                        item_id = ids[ordinal]
+                        if masked and item_id in masked:
+                            continue
+                        scores[item_id] = get(item_id, 0.0) + weight * tf / (
+                            tf + constant + scale * lengths[ordinal]
+                        )
+
+        self._cache[key] = scores
+        if len(self._cache) > CACHE_SIZE:
+            self._cache.popitem(last=False)
+        return scores
+
+    def search(
+        self,
+        text: str,
+        types: Iterable[str] = (),
+        root: int | None = None,
+        path: str = "",
+        limit: int = 25,
+        offset: int = 0,
+    ) -> list[tuple[int, float]]:
+        """Returns `(id, score)` of the best matches, best first."""
+        self._check_root(root)
+        scores = self.scores(text, types)
+        best = heapq.nlargest(offset + limit, scores, key=scores.__getitem__)
+        return [(item_id, scores[item_id]) for item_id in best[offset:]]
+
+    def count(
+        self,
+        text: str,
+        types: Iterable[str] = (),
+        root: int | None = None,
+        path: str = "",
+    ) -> int:
+        self._check_root(root)
+        return len(self.scores(text, types))
+
+    @staticmethod
+    def _check_root(root: int | None) -> None:
+        if root is not None:
+            raise ValueError("The BM25 index can't filter by thread.")
+
+    # writing
+
+    @contextlib.contextmanager
+    def _lock(self):
+        self.path.mkdir(parents=True, exist_ok=True)
+        with open(self.path / "lock", "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _commit(self, manifest: dict[str, Any], obsolete=()) -> None:
+        """
+        Replaces the manifest with `manifest`, retiring the \
+            `obsolete` segments and deleting those retired more \
+                than `RETIRE_AFTER` seconds ago.
+        """
+        now = time.time()
+        retired, expired = [], []
+        for name, at in self._manifest().get("retired", []):
+            (expired if now - at >= RETIRE_AFTER else retired).append(
+                (name, at)
+            )
+        retired += [(name, now) for name in obsolete]
+        manifest = {**manifest, "retired": retired}
+
+        tmp = self.manifest_path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(manifest))
+        os.replace(tmp, self.manifest_path)
+        for name, _ in expired:
+            with contextlib.suppress(FileNotFoundError):
+                (self.path / name).unlink()
+
+    def add(
+        self,
+        docs: Iterable[tuple[int, str, str, str]],
+        removed: Iterable[int] = (),
+        replace: bool = False,
+        merge: bool = True,
+    ) -> None:
+        """
+        Writes a segment holding `docs` and tombstones for `removed`, \
+            then merges the segments that piled up.
+
+        Args:
+            replace (bool) - drop every existing segment, e.g. to \
+                rebuild the index from scratch.
+
+            merge (bool) - merge now; otherwise, call `merge` later.
+        """
+        with self._lock():
+            manifest = self._manifest()
+            generation = manifest["generation"] + 1
+            name = f"segment-{generation:08d}.bm25"
+            write_segment(self.path / name, *build(docs, removed))
+            obsolete = manifest["segments"] if replace else []
+            segments = [] if replace else list(manifest["segments"])
+            segments.append(name)
+            manifest = {"generation": generation, "segments": segments}
+            self._commit(manifest, obsolete)
+            if merge:
+                self._merge()
+
+    def merge(self) -> None:
+        """Merges the segments that piled up, see `MERGE_FACTOR`."""
+        with self._lock():
+            self._merge()
+
+    def _documents(self, name: str) -> int:
+        with open(self.path / name, "rb") as file:
+            return HEADER.unpack(file.read(HEADER.size))[1]
+
+    def _merge(self) -> None:
+        manifest = self._manifest()
+        segments = list(manifest["segments"])
+        generation = manifest["generation"]
+        sizes = {name: self._documents(name) for name in segments}
+        obsolete = []
+        while len(segments) > 1 and (
+            len(segments) > MAX_SEGMENTS
+            or sizes[segments[-1]] * MERGE_FACTOR >= sizes[segments[-2]]
+        ):
+            older, newer = Segment(self.path / segments[-2]), Segment(
+                self.path / segments[-1]
+            )
+            generation += 1
+            name = f"segment-{generation:08d}.bm25"
+            write_segment(
+                self.path / name,
+                *merge(older, newer, base=len(segments) == 2),
+            )
+            obsolete += segments[-2:]
+            segments[-2:] = [name]
+            sizes[name] = self._documents(name)
+        if obsolete:
+            manifest = {"generation": generation, "segments": segments}
+            self._commit(manifest, obsolete)
+
+
+_indexes: dict[str, InvertedIndex] = {}
+
+
+def get_index() -> InvertedIndex | None:
+    """The index of this process, if one was configured and built."""
+    path = settings.SEARCH_INDEX_PATH
+    if not path:
+        return None
+    index = _indexes.get(str(path))
+    if index is None:
+        index = _indexes[str(path)] = InvertedIndex(path)
+    return index if index.exists() else None
+
+
+def index_items(items: Iterable[dict[str, Any]]) -> None:
+    """
+    Adds a batch of stored API payloads to the index, once the \
+        transaction storing them commits. The new segment is merged \
+            by the `merge_search_index` task.
+    """
+    path = settings.SEARCH_INDEX_PATH
+    if not path:
+        return
+    docs, removed = [], []
+    for item in items:
+        doc = document(item)
+        if doc is not None:
+            docs.append(doc)
+        elif item and "id" in item:
+            removed.append(item["id"])
+    if docs or removed:
+        transaction.on_commit(
+            lambda: InvertedIndex(path).add(docs, removed, merge=False)
+        )
@@ -1,89 +1,179 @@
 """
-This module provides the implementation of search functionali.
+This module provides the implementation of search functionalities.
 
 The search functionalities are:
 
-- The search functionalities are:
     * Search by Stories
     * Search by Jobs
     * Search by Polls
-    and...
-    you gerrit! 😎 ..
-    * 'Full text' search
+    * Search by Comments (optionally within a thread)
+    * 'Full text' search of stories, jobs and polls
 
+Matches come from the full-text index of the database (see \
+    `api.search.backends`), best first. On databases without one, \
+        they fall back to a case-insensitive substring match, \
+            newest first. `full_match` reads the embedded BM25 index \
+                (see `api.search.index`) once it has been built.
 """
-####################
-# @TODO: Implement ElasticSearch
-#
-####################
 from __future__ import annotations
 
-try:
-    from typing import List
-except ImportError:
-    from typing_extensions import List
-from django.db.models.query import Q, QuerySet
-from api.models.models import Comment, Item, Job, Story, Poll
+from typing import Iterable
+
+from django.db.models import Q
+from django.db.models.query import QuerySet
+
+from api.models.models import Comment
+from api.models.models import Item
+from api.search.backends import FullTextBackend
+from api.search.backends import get_backend
+from api.search.index import get_index
+
+
+class SearchResults:
+    """
+    The matches of a query, fetched lazily a page at a time.
+
+    Supports `len()`/`count()` and slicing, so it can be handed \
+        to a `Paginator` like a QuerySet: counting runs one \
+            `COUNT(*)` on the index, and each page is one ranked \
+                index query plus one query loading its rows.
+    """
+
+    def __init__(
+        self,
+        backend: FullTextBackend,
+        text: str,
+        queryset: QuerySet,
+        types: Iterable[str] = (),
+        root: int | None = None,
+        path: str = "",
+    ):
+        self.backend = backend
+        self.text = text
+        self.queryset = queryset
+        self.types = tuple(types)
+        self.root = root
+        self.path = path
+        self._count: int | None = None
+
+    def count(self) -> int:
+        if self._count is None:
+            self._count = self.backend.count(
+                self.text, self.types, self.root, self.path
+            )
+        return self._count
+
+    def __len__(self) -> int:
+        return self.count()
+
+    def __getitem__(self, key):
+        if isinstance(key, int):
+            return self[key : key + 1][0]
+        start, stop = key.start or 0, key.stop
+        if stop is None:
+            stop = self.count()
+        if stop <= start:
+            return []
+        ranked = self.backend.search(
+            self.text,
+            self.types,
+            self.root,
+            self.path,
+            limit=stop - start,
+            offset=start,
+        )
+        rows = self.queryset.in_bulk([item_id for item_id, _ in ranked])
+        return [rows[item_id] for item_id, _ in ranked if item_id in rows]
+
+    def __iter__(self):
+        return iter(self[:])
 
 
 class Search:
     """
-    This is the main class that is used to search for texts/
+    This is the main class that is used to search for texts.
 
-    It matches incoming query with data in the DB and \
-        returns the matches/
+    It matches incoming query with the indexed items and \
+        returns the matches, best first.
     """
 
-    def __init__(self, query):
+    def __init__(self, query: str = ""):
         self.query = query
+        self.backend = get_backend()
 
-    def stories(self, text):
-        if isinstance(self, text) is not str:
-            return "Invalid search parameters"
-        queryset = Story.objects.filter(
-            Q(text__icontains=text)
-            | Q(text__endswith=text)
-            | Q(text__startwith=text)
-            | Q(by__id__icontains=text)
-        )
-        return queryset
-
-    def jobs(self, text):
-        if isinstance(self, text) is not str:
-            return "Invalid search parameters"
-        queryset = Job.objects.filter(
-            Q(title__icontains=text)
-            | Q(title__endswith=text)
-            | Q(text__icontains=text)
-        )
-        return queryset
-
-    def polls(self, text):
-        # Flters by title, text, time, by
-        #
-        #
-        if isinstance(self, text) is not str:
-            return "Invalid search parameters"
-        queryset = Poll.objects.filter(
-            Q(text__icontains=text)
-            | Q(title__endswith=text)
-            | Q(title__startwith=text)
-            | Q(time__date=text)
-            | Q(by__id=text)
-        )
-        return queryset
+    def _search(
+        self,
+        text: str | None,
+        types: Iterable[str],
+        fields: Iterable[str],
+        queryset: QuerySet | None = None,
+        root: int | None = None,
+        path: str = "",
+        backend=None,
+    ) -> SearchResults | QuerySet:
+        text = (text if text is not None else self.query) or ""
+        if queryset is None:
+            queryset = Item.objects.with_subtypes()
+        backend = backend or self.backend
+        if root is not None and backend and not backend.filters_root:
+            backend = self.backend
+        if backend is not None:
+            return SearchResults(backend, text, queryset, types, root, path)
+
+        matches = queryset.filter(type__in=types)
+        if root is not None:
+            matches = matches.filter(root=root)
+        if path:
+            matches = matches.filter(path__startswith=path).exclude(path=path)
+        if not text.strip():
+            return matches.none()
+        lookups = Q()
+        for field in fields:
+            lookups |= Q(**{f"{field}__icontains": text})
+        return matches.filter(lookups).order_by("-time", "-id")
+
+    def stories(self, text: str | None = None):
+        return self._search(text, ["story"], ["story__title"])
 
-    def comments(self, text):
+    def jobs(self, text: str | None = None):
+        return self._search(text, ["job"], ["job__title", "job__text"])
+
+    def polls(self, text: str | None = None):
+        return self._search(text, ["poll"], ["poll__title", "poll__text"])
+
+    def comments(self, text: str | None = None, root: Item | None = None):
         """
-        Returns a list of comments associated to an item.
+        Returns the comments matching the query.
 
         Args:
             text (str): Query been searched
+
+            root (Item): only search the thread below this story, \
+                poll or comment
         """
-        qs = Comment.objects.all().filter(Q(text__icontains=text))
+        if isinstance(root, Comment):
+            if root.root is None:
+                # not threaded yet, see `api.lib.threads`
+                return Comment.objects.none()
+            # its replies are stored under the story, see `Comment.path`
+            thread = {"root": root.root, "path": root.path}
+        else:
+            thread = {"root": root.pk if root is not None else None}
+        return self._search(
+            text,
+            ["comment"],
+            ["text"],
+            queryset=Comment.objects.all(),
+            **thread,
+        )
 
-    def full_match(self, text) -> list[QuerySet]:
+    def full_match(self, text: str | None = None):
         """
-        Returns a list of all texts that match the query
+        Returns the stories, jobs and polls that match the query.
         """
-        return [self.stories(text) + self.jobs(text) + self.polls(text)]
+        return self._search(
+            text,
+            ["story", "job", "poll"],
+            ["story__title", "job__title", "poll__title", "poll__text"],
+            backend=get_index(),
+        )
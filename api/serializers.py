@@ -6,12 +6,15 @@ from rest_framework.serializers import Serializer
 
 from api.lib.time import UnixTimeField
 from api.models.models import Comment
+from api.models.models import FrontPageRank
 from api.models.models import HNUser
 from api.models.models import Item
 from api.models.models import Job
+from api.models.models import ListEntry
 from api.models.models import Poll
 from api.models.models import PollOption
 from api.models.models import Story
+from api.models.models import SyncRun
 
 
 MAX_FIELDS_LENGTH = 40
@@ -20,6 +23,20 @@ MAX_ALLOWED_DEPTH = 5
     retrived on a single post or max. related stories \
         associated with a single one."""
 
+SYNC_FIELDS = ["synced_at", "digest", "changed_at"]
+"""Bookkeeping of the collector on items and users (see \
+    `Item.DERIVED_FIELDS`), left out of the API."""
+
+
+class AuthorSerializer(ModelSerializer):
+    """
+    The author of an item, as nested with `?expand=by`.
+    """
+
+    class Meta:
+        model = HNUser
+        exclude = ["synced_at"]
+
 
 class BaseItemSerializer(ModelSerializer):
     by = serializers.PrimaryKeyRelatedField(read_only=True)
@@ -27,7 +44,7 @@ class BaseItemSerializer(ModelSerializer):
 
     class Meta:
         model = Item
-        fields = "__all__"
+        exclude = SYNC_FIELDS
         depth = 1
 
 
@@ -49,8 +66,8 @@ class JobSerializer(ModelSerializer):
 
     class Meta:
         model = Job
-        fields = "__all__"
-        extra_kwargs = {"id": "read-only"}
+        exclude = SYNC_FIELDS
+        extra_kwargs = {"id": {"read_only": True}}
         depth = MAX_ALLOWED_DEPTH
 
 
@@ -64,8 +81,7 @@ class PollSerializer(ModelSerializer):
 
     class Meta:
         model = Poll
-        fields = "__all__"
-        exclude = ["id"]
+        exclude = ["id", *SYNC_FIELDS]
         depth = MAX_ALLOWED_DEPTH
 
 
@@ -93,11 +109,108 @@ class CommentSerializer(ModelSerializer):
     class Meta:
         model = Comment
         depth = MAX_ALLOWED_DEPTH
-        exclude = ["id"]
+        exclude = ["id", *SYNC_FIELDS]
 
 
 class StorySerializer(ModelSerializer):
+    by = AuthorSerializer(read_only=True)
+
     class Meta:
-        model = (Story,)
+        model = Story
         depth = MAX_ALLOWED_DEPTH
+        exclude = ["id", *SYNC_FIELDS]
+
+
+class KidSerializer(ModelSerializer):
+    """
+    A reply of an item, as nested with `?expand=kids`.
+    """
+
+    by = serializers.PrimaryKeyRelatedField(read_only=True)
+    time = UnixTimeField()
+
+    class Meta:
+        model = Comment
+        fields = ["id", "by", "time", "text", "kids", "dead", "deleted"]
+
+
+EXPANSIONS = {"by": AuthorSerializer, "kids": KidSerializer}
+"""What `?expand=` can nest into the item endpoints, by key."""
+
+
+class FrontPageSerializer(ModelSerializer):
+    """
+    A ranked story of the front page.
+    """
+
+    id = serializers.IntegerField(source="item_id")
+    title = serializers.CharField(source="item.title")
+    url = serializers.CharField(source="item.url")
+    points = serializers.IntegerField(source="item.score")
+    descendants = serializers.IntegerField(source="item.descendants")
+    by = serializers.CharField(source="item.by_id")
+    time = UnixTimeField(source="item.time")
+
+    class Meta:
+        model = FrontPageRank
+        fields = [
+            "rank",
+            "id",
+            "title",
+            "url",
+            "points",
+            "descendants",
+            "by",
+            "time",
+            "score",
+        ]
+
+
+class ListEntrySerializer(ModelSerializer):
+    """
+    A slot of one of the upstream story lists. Attributes the \
+        item's type doesn't have (e.g. the points of a job) are null.
+    """
+
+    id = serializers.IntegerField(source="item_id")
+    type = serializers.CharField(source="item.type")
+    title = serializers.CharField(
+        source="item.get_type.title", allow_null=True
+    )
+    url = serializers.CharField(source="item.get_type.url", allow_null=True)
+    points = serializers.IntegerField(
+        source="item.get_type.score", allow_null=True
+    )
+    descendants = serializers.ReadOnlyField(
+        source="item.get_type.descendants", allow_null=True
+    )
+    by = serializers.CharField(source="item.by_id")
+    time = UnixTimeField(source="item.time")
+
+    class Meta:
+        model = ListEntry
+        fields = [
+            "rank",
+            "id",
+            "type",
+            "title",
+            "url",
+            "points",
+            "descendants",
+            "by",
+            "time",
+        ]
+
+
+class SyncRunSerializer(ModelSerializer):
+    """
+    Stage timings of a collector run, with its throughput and \
+        the stage that dominated it.
+    """
+
+    items_per_sec = serializers.FloatField(read_only=True)
+    bottleneck = serializers.CharField(read_only=True)
+
+    class Meta:
+        model = SyncRun
         exclude = ["id"]
@@ -0,0 +1,1943 @@
+from __future__ import annotations
+
+import asyncio
+import gzip
+import json
+import tempfile
+from datetime import datetime
+from datetime import timedelta
+from datetime import timezone as dt_timezone
+from io import StringIO
+from unittest import mock
+from unittest import skipUnless
+
+import django
+from aiohttp import ClientSession
+from aiohttp.test_utils import TestServer
+from asgiref.sync import async_to_sync
+from asgiref.sync import sync_to_async
+from django.core.cache import caches
+from django.core.management import call_command
+from django.core.management import CommandError
+from django.core.signals import request_finished
+from django.db import close_old_connections
+from django.db import connection
+from django.test import override_settings
+from django.test import RequestFactory
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework import serializers
+from rest_framework.renderers import JSONRenderer
+
+from api import async_views
+from api import benchmarks
+from api import checks
+from api import urls as api_urls
+from api.benchmarks import endpoints
+from api.lib import aio
+from api.lib import cache
+from api.lib import export
+from api.lib import lists
+from api.lib import metrics
+from api.lib import persistence
+from api.lib import profiles
+from api.lib import ranking
+from api.lib import standin
+from api.lib import threads
+from api.lib import transport as transports
+from api.lib.collector import CrawlStats
+from api.lib.collector import HackerNewsCollector
+from api.lib.collector import record_run
+from api.lib.rows import row_serializer
+from api.lib.rows import RowSerializer
+from api.lib.rows import Uncompilable
+from api.lib.synthetic import DatasetGenerator
+from api.lib.synthetic import SyntheticDataset
+from api.management.commands.explain_queries import hot_queries
+from api.models.models import Comment
+from api.models.models import FrontPageRank
+from api.models.models import HNUser
+from api.models.models import Item
+from api.models.models import Job
+from api.models.models import ListEntry
+from api.models.models import Story
+from api.models.models import SyncCursor
+from api.models.models import SyncRun
+from api.search.index import get_index
+from api.search.index import InvertedIndex
+from api.search.lookups import Search
+from api.serializers import BaseItemSerializer
+from api.serializers import CommentSerializer
+from api.serializers import EXPANSIONS
+from api.serializers import JobSerializer
+from api.serializers import StorySerializer
+
+
+T0 = 1_600_000_000
+
+
+def story(id: int, title: str = "A story", time: int = T0, **extra):
+    return {
+        "id": id,
+        "type": "story",
+        "by": "pg",
+        "time": time,
+        "title": title,
+        "url": f"https://example.com/{id}",
+        "score": 1,
+        "descendants": 0,
+        "kids": [],
+        **extra,
+    }
+
+
+def comment(id: int, parent: int, text: str = "A comment", **extra):
+    return {
+        "id": id,
+        "type": "comment",
+        "by": "dang",
+        "time": T0 + id,
+        "parent": parent,
+        "text": text,
+        "kids": [],
+        **extra,
+    }
+
+
+def job(id: int, title: str = "A job", **extra):
+    return {
+        "id": id,
+        "type": "job",
+        "by": "pg",
+        "time": T0 + id,
+        "title": title,
+        "text": "We are hiring.",
+        **extra,
+    }
+
+
+class StubTransport(transports.Transport):
+    """
+    Serves `payloads` by path, as the upstream does: missing items \
+        are a `null` body. The `(status, body)` pairs listed in \
+            `failures` for a path are answered first, each \
+                response after `latency` seconds.
+    """
+
+    def __init__(self, payloads: dict, failures: dict | None = None):
+        self.payloads = payloads
+        self.failures = failures or {}
+        self.requests: list[str] = []
+        self.inflight = self.peak = 0
+        self.latency = 0.0
+
+    async def get(self, path: str) -> tuple[int, bytes]:
+        self.requests.append(path)
+        self.inflight += 1
+        self.peak = max(self.peak, self.inflight)
+        try:
+            await asyncio.sleep(self.latency)
+        finally:
+            self.inflight -= 1
+        if self.failures.get(path):
+            return self.failures[path].pop(0)
+        return 200, json.dumps(self.payloads.get(path)).encode()
+
+
+def items(*payloads) -> dict:
+    """The upstream paths of item `payloads`."""
+    return {f"item/{item['id']}.json": item for item in payloads}
+
+
+def collect(stub: StubTransport, call, **options):
+    """
+    Awaits `call(collector)` on a collector talking to `stub`, \
+        returning the collector and the result.
+    """
+
+    async def run():
+        async with HackerNewsCollector(**options) as collector:
+            collector.backoff = 0
+            return collector, await call(collector)
+
+    with mock.patch.object(transports, "get_transport", return_value=stub):
+        return async_to_sync(run)()
+
+
+class CrawlTests(TestCase):
+    def test_crawl_follows_kids_and_parts_breadth_first(self):
+        stub = StubTransport(
+            items(
+                story(1, kids=[3, 2]),
+                {"id": 2, "type": "poll", "parts": [5], "kids": [4]},
+                comment(3, 1),
+                comment(4, 2),
+                {"id": 5, "type": "pollopt", "poll": 2},
+            )
+        )
+
+        collector, crawled = collect(
+            stub, lambda c: c.crawl([1]), concurrency=1
+        )
+
+        self.assertEqual([item["id"] for item in crawled], [1, 3, 2, 4, 5])
+        self.assertEqual(collector.stats.fetched, 5)
+        self.assertEqual(len(collector.stats.latencies), 5)
+        self.assertGreater(collector.stats.items_per_sec, 0)
+
+    def test_crawl_stops_at_max_items(self):
+        stub = StubTransport(
+            items(
+                story(1, kids=[2, 3, 4]), *(comment(i, 1) for i in (2, 3, 4))
+            )
+        )
+
+        _, crawled = collect(
+            stub, lambda c: c.crawl([1]), concurrency=1, max_items=3
+        )
+
+        self.assertEqual([item["id"] for item in crawled], [1, 2, 3])
+
+    def test_requests_in_flight_are_bounded(self):
+        stub = StubTransport(items(*(story(i) for i in range(1, 21))))
+
+        _, crawled = collect(
+            stub, lambda c: c.crawl(range(1, 21)), concurrency=4
+        )
+
+        self.assertEqual(len(crawled), 20)
+        self.assertEqual(stub.peak, 4)
+
+    def test_failures_are_retried_then_skipped(self):
+        stub = StubTransport(
+            items(*(story(i) for i in range(1, 6))),
+            failures={
+                "item/2.json": [(503, b"")],
+                "item/3.json": [(500, b""), (500, b"")],
+                "item/4.json": [(200, b"{")],
+                "item/5.json": [(200, b"[5]")],
+            },
+        )
+
+        with self.assertLogs("api.lib.collector", "WARNING"):
+            collector, crawled = collect(
+                stub, lambda c: c.crawl(range(1, 7)), retries=1
+            )
+
+        self.assertEqual(sorted(item["id"] for item in crawled), [1, 2])
+        self.assertEqual(collector.failed_ids, {3, 4, 5})
+        self.assertEqual(collector.stats.failed, 3)
+        self.assertEqual(collector.stats.retries, 2)
+        self.assertEqual(stub.requests.count("item/4.json"), 1)
+
+
+@override_settings(SEARCH_INDEX_PATH="")
+class ScheduledSyncTests(TestCase):
+    def test_sync_mirrors_the_lists_under_the_lease(self):
+        stub = StubTransport(
+            {
+                "maxitem.json": 2,
+                "topstories.json": [2, 1],
+                **items(story(1), story(2)),
+            }
+        )
+
+        collect(stub, lambda c: c.sync(lists=True), max_items=10)
+
+        self.assertEqual(Item.objects.count(), 2)
+        self.assertEqual(
+            list(
+                ListEntry.objects.filter(name="top").values_list(
+                    "item_id", flat=True
+                )
+            ),
+            [2, 1],
+        )
+
+    def test_runs_skip_while_another_holds_the_lease(self):
+        SyncCursor.acquire(SyncCursor.ITEMS, timedelta(minutes=5))
+        stub = StubTransport(
+            {
+                "maxitem.json": 2,
+                "topstories.json": [2, 1],
+                **items(story(1), story(2)),
+            }
+        )
+
+        with self.assertLogs("api.lib.collector", "WARNING"):
+            _, synced = collect(stub, lambda c: c.sync(lists=True))
+
+        self.assertEqual(synced, [])
+        self.assertEqual(stub.requests, ["maxitem.json"])
+        self.assertFalse(ListEntry.objects.exists())
+
+
+class SyncCursorTests(TestCase):
+    def test_first_run_starts_below_maxitem(self):
+        cursor = SyncCursor(name="test")
+
+        new_ids, backfill_ids = cursor.advance(1000, 100, 30)
+
+        self.assertEqual(new_ids, range(901, 1001))
+        self.assertEqual(backfill_ids, range(900, 870, -1))
+        self.assertEqual((cursor.high_water, cursor.backfill), (1000, 870))
+
+    def test_advance_caps_new_ids_and_backfills_down_to_zero(self):
+        cursor = SyncCursor(name="test", high_water=1000, backfill=20)
+
+        new_ids, backfill_ids = cursor.advance(1500, 100, 30)
+        self.assertEqual(new_ids, range(1001, 1101))
+        self.assertEqual(list(backfill_ids), list(range(20, 0, -1)))
+
+        new_ids, backfill_ids = cursor.advance(1100, 100, 30)
+        self.assertEqual((list(new_ids), list(backfill_ids)), ([], []))
+        self.assertEqual((cursor.high_water, cursor.backfill), (1100, 0))
+
+    def test_requeue_retries_failures_then_gives_up(self):
+        cursor = SyncCursor(name="test")
+
+        given_up = cursor.requeue([1, 2, 3], failed={2, 3})
+        self.assertEqual((given_up, cursor.retry_ids), ([], [2, 3]))
+
+        given_up = cursor.requeue([2, 3], failed={3})
+        self.assertEqual((given_up, cursor.retry_ids), ([], [3]))
+
+        for _ in range(SyncCursor.MAX_ATTEMPTS - 3):
+            self.assertEqual(cursor.requeue([3], failed={3}), [])
+        self.assertEqual(cursor.requeue([3], failed={3}), [3])
+        self.assertEqual(cursor.retry_ids, [])
+
+    def test_lease_is_held_by_one_run(self):
+        lease = timedelta(minutes=5)
+        cursor = SyncCursor.acquire("test", lease)
+
+        self.assertIsNotNone(cursor)
+        self.assertIsNone(SyncCursor.acquire("test", lease))
+
+        cursor.release()
+        self.assertIsNotNone(SyncCursor.acquire("test", lease))
+
+    def test_expired_lease_can_be_taken(self):
+        SyncCursor.objects.create(
+            name="test", locked_until=timezone.now() - timedelta(seconds=1)
+        )
+
+        self.assertIsNotNone(SyncCursor.acquire("test", timedelta(minutes=5)))
+
+
+@override_settings(SEARCH_INDEX_PATH="", HACKER_NEWS_BACKFILL_SLICE=2)
+class IncrementalSyncTests(TestCase):
+    def test_runs_collect_new_ids_and_retry_failed_ones(self):
+        stub = StubTransport(
+            {"maxitem.json": 6, **items(*(story(i) for i in range(1, 9)))},
+            failures={"item/4.json": [(500, b"")]},
+        )
+
+        with self.assertLogs("api.lib.collector", "WARNING"):
+            collector, _ = collect(
+                stub, lambda c: c.sync(), max_items=4, retries=0
+            )
+
+        cursor = SyncCursor.objects.get(name=SyncCursor.ITEMS)
+        self.assertEqual((cursor.high_water, cursor.backfill), (6, 0))
+        self.assertEqual(cursor.retry_ids, [4])
+        self.assertEqual(collector.stats.backlog, 1)
+        self.assertEqual(
+            sorted(Item.objects.values_list("id", flat=True)), [1, 2, 3, 5, 6]
+        )
+
+        stub.payloads["maxitem.json"] = 8
+        stub.requests.clear()
+        collect(stub, lambda c: c.sync(), max_items=4, retries=0)
+
+        self.assertEqual(
+            sorted(stub.requests),
+            ["item/4.json", "item/7.json", "item/8.json", "maxitem.json"],
+        )
+        cursor.refresh_from_db()
+        self.assertEqual((cursor.high_water, cursor.retry_ids), (8, []))
+        self.assertEqual(Item.objects.count(), 8)
+        self.assertIsNone(cursor.locked_until)
+
+
+def profile(uid: str, karma: int = 1, **extra):
+    return {
+        "id": uid,
+        "created": T0,
+        "karma": karma,
+        "submitted": [],
+        **extra,
+    }
+
+
+@override_settings(SEARCH_INDEX_PATH="")
+class ChangeFeedTests(TestCase):
+    def setUp(self):
+        persistence.save_items([story(1), comment(2, 1)])
+        self.stub = StubTransport(
+            {
+                "updates.json": {"items": [1, 3], "profiles": ["pg"]},
+                **items(story(1, title="Renamed"), story(3)),
+                "user/pg.json": profile("pg", karma=42),
+            }
+        )
+
+    def test_refresh_stores_changed_items_and_profiles(self):
+        collector, (refreshed, users) = collect(
+            self.stub, lambda c: c.refresh(window=timedelta(0))
+        )
+
+        self.assertEqual(sorted(item["id"] for item in refreshed), [1, 3])
+        self.assertEqual([user["id"] for user in users], ["pg"])
+        self.assertEqual(Story.objects.get(id=1).title, "Renamed")
+        self.assertTrue(Story.objects.filter(id=3).exists())
+        self.assertEqual(HNUser.objects.get(uid="pg").karma, 42)
+        self.assertEqual(collector.stats.rows, {"story": 2, "user": 1})
+
+    def test_refresh_skips_what_was_synced_within_the_window(self):
+        collect(self.stub, lambda c: c.refresh(window=timedelta(minutes=5)))
+
+        self.assertNotIn("item/1.json", self.stub.requests)
+        self.assertIn("item/3.json", self.stub.requests)
+        self.assertEqual(Story.objects.get(id=1).title, "A story")
+
+    def test_unreadable_feed_changes_nothing(self):
+        del self.stub.payloads["updates.json"]
+
+        with self.assertLogs("api.lib.collector", "ERROR"):
+            _, refreshed = collect(self.stub, lambda c: c.refresh())
+
+        self.assertEqual(refreshed, ([], []))
+        self.assertEqual(self.stub.requests, ["updates.json"])
+
+
+@override_settings(SEARCH_INDEX_PATH="")
+class PersistenceTests(TestCase):
+    def test_save_items_inserts_then_updates(self):
+        written = persistence.save_items([story(1), comment(2, 1), job(3)])
+
+        self.assertEqual(written, {"story": 1, "comment": 1, "job": 1})
+        self.assertEqual(Story.objects.get(id=1).title, "A story")
+        self.assertTrue(HNUser.objects.filter(uid="dang").exists())
+
+        written = persistence.save_items([story(1, title="Renamed")])
+
+        self.assertEqual(written, {"story": 1})
+        self.assertEqual(Story.objects.get(id=1).title, "Renamed")
+        self.assertEqual(Item.objects.count(), 3)
+
+    def test_save_items_skips_what_it_cannot_store(self):
+        written = persistence.save_items(
+            [None, {"id": 4}, {"id": 5, "type": "unknown"}, story(6)]
+        )
+
+        self.assertEqual(written, {"story": 1})
+        self.assertEqual(list(Item.objects.values_list("id", flat=True)), [6])
+
+    def test_digest_tracks_content_changes(self):
+        persistence.save_items([story(1)])
+        digest, changed_at = Item.objects.values_list(
+            "digest", "changed_at"
+        ).get(id=1)
+
+        persistence.save_items([story(1)])
+        self.assertEqual(
+            Item.objects.values_list("digest", "changed_at").get(id=1),
+            (digest, changed_at),
+        )
+
+        persistence.save_items([story(1, score=2)])
+        new_digest, new_changed_at = Item.objects.values_list(
+            "digest", "changed_at"
+        ).get(id=1)
+        self.assertNotEqual(new_digest, digest)
+        self.assertGreater(new_changed_at, changed_at)
+
+    def test_insert_items_leaves_stored_rows(self):
+        persistence.save_items([story(1)])
+
+        inserted = persistence.insert_items([story(1, title="Renamed")])
+
+        self.assertEqual(inserted, 0)
+        self.assertEqual(Story.objects.get(id=1).title, "A story")
+
+    def test_upsert_counts_written_rows(self):
+        rows = [
+            {
+                "uid": uid,
+                "karma": 1,
+                "delay": 0,
+                "submitted": [],
+                "created": timezone.now(),
+            }
+            for uid in ("pg", "dang")
+        ]
+        self.assertEqual(persistence.upsert(HNUser, rows), 2)
+
+        rows[0]["karma"] = 5
+        self.assertEqual(persistence.upsert(HNUser, rows, update=False), 0)
+        self.assertEqual(HNUser.objects.get(uid="pg").karma, 1)
+
+        self.assertEqual(persistence.upsert(HNUser, rows), 2)
+        self.assertEqual(HNUser.objects.get(uid="pg").karma, 5)
+
+
+@override_settings(SEARCH_INDEX_PATH="")
+class PaginationTests(TestCase):
+    def setUp(self):
+        # five items sharing a time, so pages split between ties
+        persistence.save_items(
+            [story(id, time=T0) for id in range(10, 15)]
+            + [story(1, time=T0 + 60), story(2, time=T0 + 60), story(3)]
+        )
+        Item.objects.filter(id=3).update(time=None)
+
+    def pages(self, path: str):
+        pages = []
+        while path:
+            body = self.client.get(path).json()
+            pages.append([item["id"] for item in body["results"]])
+            path = body["next"]
+        return pages
+
+    def test_offset_pages_are_the_default(self):
+        body = self.client.get("/api/v1/news/?limit=2&offset=2").json()
+
+        self.assertEqual(body["count"], 7)
+        self.assertEqual([item["id"] for item in body["results"]], [12, 13])
+        self.assertIn("offset=4", body["next"])
+        self.assertEqual(
+            self.pages("/api/v1/news/?limit=2"),
+            [[10, 11], [12, 13], [14, 1], [2]],
+        )
+
+    def test_cursor_pages_follow_time_then_id(self):
+        pages = self.pages("/api/v1/news/?limit=2&cursor=")
+
+        self.assertEqual(pages, [[10, 11], [12, 13], [14, 1], [2]])
+        body = self.client.get("/api/v1/news/?limit=2&cursor=").json()
+        self.assertNotIn("count", body)
+        self.assertIn("cursor=", body["next"])
+
+    def test_items_without_time_are_not_listed(self):
+        for path in ("/api/v1/news/", "/api/v1/stories/"):
+            with self.subTest(path=path):
+                offsets = self.client.get(f"{path}?limit=100").json()
+                cursors = self.client.get(f"{path}?limit=100&cursor=").json()
+
+                self.assertEqual(offsets["count"], 7)
+                self.assertEqual(len(offsets["results"]), 7)
+                self.assertEqual(len(cursors["results"]), 7)
+
+        self.assertEqual(
+            self.client.get("/api/v1/stories/3/").status_code, 200
+        )
+
+    def test_previous_page_mirrors_next(self):
+        first = self.client.get("/api/v1/news/?limit=2&cursor=").json()
+        second = self.client.get(first["next"]).json()
+        back = self.client.get(second["previous"]).json()
+
+        self.assertIsNone(first["previous"])
+        self.assertEqual(
+            [item["id"] for item in back["results"]],
+            [item["id"] for item in first["results"]],
+        )
+        self.assertIsNone(back["previous"])
+
+    def test_rows_inserted_before_the_cursor_do_not_shift_pages(self):
+        first = self.client.get("/api/v1/news/?limit=2&cursor=").json()
+        persistence.save_items([story(9, time=T0 - 60)])
+
+        second = self.client.get(first["next"]).json()
+
+        self.assertEqual([item["id"] for item in second["results"]], [12, 13])
+
+    def test_filters_apply_within_pages(self):
+        persistence.save_items([job(20)])
+
+        pages = self.pages("/api/v1/news/?limit=2&type=job&cursor=")
+
+        self.assertEqual(pages, [[20]])
+
+    def test_bad_cursor_is_not_found(self):
+        response = self.client.get("/api/v1/news/?cursor=garbage")
+
+        self.assertEqual(response.status_code, 404)
+
+
+@override_settings(SEARCH_INDEX_PATH="")
+class ExplainQueriesTests(TestCase):
+    def setUp(self):
+        persistence.save_items(
+            [story(1, kids=[2]), comment(2, 1, kids=[3]), comment(3, 2)]
+        )
+
+    def test_every_hot_query_is_explained(self):
+        out = StringIO()
+
+        call_command("explain_queries", stdout=out)
+
+        for name in hot_queries():
+            self.assertIn(name, out.getvalue())
+
+    @skipUnless(connection.vendor == "sqlite", "SQLite plans")
+    def test_threads_are_read_from_the_thread_index(self):
+        queries = hot_queries()
+
+        for name in ("item page, thread", "item page of a comment, thread"):
+            with self.subTest(name=name):
+                self.assertIn("comment_thread_idx", queries[name].explain())
+
+
+@override_settings(SEARCH_INDEX_PATH="")
+class ThreadTests(TestCase):
+    def thread(self, item_id: int) -> list[int]:
+        item = Item.objects.get(id=item_id).get_type()
+        return list(Comment.objects.thread(item).values_list("id", flat=True))
+
+    def test_thread_is_in_kids_order(self):
+        persistence.save_items(
+            [
+                story(1, kids=[3, 2]),
+                comment(2, 1, kids=[5, 4]),
+                comment(3, 1),
+                comment(4, 2),
+                comment(5, 2),
+            ]
+        )
+
+        self.assertEqual(self.thread(1), [3, 2, 5, 4])
+        self.assertEqual(self.thread(2), [5, 4])
+        self.assertEqual(Comment.objects.get(id=5).depth, 1)
+
+    def test_new_replies_take_their_parent_path(self):
+        persistence.save_items([story(1, kids=[2]), comment(2, 1)])
+
+        persistence.save_items([comment(3, 2), comment(4, 3)])
+
+        self.assertEqual(self.thread(1), [2, 3, 4])
+        self.assertEqual(
+            Comment.objects.get(id=4).path,
+            Comment.objects.get(id=3).path + threads.encode(0),
+        )
+
+    def test_reordered_kids_move_subtrees(self):
+        persistence.save_items(
+            [
+                story(1, kids=[2, 3]),
+                comment(2, 1, kids=[4]),
+                comment(3, 1),
+                comment(4, 2),
+            ]
+        )
+
+        persistence.save_items(
+            [story(1, kids=[3, 2]), comment(2, 1, kids=[4])]
+        )
+
+        self.assertEqual(self.thread(1), [3, 2, 4])
+
+    def test_replies_collected_before_their_parent(self):
+        persistence.save_items([story(1, kids=[3]), comment(3, 1)])
+        persistence.save_items([comment(5, 4), comment(6, 5)])
+        self.assertIsNone(Comment.objects.get(id=6).root)
+
+        persistence.save_items(
+            [story(1, kids=[4, 3]), comment(4, 1, kids=[5])]
+        )
+
+        self.assertEqual(self.thread(1), [4, 5, 6, 3])
+        self.assertEqual(Comment.objects.get(id=6).root, 1)
+
+    def test_incremental_paths_match_a_rethread(self):
+        persistence.save_items(
+            [story(1, kids=[2, 3]), comment(2, 1), comment(3, 1)]
+        )
+        persistence.save_items([comment(4, 3), comment(5, 2)])
+        persistence.save_items([story(1, kids=[3, 6, 2]), comment(6, 1)])
+        stored = dict(Comment.objects.values_list("id", "path"))
+
+        self.assertEqual(threads.rethread([1]), 0)
+        self.assertEqual(
+            dict(Comment.objects.values_list("id", "path")), stored
+        )
+
+
+@override_settings(SEARCH_INDEX_PATH="")
+class FullTextSearchTests(TestCase):
+    def setUp(self):
+        persistence.save_items(
+            [
+                story(1, title="Writing a compiler in Python", kids=[3]),
+                story(2, title="Rust for embedded systems", kids=[4]),
+                job(5, title="Python developer"),
+                comment(3, 1, text="<p>Python <i>typing</i> helps</p>"),
+                comment(4, 2, text="Python bindings for Rust"),
+            ]
+        )
+
+    def test_stories_match_titles(self):
+        results = Search().stories("python")
+
+        self.assertEqual(results.count(), 1)
+        self.assertEqual([item.id for item in results[:10]], [1])
+
+    def test_terms_must_all_match_and_the_last_one_is_a_prefix(self):
+        self.assertEqual(Search().stories("rust embed").count(), 1)
+        self.assertEqual(Search().stories("rust python").count(), 0)
+
+    def test_comments_match_text_within_a_thread(self):
+        everywhere = Search().comments("python")
+        in_thread = Search().comments("python", root=Item.objects.get(id=2))
+
+        self.assertEqual(sorted(item.id for item in everywhere), [3, 4])
+        self.assertEqual([item.id for item in in_thread], [4])
+        self.assertEqual(Search().comments("typing").count(), 1)
+
+    def test_deleted_items_leave_the_index(self):
+        persistence.save_items([job(5, title="Python developer", dead=True)])
+
+        self.assertEqual(Search().jobs("python").count(), 0)
+
+
+@override_settings(SEARCH_INDEX_PATH="")
+class InvertedIndexTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = directory.name
+        self.index = InvertedIndex(self.path)
+        self.index.add(
+            [
+                (1, "story", "Python packaging", ""),
+                (2, "story", "Rust", "a note on python"),
+                (3, "job", "Python developer", ""),
+                (4, "comment", "", "python"),
+            ]
+        )
+
+    def test_title_matches_rank_first(self):
+        ranked = [item_id for item_id, _ in self.index.search("python")]
+
+        self.assertEqual(set(ranked), {1, 2, 3, 4})
+        self.assertLess(ranked.index(1), ranked.index(2))
+
+    def test_types_filter_matches(self):
+        ranked = self.index.search("python", types=["job", "comment"])
+
+        self.assertEqual({item_id for item_id, _ in ranked}, {3, 4})
+        self.assertEqual(self.index.count("python", types=["story"]), 2)
+
+    def test_newer_segments_mask_older_documents(self):
+        self.index.add([(1, "story", "Packaging in Go", "")], removed=[3])
+
+        self.assertEqual(
+            {item_id for item_id, _ in self.index.search("python")}, {2, 4}
+        )
+        self.assertEqual(self.index.count("go"), 1)
+
+    def test_merge_keeps_matches(self):
+        for item_id in range(10, 14):
+            self.index.add(
+                [(item_id, "story", f"Python {item_id}", "")], merge=False
+            )
+        before = dict(self.index.search("python", limit=10))
+
+        self.index.merge()
+
+        self.assertLess(len(self.index._manifest()["segments"]), 5)
+        self.assertEqual(dict(self.index.search("python", limit=10)), before)
+
+    def test_threads_cannot_be_filtered(self):
+        with self.assertRaises(ValueError):
+            self.index.search("python", root=1)
+
+    def test_full_match_reads_the_index(self):
+        persistence.save_items(
+            [story(1, title="Python packaging"), job(3, title="Python")]
+        )
+
+        with override_settings(SEARCH_INDEX_PATH=self.path):
+            results = Search().full_match("python")
+            ids = [item.id for item in results[:10]]
+
+        self.assertEqual(ids[0], 1)
+        self.assertEqual(sorted(ids), [1, 3])
+
+    def test_syncs_write_segments_only_with_a_path(self):
+        segments = self.index._manifest()["segments"]
+
+        with self.captureOnCommitCallbacks(execute=True):
+            persistence.save_items([story(20, title="Python")])
+        self.assertIsNone(get_index())
+        self.assertEqual(self.index._manifest()["segments"], segments)
+
+        with override_settings(SEARCH_INDEX_PATH=self.path):
+            with self.captureOnCommitCallbacks(execute=True):
+                persistence.save_items([story(21, title="Python")])
+
+        self.assertNotEqual(self.index._manifest()["segments"], segments)
+        self.assertIn(21, dict(self.index.search("python", limit=10)))
+        self.assertNotIn(20, dict(self.index.search("python", limit=10)))
+
+
+@override_settings(
+    SEARCH_INDEX_PATH="",
+    RESPONSE_CACHE_ENABLED=True,
+    CACHES={
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "response-cache-tests",
+        }
+    },
+)
+class ResponseCacheTests(TestCase):
+    LISTS = ("/api/v1/news/", "/api/v1/stories/", "/api/v1/comments/")
+
+    def setUp(self):
+        cache.get_cache().clear()
+        persistence.save_items([story(1, kids=[2]), comment(2, 1), job(3)])
+
+    def test_lists_are_served_from_the_cache(self):
+        for path in (*self.LISTS, "/api/v1/jobs/", "/home"):
+            with self.subTest(path=path):
+                first = self.client.get(path)
+
+                with self.assertNumQueries(0):
+                    again = self.client.get(path)
+
+                self.assertEqual(again.status_code, 200)
+                self.assertEqual(again.content, first.content)
+                self.assertEqual(again["Content-Type"], first["Content-Type"])
+
+    def test_query_strings_are_normalized(self):
+        self.client.get("/api/v1/news/?type=story&limit=5")
+
+        with self.assertNumQueries(0):
+            self.client.get("/api/v1/news/?limit=5&type=story")
+
+    def test_committed_syncs_invalidate_every_list(self):
+        pages = {path: self.client.get(path).content for path in self.LISTS}
+        Item.objects.filter(id=1).update(dead=True)
+        self.assertEqual(
+            self.client.get("/api/v1/news/").content, pages["/api/v1/news/"]
+        )
+
+        with self.captureOnCommitCallbacks(execute=True):
+            persistence.save_items(
+                [story(1, title="Renamed", kids=[2, 4]), comment(4, 1)]
+            )
+
+        for path, content in pages.items():
+            with self.subTest(path=path):
+                self.assertNotEqual(self.client.get(path).content, content)
+
+    def test_writes_through_the_api_invalidate_lists(self):
+        before = self.client.get("/api/v1/comments/").json()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.delete("/api/v1/comments/2/")
+        self.assertEqual(response.status_code, 204)
+
+        after = self.client.get("/api/v1/comments/").json()
+        self.assertEqual((before["count"], after["count"]), (1, 0))
+
+    def test_off_unless_enabled(self):
+        self.client.get("/api/v1/news/")
+
+        with override_settings(RESPONSE_CACHE_ENABLED=False):
+            with self.assertNumQueries(2):
+                self.client.get("/api/v1/news/")
+
+
+@override_settings(SEARCH_INDEX_PATH="")
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        persistence.save_items([story(1)])
+
+    def test_unchanged_item_is_not_modified(self):
+        first = self.client.get("/api/v1/news/1")
+
+        again = self.client.get(
+            "/api/v1/news/1", HTTP_IF_NONE_MATCH=first["ETag"]
+        )
+        since = self.client.get(
+            "/api/v1/news/1", HTTP_IF_MODIFIED_SINCE=first["Last-Modified"]
+        )
+
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(again.status_code, 304)
+        self.assertEqual(again["ETag"], first["ETag"])
+        self.assertEqual(since.status_code, 304)
+
+    def test_changed_item_is_sent_again(self):
+        etag = self.client.get("/api/v1/news/1")["ETag"]
+        persistence.save_items([story(1, title="Renamed")])
+
+        response = self.client.get("/api/v1/news/1", HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_item_endpoints_answer_conditional_requests(self):
+        persistence.save_items([comment(2, 1), job(3)])
+
+        for path in (
+            "/api/v1/stories/1/",
+            "/api/v1/comments/2/",
+            "/api/v1/jobs/3/",
+        ):
+            with self.subTest(path=path):
+                etag = self.client.get(path)["ETag"]
+
+                with self.assertNumQueries(1):
+                    response = self.client.get(path, HTTP_IF_NONE_MATCH=etag)
+
+                self.assertEqual(response.status_code, 304)
+
+
+@override_settings(SEARCH_INDEX_PATH="", RESPONSE_CACHE_ENABLED=False)
+class FrontPageTests(TestCase):
+    now = datetime.fromtimestamp(T0 + 3600, tz=dt_timezone.utc)
+
+    def test_gravity_favours_points_and_youth(self):
+        hour = timedelta(hours=1)
+
+        self.assertEqual(ranking.gravity(1, hour), 0)
+        self.assertEqual(ranking.gravity(None, hour), ranking.gravity(0, hour))
+        self.assertGreater(ranking.gravity(10, hour), ranking.gravity(5, hour))
+        self.assertGreater(
+            ranking.gravity(10, hour), ranking.gravity(10, 2 * hour)
+        )
+        self.assertEqual(
+            ranking.gravity(10, -hour), ranking.gravity(10, timedelta(0))
+        )
+
+    def test_ranks_recent_live_stories_by_gravity(self):
+        persistence.save_items(
+            [
+                story(1, score=10),
+                story(2, score=50, time=T0 - 3600),
+                story(3, score=100, time=T0 - 73 * 3600),
+                story(4, score=80, dead=True),
+                story(5, score=10),
+                job(6),
+            ]
+        )
+
+        self.assertEqual(ranking.rank_front_page(self.now), 3)
+
+        self.assertEqual(
+            list(
+                FrontPageRank.objects.order_by("rank").values_list(
+                    "rank", "item_id"
+                )
+            ),
+            [(1, 2), (2, 1), (3, 5)],
+        )
+
+    def test_reranking_replaces_the_front_page(self):
+        persistence.save_items([story(1, score=10), story(2, score=5)])
+        ranking.rank_front_page(self.now)
+        persistence.save_items([story(2, score=50)])
+
+        with override_settings(FRONT_PAGE_SIZE=1):
+            self.assertEqual(ranking.rank_front_page(self.now), 1)
+
+        self.assertEqual(
+            list(FrontPageRank.objects.values_list("rank", "item_id")),
+            [(1, 2)],
+        )
+
+    def test_endpoint_pages_through_the_ranks(self):
+        persistence.save_items(
+            [story(id, score=100 - id) for id in range(1, 6)]
+        )
+        ranking.rank_front_page(self.now)
+
+        pages, path = [], "/api/v1/news/top?limit=2"
+        while path:
+            body = self.client.get(path).json()
+            pages.append([(row["rank"], row["id"]) for row in body["results"]])
+            path = body["next"]
+
+        self.assertEqual(pages, [[(1, 1), (2, 2)], [(3, 3), (4, 4)], [(5, 5)]])
+        self.assertEqual(body["results"][0]["points"], 95)
+
+
+@override_settings(SEARCH_INDEX_PATH="", RESPONSE_CACHE_ENABLED=False)
+class StoryListTests(TestCase):
+    def setUp(self):
+        lists._ranks.clear()
+        persistence.save_items([story(1), story(2), story(3), job(4)])
+
+    def entries(self, name: str) -> list[tuple[int, int]]:
+        return list(
+            ListEntry.objects.filter(name=name)
+            .order_by("rank")
+            .values_list("item_id", "rank")
+        )
+
+    def test_snapshot_keeps_the_first_slot_of_duplicates(self):
+        self.assertEqual(lists.snapshot([3, 1, 3, 2]), {3: 1, 1: 2, 2: 3})
+
+    def test_diff_finds_added_moved_and_removed_slots(self):
+        self.assertEqual(
+            lists.diff({1: 1, 2: 2, 3: 3}, {2: 1, 1: 2, 4: 3}),
+            ({4: 3}, {2: 1, 1: 2}, [3]),
+        )
+
+    def test_store_writes_only_changed_slots(self):
+        self.assertEqual(lists.store("top", [1, 2, 3]), 3)
+        self.assertEqual(lists.store("top", [1, 2, 3]), 0)
+
+        kept = ListEntry.objects.get(name="top", item_id=2).pk
+
+        written = lists.store("top", [3, 2, 4, 1])
+
+        self.assertEqual(written, 3)
+        self.assertEqual(self.entries("top"), [(3, 1), (2, 2), (4, 3), (1, 4)])
+        self.assertEqual(ListEntry.objects.get(item_id=2).pk, kept)
+
+    def test_ranks_are_reread_when_lists_change(self):
+        lists.store("top", [1, 2])
+        self.assertEqual(lists.rank_of("top", 2), 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            lists.store("top", [2, 1])
+
+        self.assertEqual(lists.rank_of("top", 2), 1)
+        self.assertIsNone(lists.rank_of("top", 3))
+
+    def test_ranks_are_reread_after_their_ttl(self):
+        lists.store("top", [1, 2])
+        self.assertEqual(lists.rank_of("top", 1), 1)
+        ListEntry.objects.filter(item_id=1).update(rank=3)
+
+        self.assertEqual(lists.rank_of("top", 1), 1)
+        with override_settings(LIST_RANKS_TTL=0):
+            self.assertEqual(lists.rank_of("top", 1), 3)
+
+    def test_endpoints_page_and_rank_lists(self):
+        lists.store("top", [3, 4, 1])
+
+        body = self.client.get("/api/v1/lists/top?limit=2").json()
+        rows = self.client.get(body["next"]).json()["results"]
+
+        self.assertEqual(
+            [(row["rank"], row["id"]) for row in body["results"]],
+            [(1, 3), (2, 4)],
+        )
+        self.assertIsNone(body["results"][1]["points"])
+        self.assertEqual([row["id"] for row in rows], [1])
+        self.assertEqual(
+            self.client.get("/api/v1/lists/top/4").json(),
+            {"list": "top", "id": 4, "rank": 2},
+        )
+        self.assertEqual(
+            self.client.get("/api/v1/lists/top/2").status_code, 404
+        )
+        self.assertEqual(self.client.get("/api/v1/lists/hot").status_code, 404)
+
+    def test_sync_fetches_only_missing_items(self):
+        lists.store("new", [1])
+        stub = StubTransport(
+            {
+                "topstories.json": [5, 1],
+                "newstories.json": None,
+                **items(story(5)),
+            }
+        )
+
+        collect(stub, lambda c: c.sync_lists())
+
+        self.assertEqual(
+            [path for path in stub.requests if path.startswith("item/")],
+            ["item/5.json"],
+        )
+        self.assertEqual(self.entries("top"), [(5, 1), (1, 2)])
+        self.assertEqual(self.entries("new"), [(1, 1)])
+
+
+@override_settings(SEARCH_INDEX_PATH="", RESPONSE_CACHE_ENABLED=False)
+class AsyncViewTests(TestCase):
+    def setUp(self):
+        persistence.save_items(
+            [
+                story(1, kids=[3, 4]),
+                story(2, time=T0 + 60),
+                comment(3, 1, "Three", kids=[5]),
+                comment(4, 1, "Four"),
+                comment(5, 3, "Five"),
+            ]
+        )
+        self.factory = RequestFactory()
+
+    def call(self, view, path: str, *args, method: str = "get", **headers):
+        request = getattr(self.factory, method)(path, **headers)
+        return async_to_sync(view)(request, *args)
+
+    def test_lists_match_the_sync_endpoints(self):
+        for view, path in (
+            (async_views.news_list, "/api/v1/news/?limit=2&offset=1"),
+            (async_views.news_list, "/api/v1/news/?cursor=&limit=2"),
+            (async_views.news_list, "/api/v1/news/?type=comment"),
+            (async_views.story_list, "/api/v1/stories/"),
+        ):
+            with self.subTest(path=path):
+                response = self.call(view, path)
+
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(
+                    json.loads(response.content), self.client.get(path).json()
+                )
+
+    def test_details_match_the_sync_endpoints(self):
+        for view, path in (
+            (async_views.news_detail, "/api/v1/news/3"),
+            (async_views.story_detail, "/api/v1/stories/1/"),
+        ):
+            with self.subTest(path=path):
+                expected = self.client.get(path)
+
+                response = self.call(view, path, int(path.split("/")[4]))
+                again = self.call(
+                    view,
+                    path,
+                    int(path.split("/")[4]),
+                    HTTP_IF_NONE_MATCH=expected["ETag"],
+                )
+
+                self.assertEqual(response.content, expected.content)
+                self.assertEqual(response["ETag"], expected["ETag"])
+                self.assertEqual(again.status_code, 304)
+
+    def test_missing_items_are_not_found(self):
+        response = self.call(async_views.news_detail, "/", 404)
+
+        self.assertEqual(response.status_code, 404)
+        self.assertIn("detail", json.loads(response.content))
+
+    def test_items_deleted_while_read_are_not_found(self):
+        Item.objects.filter(id=2).update(digest="")
+        first = aio.first
+
+        async def first_then_delete(queryset):
+            row = await first(queryset)
+            await sync_to_async(Item.objects.filter(id=2).delete)()
+            return row
+
+        with mock.patch.object(aio, "first", first_then_delete):
+            response = self.call(async_views.news_detail, "/", 2)
+
+        self.assertEqual(response.status_code, 404)
+
+    def test_comment_threads_page_in_thread_order(self):
+        response = self.call(async_views.comment_thread, "/", 1)
+        replies = self.call(async_views.comment_thread, "/", 3)
+
+        self.assertEqual(
+            [row["text"] for row in json.loads(response.content)["results"]],
+            ["Three", "Five", "Four"],
+        )
+        self.assertEqual(
+            [row["text"] for row in json.loads(replies.content)["results"]],
+            ["Five"],
+        )
+
+    def test_only_reads_are_allowed(self):
+        response = self.call(async_views.news_detail, "/", 1, method="delete")
+
+        self.assertEqual(response.status_code, 405)
+        self.assertTrue(Item.objects.filter(id=1).exists())
+
+    def test_routing_them_before_django_4_1_warns(self):
+        with override_settings(ASYNC_VIEWS_ENABLED=True):
+            warnings = checks.check_async_views(None)
+        with override_settings(ASYNC_VIEWS_ENABLED=False):
+            self.assertEqual(checks.check_async_views(None), [])
+
+        self.assertEqual(
+            [warning.id for warning in warnings],
+            ["api.W002"] if django.VERSION < (4, 1) else [],
+        )
+
+
+@override_settings(SEARCH_INDEX_PATH="", PROFILE_CACHE_TTL=60)
+class ProfileTests(TestCase):
+    def setUp(self):
+        cache.get_cache().clear()
+        persistence.save_profiles([profile("dang", karma=7)])
+        self.stub = StubTransport(
+            {"user/pg.json": profile("pg", karma=42), "user/dang.json": None}
+        )
+
+    def fetch(self, call):
+        """Awaits `call(fetcher)` on the shared fetcher, then closes it."""
+
+        async def run():
+            try:
+                return await call(await profiles.get_fetcher())
+            finally:
+                await profiles.close_fetcher()
+
+        with mock.patch.object(
+            transports, "get_transport", return_value=self.stub
+        ):
+            return async_to_sync(run)()
+
+    def test_fetched_profiles_are_cached(self):
+        async def twice(fetcher):
+            await fetcher.fetch_many(["pg"])
+            return await fetcher.fetch_many(["pg"])
+
+        found = self.fetch(twice)
+
+        self.assertEqual(found["pg"]["karma"], 42)
+        self.assertEqual(self.stub.requests, ["user/pg.json"])
+
+    def test_concurrent_fetches_share_requests(self):
+        self.stub.latency = 0.05
+
+        async def concurrently(fetcher):
+            again = await profiles.get_fetcher()
+            return await asyncio.gather(
+                fetcher.fetch_many(["pg", "dang"]),
+                again.fetch_many(["dang", "pg"]),
+            )
+
+        first, second = self.fetch(concurrently)
+
+        self.assertEqual(first, second)
+        self.assertEqual(
+            sorted(self.stub.requests), ["user/dang.json", "user/pg.json"]
+        )
+
+    def test_missing_profiles_fall_back_to_stored_rows(self):
+        found = self.fetch(lambda f: f.fetch_many(["pg", "dang", "nobody"]))
+
+        self.assertEqual(sorted(found), ["dang", "pg"])
+        self.assertEqual(found["dang"]["karma"], 7)
+
+    def test_refreshes_skip_the_cache_and_the_stored_rows(self):
+        self.fetch(lambda f: f.fetch_many(["pg"]))
+        self.stub.payloads["user/pg.json"] = profile("pg", karma=43)
+
+        found = self.fetch(lambda f: f.fetch_many(["pg", "dang"], True))
+
+        self.assertEqual(found, {"pg": profile("pg", karma=43)})
+        self.assertEqual(self.stub.requests.count("user/pg.json"), 2)
+
+    def test_change_feed_refresh_goes_through_the_fetcher(self):
+        self.stub.payloads["updates.json"] = {"profiles": ["pg", "dang"]}
+
+        _, (_, refreshed) = collect(
+            self.stub, lambda c: c.refresh(window=timedelta(0))
+        )
+
+        self.assertEqual(refreshed, [profile("pg", karma=42)])
+        self.assertEqual(HNUser.objects.get(uid="dang").karma, 7)
+        self.assertEqual(
+            self.fetch(lambda f: f.fetch_many(["pg"])),
+            {"pg": profile("pg", karma=42)},
+        )
+        self.assertEqual(self.stub.requests.count("user/pg.json"), 1)
+
+    def test_sync_callers_get_a_closed_fetcher(self):
+        with mock.patch.object(
+            transports, "get_transport", return_value=self.stub
+        ):
+            found = HNUser().fetch_user_details("pg")
+
+        self.assertEqual(found["karma"], 42)
+        self.assertEqual(profiles._fetchers, {})
+
+
+class RecordingTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = f"{directory.name}/hn.rec"
+
+    def test_store_round_trips_compressed_bodies(self):
+        body = json.dumps(story(1, kids=[2, 3])).encode()
+        store = transports.ResponseStore(self.path)
+        store.put("item/1.json", 200, b"{}")
+        store.put("item/1.json", 200, body)
+
+        self.assertEqual(len(store), 1)
+        self.assertLess(len(store.compress(body)), 0.7 * len(body))
+        store.close()
+
+        replay = transports.ResponseStore(self.path, readonly=True)
+        self.assertEqual(replay.get("item/1.json"), (200, body))
+        self.assertIsNone(replay.get("item/2.json"))
+        replay.close()
+
+    def test_stores_of_another_format_are_refused(self):
+        transports.ResponseStore(self.path).close()
+
+        with mock.patch.object(transports, "FORMAT", transports.FORMAT + 1):
+            with self.assertRaises(ValueError):
+                transports.ResponseStore(self.path, readonly=True)
+
+    def test_unknown_modes_are_refused(self):
+        with self.assertRaises(ValueError):
+            transports.get_transport("", 1, 1, mode="tape")
+
+    def test_replay_serves_what_a_crawl_recorded(self):
+        stub = StubTransport(
+            items(story(1, kids=[2, 3]), comment(2, 1), comment(3, 1)),
+            failures={"item/3.json": [(503, b"")]},
+        )
+        recorder = transports.RecordingTransport(
+            stub, transports.ResponseStore(self.path)
+        )
+        with self.assertLogs("api.lib.collector", "WARNING"):
+            _, recorded = collect(recorder, lambda c: c.crawl([1]), retries=0)
+            collector, replayed = async_to_sync(self.replay)([1])
+
+        self.assertEqual([item["id"] for item in recorded], [1, 2])
+        self.assertEqual(replayed, recorded)
+        self.assertEqual(collector.failed_ids, {3})
+
+    async def replay(self, ids):
+        async with HackerNewsCollector(
+            transport="replay", recording=self.path, retries=0
+        ) as collector:
+            collector.backoff = 0
+            return collector, await collector.crawl(ids)
+
+
+class StandInTests(TestCase):
+    dataset = SyntheticDataset(size=20)
+
+    def serve(self, call, **conditions):
+        """Awaits `call(url)` with the stand-in served at `url`."""
+        app = standin.create_app(
+            self.dataset, conditions=standin.Conditions(**conditions)
+        )
+
+        async def run():
+            async with TestServer(app) as server:
+                return await call(str(server.make_url("")))
+
+        return async_to_sync(run)()
+
+    def crawl(self, ids, **options):
+        async def call(url):
+            async with HackerNewsCollector(
+                base_url=f"{url}/v0", transport="passthrough", **options
+            ) as collector:
+                collector.backoff = 0
+                return await collector.crawl(ids, expand=False)
+
+        return call
+
+    def statuses(self, count: int, **conditions) -> list[tuple]:
+        async def call(url):
+            async with ClientSession() as session:
+                responses = []
+                for _ in range(count):
+                    async with session.get(f"{url}/v0/maxitem.json") as resp:
+                        responses.append(
+                            (resp.status, resp.headers.get("Retry-After"))
+                        )
+                return responses
+
+        return self.serve(call, **conditions)
+
+    def test_serves_the_dataset_like_the_upstream(self):
+        crawled = self.serve(self.crawl(range(1, 21)))
+
+        self.assertEqual(
+            crawled, [self.dataset.get(id) for id in range(1, 21)]
+        )
+
+    def test_failures_are_emulated(self):
+        statuses = self.statuses(5, error_rate=1)
+
+        self.assertTrue(all(status in (500, 503) for status, _ in statuses))
+
+    def test_requests_beyond_the_rate_are_throttled(self):
+        self.assertEqual(
+            self.statuses(2, rate_limit=0.5), [(200, None), (429, "2")]
+        )
+        self.assertEqual(self.statuses(3, rate_limit=2)[2], (429, "1"))
+
+    def test_token_bucket_refills_at_its_rate(self):
+        with mock.patch.object(standin.time, "monotonic", return_value=0):
+            bucket = standin.TokenBucket(0.5)
+            self.assertEqual([bucket.take(), bucket.take()], [True, False])
+        with mock.patch.object(standin.time, "monotonic", return_value=2):
+            self.assertEqual([bucket.take(), bucket.take()], [True, False])
+
+    def test_collector_waits_out_retry_after(self):
+        with self.assertLogs("api.lib.collector", "WARNING") as logs:
+            crawled = self.serve(
+                self.crawl([1, 2], concurrency=1, retries=1), rate_limit=1
+            )
+
+        self.assertEqual([item["id"] for item in crawled], [1, 2])
+        self.assertIn("in 1.0s: 429", logs.output[0])
+
+
+@override_settings(SEARCH_INDEX_PATH="")
+class DatasetTests(TestCase):
+    def test_generator_yields_exactly_size_items(self):
+        # polls near the end of the range have no room for their options
+        with mock.patch.object(DatasetGenerator, "POLL_RATIO", 0.3):
+            for size in range(1, 40):
+                with self.subTest(size=size):
+                    generated = DatasetGenerator(
+                        size, users=5, start=T0, span=3600, first_id=7
+                    )
+
+                    self.assertEqual(
+                        sorted(item["id"] for item in generated),
+                        list(range(7, 7 + size)),
+                    )
+
+    def test_generator_is_deterministic(self):
+        def generate(seed: int) -> list[dict]:
+            return list(
+                DatasetGenerator(200, users=20, start=T0, span=3600, seed=seed)
+            )
+
+        self.assertEqual(generate(1), generate(1))
+        self.assertNotEqual(generate(1), generate(2))
+
+    def test_command_appends_threaded_items(self):
+        out = StringIO()
+
+        call_command("generate_dataset", items=400, days=1, stdout=out)
+        call_command("generate_dataset", items=100, days=1, stdout=out)
+
+        self.assertEqual(Item.objects.count(), 500)
+        self.assertEqual(Item.objects.latest("id").id, 500)
+        self.assertIn("Generated items 401 to 500", out.getvalue())
+        stored = dict(Comment.objects.values_list("id", "path"))
+        roots = Comment.objects.values_list("root", flat=True).distinct()
+        self.assertEqual(threads.rethread(list(roots)), 0)
+        self.assertEqual(
+            dict(Comment.objects.values_list("id", "path")), stored
+        )
+
+
+@override_settings(SEARCH_INDEX_PATH="")
+class BenchmarkTests(TestCase):
+    def setUp(self):
+        # the in-process handler would close the test transaction
+        request_finished.disconnect(close_old_connections)
+        self.addCleanup(request_finished.connect, close_old_connections)
+        persistence.save_items(
+            [story(1, kids=[2]), comment(2, 1), job(3), story(4)]
+        )
+        ListEntry.objects.create(name="top", rank=1, item_id=1)
+
+    def test_every_route_is_measured(self):
+        routes = endpoints.paths(endpoints.samples())
+
+        for pattern in api_urls.urlpatterns:
+            if getattr(pattern, "name", None):
+                self.assertIn(pattern.name, routes)
+        self.assertEqual(routes["export_news"], "/api/v1/news/export?type=job")
+        self.assertEqual(routes["item page"], "/1/")
+        self.assertEqual(routes["get_news, ?by="], "/api/v1/news/?by=pg")
+
+    def test_run(self):
+        results = endpoints.run(sizes=(2,))
+
+        self.assertEqual(results["meta"]["items"], 4)
+        for name, result in results.items():
+            if name == "meta":
+                continue
+            with self.subTest(endpoint=name):
+                self.assertEqual(result[2]["cold"]["status"], [200])
+                self.assertGreater(result[2]["cold"]["p99_ms"], 0)
+                self.assertGreater(result[2]["queries"], 0)
+
+    def test_empty_database(self):
+        Item.objects.all().delete()
+
+        with self.assertRaises(ValueError):
+            endpoints.samples()
+
+    def test_compare(self):
+        changes = benchmarks.compare(
+            {"a": {"p50_ms": 2.0, "status": [200]}, "b": 0, "c": True},
+            {"a": {"p50_ms": 3.0, "status": [200]}, "b": 1, "c": False},
+        )
+
+        self.assertEqual(
+            changes,
+            {
+                "a/p50_ms": {"before": 2.0, "after": 3.0, "change": 0.5},
+                "b": {"before": 0, "after": 1, "change": None},
+            },
+        )
+
+
+@override_settings(SEARCH_INDEX_PATH="", RESPONSE_CACHE_ENABLED=False)
+class MetricsTests(TestCase):
+    def setUp(self):
+        for histogram in metrics.registry.histograms.values():
+            histogram.series.clear()
+        caches["default"].clear()
+        slot = mock.patch.object(metrics, "_slot", None)
+        slot.start()
+        self.addCleanup(slot.stop)
+
+    def series(self, name: str) -> dict[tuple, list]:
+        return metrics.registry[name].series
+
+    def test_requests_are_recorded_by_route(self):
+        persistence.save_items([story(1), story(2)])
+
+        self.client.get("/api/v1/news/")
+        self.client.get("/api/v1/news/1")
+        self.client.get("/api/v1/nowhere")
+
+        self.assertEqual(
+            sorted(self.series("hn_request_duration_seconds")),
+            [
+                ("<unmatched>", "GET", "404"),
+                ("api/v1/news/", "GET", "200"),
+                ("api/v1/news/<int:id>", "GET", "200"),
+            ],
+        )
+        queries = self.series("hn_request_queries")[("api/v1/news/",)]
+        self.assertEqual(queries[-1], 2)
+        self.assertIn(
+            ("api/v1/news/",), self.series("hn_serializer_duration_seconds")
+        )
+
+    def test_exposition_is_cumulative(self):
+        metrics.record(
+            'say "hi"', "GET", 200, 0.03, metrics.RequestStats(queries=3)
+        )
+        metrics.record("r", "GET", 200, 20, metrics.RequestStats())
+
+        text = metrics.exposition()
+
+        self.assertIn("# TYPE hn_request_duration_seconds histogram\n", text)
+        labels = 'route="say \\"hi\\"",method="GET",status="200"'
+        for bound, count in (("0.025", 0), ("0.05", 1), ("+Inf", 1)):
+            self.assertIn(
+                f'hn_request_duration_seconds_bucket{{{labels},le="{bound}"}}'
+                f" {count}\n",
+                text,
+            )
+        self.assertIn(
+            'hn_request_duration_seconds_bucket{route="r",method="GET",'
+            'status="200",le="+Inf"} 1\n',
+            text,
+        )
+        self.assertIn('hn_request_queries_sum{route="r"} 0.0\n', text)
+        self.assertIn('hn_request_queries_count{route="r"} 1\n', text)
+        self.assertNotIn("hn_serializer_duration_seconds_bucket", text)
+
+    def test_scrapes_sum_the_workers_holding_a_slot(self):
+        stats = metrics.RequestStats(queries=1)
+        metrics.record("r", "GET", 200, 0.01, stats)
+        metrics.flush()
+        published = caches["default"].get(f"metrics:{metrics.WORKER}")
+        caches["default"].set("metrics:other:1", published)
+        caches["default"].set("metrics:gone:2", published)
+        caches["default"].set(metrics.SLOT_KEY.format(1), "other:1")
+
+        total = metrics.collect()
+
+        self.assertEqual(
+            caches["default"].get(metrics.SLOT_KEY.format(0)), metrics.WORKER
+        )
+        self.assertEqual(total["hn_request_queries"][("r",)][-1], 2)
+
+    def test_scrapes_are_restricted_to_allowed_addresses(self):
+        allowed = self.client.get("/metrics")
+        refused = self.client.get("/metrics", REMOTE_ADDR="10.0.0.1")
+
+        self.assertEqual(allowed.status_code, 200)
+        self.assertTrue(allowed["Content-Type"].startswith("text/plain"))
+        self.assertEqual(refused.status_code, 404)
+
+
+@override_settings(SEARCH_INDEX_PATH="", RESPONSE_CACHE_ENABLED=False)
+class SyncRunTests(TestCase):
+    def run_main(self, stub: StubTransport, call):
+        with mock.patch.object(transports, "get_transport", return_value=stub):
+            return async_to_sync(call)(max_items=10)
+
+    def test_runs_are_recorded_with_their_stages(self):
+        stub = StubTransport(
+            {
+                "maxitem.json": 3,
+                **items(story(1), story(2, kids=[3]), comment(3, 2)),
+            }
+        )
+
+        stats = self.run_main(stub, HackerNewsCollector.main)
+
+        run = SyncRun.objects.get()
+        self.assertEqual(run.kind, SyncRun.SYNC)
+        self.assertEqual((run.fetched, run.failed, run.error), (3, 0, ""))
+        self.assertEqual(run.rows, {"story": 2, "comment": 1})
+        self.assertEqual(run.requests, len(stats.latencies))
+        self.assertEqual(run.backlog, 0)
+        self.assertIsNotNone(run.fetch_p99)
+        self.assertIn(run.bottleneck, ("network", "cpu", "database"))
+
+    def test_failed_runs_are_recorded_too(self):
+        stub = StubTransport({})
+
+        with mock.patch.object(
+            HackerNewsCollector, "refresh", side_effect=RuntimeError("boom")
+        ):
+            with self.assertRaises(RuntimeError):
+                self.run_main(stub, HackerNewsCollector.changes)
+
+        run = SyncRun.objects.get()
+        self.assertEqual(run.kind, SyncRun.CHANGES)
+        self.assertEqual(run.error, "RuntimeError('boom')")
+
+    def test_runs_past_the_retention_are_pruned(self):
+        now = timezone.now()
+        old = SyncRun.objects.create(
+            kind=SyncRun.SYNC, started_at=now - timedelta(days=31), seconds=1
+        )
+        kept = SyncRun.objects.create(
+            kind=SyncRun.SYNC, started_at=now - timedelta(days=29), seconds=1
+        )
+
+        recorded = record_run(SyncRun.CHANGES, CrawlStats(), now)
+
+        self.assertEqual(
+            set(SyncRun.objects.values_list("pk", flat=True)),
+            {kept.pk, recorded.pk},
+        )
+        self.assertFalse(SyncRun.objects.filter(pk=old.pk).exists())
+
+    def test_endpoint_lists_runs_by_kind(self):
+        now = timezone.now()
+        for minutes, kind in ((3, "sync"), (2, "changes"), (1, "sync")):
+            SyncRun.objects.create(
+                kind=kind,
+                started_at=now - timedelta(minutes=minutes),
+                seconds=2,
+                fetched=10,
+                write_seconds=1,
+            )
+
+        runs = self.client.get("/api/v1/sync/runs?kind=sync").json()
+        everything = self.client.get("/api/v1/sync/runs").json()
+
+        self.assertEqual(
+            [run["kind"] for run in runs["results"]], ["sync"] * 2
+        )
+        self.assertEqual(len(everything["results"]), 3)
+        self.assertEqual(runs["results"][0]["items_per_sec"], 5.0)
+        self.assertEqual(runs["results"][0]["bottleneck"], "database")
+        self.assertGreater(
+            runs["results"][0]["started_at"], runs["results"][1]["started_at"]
+        )
+        self.assertEqual(
+            self.client.get("/api/v1/sync/runs?kind=crawl").status_code, 400
+        )
+
+
+@override_settings(SEARCH_INDEX_PATH="", RESPONSE_CACHE_ENABLED=False)
+class RowSerializerTests(TestCase):
+    SERIALIZERS = {
+        BaseItemSerializer: Item,
+        StorySerializer: Story,
+        CommentSerializer: Comment,
+        JobSerializer: Job,
+    }
+
+    def setUp(self):
+        persistence.save_items(
+            [
+                story(1, kids=[2]),
+                comment(2, 1, kids=[3], deleted=True),
+                comment(3, 2, text=None),
+                job(4, url=None),
+            ]
+        )
+
+    def assertRendersLike(self, drf, rows):
+        render = JSONRenderer().render
+        self.assertEqual(render(rows), render(drf))
+
+    def test_rows_match_the_serializers(self):
+        for serializer_class, model in self.SERIALIZERS.items():
+            with self.subTest(serializer=serializer_class.__name__):
+                queryset = model.objects.order_by("id")
+                rows = row_serializer(serializer_class)
+
+                self.assertRendersLike(
+                    serializer_class(queryset, many=True).data,
+                    rows.render_many(rows.values(queryset)),
+                )
+
+    def test_compiled_once_per_serializer(self):
+        self.assertIs(
+            row_serializer(StorySerializer), row_serializer(StorySerializer)
+        )
+
+    def test_renders_without_instances_or_extra_queries(self):
+        rows = row_serializer(StorySerializer)
+
+        with self.assertNumQueries(1):
+            data = rows.render_many(rows.values(Story.objects.all()))
+
+        self.assertEqual(data[0]["by"]["uid"], "pg")
+
+    def test_list_endpoints_match_the_serializers(self):
+        for path, serializer_class, model in (
+            ("/api/v1/news/", BaseItemSerializer, Item),
+            ("/api/v1/stories/", StorySerializer, Story),
+        ):
+            with self.subTest(path=path):
+                body = self.client.get(path).json()
+
+                self.assertRendersLike(
+                    sorted(
+                        serializer_class(model.objects.all(), many=True).data,
+                        key=json.dumps,
+                    ),
+                    sorted(body["results"], key=json.dumps),
+                )
+
+    def test_unknown_item_is_not_found(self):
+        self.assertEqual(self.client.get("/api/v1/news/404").status_code, 404)
+
+    def test_uncompilable_fields(self):
+        class Computed(serializers.ModelSerializer):
+            title = serializers.SerializerMethodField()
+
+            class Meta:
+                model = Story
+                fields = ["title"]
+
+            def get_title(self, story):
+                return story.title.upper()
+
+        class Nested(serializers.ModelSerializer):
+            by = Computed(read_only=True)
+
+            class Meta:
+                model = Story
+                fields = ["by"]
+
+        with self.assertRaises(Uncompilable):
+            RowSerializer(Computed)
+        # a nested serializer that can't be joined is left as its key
+        rows = RowSerializer(Nested)
+        self.assertEqual(
+            rows.render_many(rows.values(Story.objects.all())), [{"by": "pg"}]
+        )
+
+    def test_sync_bookkeeping_is_not_exposed(self):
+        body = self.client.get("/api/v1/news/").json()
+
+        for item in body["results"]:
+            self.assertFalse({"synced_at", "digest", "changed_at"} & set(item))
+
+
+@override_settings(SEARCH_INDEX_PATH="", RESPONSE_CACHE_ENABLED=False)
+class FieldsetTests(TestCase):
+    def setUp(self):
+        persistence.save_items(
+            [
+                story(1, kids=[2, 3]),
+                comment(2, 1),
+                comment(3, 1, deleted=True),
+                story(4, by="dang"),
+            ]
+        )
+
+    def assertRendersLike(self, drf, rows):
+        render = JSONRenderer().render
+        self.assertEqual(render(rows), render(drf))
+
+    def test_narrowed_rows_keep_the_asked_fields(self):
+        rows = row_serializer(BaseItemSerializer, frozenset({"id", "time"}))
+
+        data = rows.render_many(rows.values(Item.objects.order_by("id")))
+
+        self.assertEqual(data[0], {"id": 1, "time": T0})
+
+    def test_expanded_rows_nest_the_serializers(self):
+        expand = tuple(sorted(EXPANSIONS.items()))
+        rows = row_serializer(BaseItemSerializer, None, expand)
+
+        with self.assertNumQueries(2):
+            data = rows.render_many(rows.values(Item.objects.filter(id=1)))
+
+        self.assertRendersLike(
+            EXPANSIONS["by"](HNUser.objects.get(uid="pg")).data, data[0]["by"]
+        )
+        self.assertRendersLike(
+            EXPANSIONS["kids"](
+                Comment.objects.filter(id__in=[2, 3]), many=True
+            ).data,
+            data[0]["kids"],
+        )
+
+    def test_list_fields(self):
+        news = self.client.get("/api/v1/news/?fields=id,type").json()
+        stories = self.client.get("/api/v1/stories/?fields=title").json()
+
+        self.assertEqual(
+            sorted(news["results"], key=lambda item: item["id"]),
+            [
+                {"id": 1, "type": "story"},
+                {"id": 2, "type": "comment"},
+                {"id": 3, "type": "comment"},
+                {"id": 4, "type": "story"},
+            ],
+        )
+        self.assertEqual(stories["results"], [{"title": "A story"}] * 2)
+
+    def test_detail_expand(self):
+        body = self.client.get("/api/v1/news/1?expand=by,kids").json()
+
+        self.assertEqual(body["by"]["uid"], "pg")
+        self.assertNotIn("synced_at", body["by"])
+        self.assertEqual([kid["id"] for kid in body["kids"]], [2, 3])
+        self.assertEqual(body["kids"][0]["text"], "A comment")
+
+    def test_unknown_fields_and_expansions(self):
+        for query in ("fields=id,title", "expand=parent", "expand=digest"):
+            with self.subTest(query=query):
+                response = self.client.get(f"/api/v1/news/?{query}")
+
+                self.assertEqual(response.status_code, 400)
+
+    def test_etag_depends_on_the_fields_asked_for(self):
+        etag = self.client.get("/api/v1/news/1")["ETag"]
+
+        narrowed = self.client.get(
+            "/api/v1/news/1?fields=id,by", HTTP_IF_NONE_MATCH=etag
+        )
+        reordered = self.client.get(
+            "/api/v1/news/1?fields=by,id",
+            HTTP_IF_NONE_MATCH=narrowed["ETag"],
+        )
+
+        self.assertEqual(narrowed.status_code, 200)
+        self.assertEqual(narrowed.json(), {"id": 1, "by": "pg"})
+        self.assertEqual(reordered.status_code, 304)
+
+    def test_expanded_items_are_always_sent(self):
+        etag = self.client.get("/api/v1/news/1")["ETag"]
+
+        response = self.client.get(
+            "/api/v1/news/1?expand=by", HTTP_IF_NONE_MATCH=etag
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.has_header("ETag"))
+        self.assertEqual(response.json()["by"]["uid"], "pg")
+
+
+@override_settings(SEARCH_INDEX_PATH="", RESPONSE_CACHE_ENABLED=False)
+class ExportTests(TestCase):
+    def setUp(self):
+        persistence.save_items(
+            [
+                story(1, time=T0 + 30),
+                comment(2, 1),
+                job(3),
+                story(4, time=T0 + 10, by="dang"),
+            ]
+        )
+
+    def read(self, content: bytes) -> list[dict]:
+        return [json.loads(line) for line in content.decode().splitlines()]
+
+    def test_streams_ndjson_in_time_order(self):
+        response = self.client.get("/api/v1/news/export")
+
+        self.assertTrue(response.streaming)
+        self.assertEqual(response["Content-Type"], export.CONTENT_TYPE)
+        items = self.read(b"".join(response.streaming_content))
+        self.assertEqual(
+            [(item["id"], item["time"]) for item in items],
+            sorted(
+                (
+                    (item.id, int(item.time.timestamp()))
+                    for item in Item.objects.all()
+                ),
+                key=lambda pair: (pair[1], pair[0]),
+            ),
+        )
+        self.assertNotIn("synced_at", items[0])
+
+    def test_filters(self):
+        for query, ids in (
+            ("type=story", [4, 1]),
+            ("type=story&by=pg", [1]),
+            (f"since={T0 + 2}&until={T0 + 30}", [2, 3, 4]),
+        ):
+            with self.subTest(query=query):
+                response = self.client.get(
+                    f"/api/v1/news/export?{query}&fields=id"
+                )
+                content = b"".join(response.streaming_content)
+
+                self.assertEqual(
+                    self.read(content), [{"id": id} for id in ids]
+                )
+
+    def test_invalid_parameters(self):
+        for query in ("since=yesterday", "fields=secret", "expand=parent"):
+            with self.subTest(query=query):
+                response = self.client.get(f"/api/v1/news/export?{query}")
+
+                self.assertEqual(response.status_code, 400)
+
+    def test_gzipped_for_clients_that_accept_it(self):
+        plain = self.client.get("/api/v1/news/export")
+        zipped = self.client.get(
+            "/api/v1/news/export", HTTP_ACCEPT_ENCODING="gzip, deflate"
+        )
+
+        self.assertEqual(zipped["Content-Encoding"], "gzip")
+        self.assertIn("Accept-Encoding", zipped["Vary"])
+        self.assertEqual(
+            gzip.decompress(b"".join(zipped.streaming_content)),
+            b"".join(plain.streaming_content),
+        )
+
+    def test_one_block_per_chunk(self):
+        rows = row_serializer(BaseItemSerializer, frozenset({"id"}))
+
+        blocks = list(export.lines(rows, export.items({}), chunk_size=3))
+
+        self.assertEqual([block.count(b"\n") for block in blocks], [3, 1])
+
+    def test_command(self):
+        with tempfile.TemporaryDirectory() as directory:
+            output = f"{directory}/stories.ndjson.gz"
+            stderr = StringIO()
+
+            call_command(
+                "export_items",
+                "--type=story",
+                "--expand=by",
+                f"--output={output}",
+                stderr=stderr,
+            )
+
+            with gzip.open(output) as dump:
+                items = self.read(dump.read())
+
+        self.assertEqual([item["id"] for item in items], [4, 1])
+        self.assertEqual(items[0]["by"]["uid"], "dang")
+        self.assertIn("Exported 2 items", stderr.getvalue())
+
+    def test_command_rejects_unknown_fields(self):
+        with self.assertRaisesMessage(CommandError, "secret"):
+            call_command("export_items", "--fields=id,secret")
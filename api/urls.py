@@ -1,13 +1,29 @@
 from __future__ import annotations
 
+from django.conf import settings
 from django.urls import path
 
 from .routers import router
+from api import async_views
 from api.views import GetLatestNewsAPIView
+from api.views import ItemExportAPIView
+from api.views import StoryListAPIView
+from api.views import StoryListRankAPIView
+from api.views import SyncRunListAPIView
+from api.views import TopNewsAPIView
 from api.views import UpdateorDeleteNewsAPIView
 
 urlpatterns = [
     path("news/", GetLatestNewsAPIView.as_view(), name="get_news"),
+    path("news/top", TopNewsAPIView.as_view(), name="top_news"),
+    path("news/export", ItemExportAPIView.as_view(), name="export_news"),
+    path("lists/<str:name>", StoryListAPIView.as_view(), name="story_list"),
+    path(
+        "lists/<str:name>/<int:id>",
+        StoryListRankAPIView.as_view(),
+        name="story_list_rank",
+    ),
+    path("sync/runs", SyncRunListAPIView.as_view(), name="sync_runs"),
     path(
         "news/<int:id>",
         UpdateorDeleteNewsAPIView.as_view(),
@@ -16,3 +32,25 @@ urlpatterns = [
 ]
 
 urlpatterns += router.urls
+
+# async versions of the read endpoints, for ASGI deployments
+if settings.ASYNC_VIEWS_ENABLED:
+    urlpatterns += [
+        path("async/news/", async_views.news_list, name="async_news"),
+        path(
+            "async/news/<int:id>",
+            async_views.news_detail,
+            name="async_news_detail",
+        ),
+        path("async/stories/", async_views.story_list, name="async_stories"),
+        path(
+            "async/stories/<int:id>",
+            async_views.story_detail,
+            name="async_story_detail",
+        ),
+        path(
+            "async/items/<int:id>/comments",
+            async_views.comment_thread,
+            name="async_comment_thread",
+        ),
+    ]
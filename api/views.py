@@ -2,37 +2,68 @@ from __future__ import annotations
 
 import logging
 
+from django.conf import settings
+from django.http import Http404
+from django.http import HttpRequest
+from django.http import HttpResponse
+from django.http import StreamingHttpResponse
+from django.utils.cache import patch_vary_headers
 from rest_framework import status
 from rest_framework import viewsets
+from rest_framework.exceptions import NotFound
+from rest_framework.generics import ListAPIView
 from rest_framework.generics import ListCreateAPIView
 from rest_framework.generics import RetrieveUpdateDestroyAPIView
 from rest_framework.response import Response
+from rest_framework.views import APIView
 
+from api.lib import export
+from api.lib import lists
+from api.lib import metrics
+from api.lib.cache import ConditionalRetrieveMixin
+from api.lib.cache import ResponseCacheMixin
+from api.lib.metrics import SerializerMetricsMixin
+from api.lib.rows import for_request
+from api.lib.rows import RowReadMixin
 from api.models.models import Comment
+from api.models.models import FrontPageRank
 from api.models.models import HNUser
 from api.models.models import Item
 from api.models.models import Job
+from api.models.models import ListEntry
 from api.models.models import Poll
 from api.models.models import PollOption
 from api.models.models import Story
+from api.models.models import SyncRun
+from api.pagination import KeysetOrOffsetPagination
+from api.pagination import RankPagination
 from api.permissions import was_created_internally
 from api.serializers import BaseItemSerializer
 from api.serializers import CommentSerializer
+from api.serializers import EXPANSIONS
+from api.serializers import FrontPageSerializer
 from api.serializers import JobSerializer
+from api.serializers import ListEntrySerializer
 from api.serializers import StorySerializer
+from api.serializers import SyncRunSerializer
 from api.serializers import UserSerializer
 
 
 logger = logging.getLogger(__name__)
 
 
-class GetLatestNewsAPIView(ListCreateAPIView):
+class GetLatestNewsAPIView(
+    ResponseCacheMixin, RowReadMixin, ListCreateAPIView
+):
     """
     Retrieves Latest News from our DB
     """
 
-    queryset = Item.objects.all()
+    # items without a time can't be paged on `(time, id)`
+    queryset = Item.objects.filter(time__isnull=False)
     serializer_class = BaseItemSerializer
+    expansions = EXPANSIONS
+    pagination_class = KeysetOrOffsetPagination
     filterset_fields = ["type", "time", "by"]
 
     def create(self, request, *args, **kwargs):
@@ -44,7 +75,6 @@ class GetLatestNewsAPIView(ListCreateAPIView):
         serializer.is_valid(raise_exception=True)
         self.perform_create(serializer)
         headers = self.get_success_headers(serializer.data)
-        print(serializer.data)
         return Response(
             serializer.data, status=status.HTTP_201_CREATED, headers=headers
         )
@@ -54,18 +84,75 @@ class GetLatestNewsAPIView(ListCreateAPIView):
         serializer.save()
 
 
-class UpdateorDeleteNewsAPIView(RetrieveUpdateDestroyAPIView):
+class TopNewsAPIView(ResponseCacheMixin, SerializerMetricsMixin, ListAPIView):
+    """
+    Retrieves the front page, ranked by `api.lib.ranking`
+    """
+
+    queryset = FrontPageRank.objects.select_related("item")
+    serializer_class = FrontPageSerializer
+    pagination_class = RankPagination
+    filter_backends = []
+
+
+class StoryListAPIView(
+    ResponseCacheMixin, SerializerMetricsMixin, ListAPIView
+):
+    """
+    Retrieves a page of an upstream story list (`top`, `new`, \
+        `best`, `ask`, `show` or `job`), mirrored by `api.lib.lists`
+    """
+
+    serializer_class = ListEntrySerializer
+    pagination_class = RankPagination
+    filter_backends = []
+
+    def get_queryset(self):
+        name = self.kwargs["name"]
+        if name not in ListEntry.LISTS:
+            raise NotFound(f"No list named {name!r}.")
+        return ListEntry.objects.filter(name=name).select_related(
+            "item__story", "item__job", "item__poll"
+        )
+
+
+class StoryListRankAPIView(APIView):
+    """
+    Retrieves the rank of an item in an upstream story list
+    """
+
+    def get(self, request, name, id):
+        if name not in ListEntry.LISTS:
+            raise NotFound(f"No list named {name!r}.")
+        rank = lists.rank_of(name, id)
+        if rank is None:
+            raise NotFound(f"Item {id} is not in the {name} list.")
+        return Response({"list": name, "id": id, "rank": rank})
+
+
+class UpdateorDeleteNewsAPIView(
+    ConditionalRetrieveMixin,
+    ResponseCacheMixin,
+    RowReadMixin,
+    RetrieveUpdateDestroyAPIView,
+):
     """
     Updates or deletes a News
     """
 
     queryset = Item.objects.all()
     serializer_class = BaseItemSerializer
+    expansions = EXPANSIONS
     # permission_classes = [was_created_internally, ]
     lookup_field = "id"
 
 
-class StoriesViewset(viewsets.ModelViewSet):
+class StoriesViewset(
+    ConditionalRetrieveMixin,
+    ResponseCacheMixin,
+    RowReadMixin,
+    viewsets.ModelViewSet,
+):
     """
     Viewset for Stories.
 
@@ -75,9 +162,23 @@ class StoriesViewset(viewsets.ModelViewSet):
 
     queryset = Story.objects.all()
     serializer_class = StorySerializer
+    expansions = EXPANSIONS
+    pagination_class = KeysetOrOffsetPagination
 
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action == "list":
+            # stories without a time can't be paged on `(time, id)`
+            queryset = queryset.filter(time__isnull=False)
+        return queryset
 
-class CommentViewset(viewsets.ModelViewSet):
+
+class CommentViewset(
+    ConditionalRetrieveMixin,
+    ResponseCacheMixin,
+    RowReadMixin,
+    viewsets.ModelViewSet,
+):
     """
     Viewset for Comment.
 
@@ -87,9 +188,15 @@ class CommentViewset(viewsets.ModelViewSet):
 
     queryset = Comment.objects.all()
     serializer_class = CommentSerializer
+    expansions = EXPANSIONS
 
 
-class JobViewset(viewsets.ModelViewSet):
+class JobViewset(
+    ConditionalRetrieveMixin,
+    ResponseCacheMixin,
+    RowReadMixin,
+    viewsets.ModelViewSet,
+):
     """
     Viewset for Jobs.
 
@@ -99,9 +206,10 @@ class JobViewset(viewsets.ModelViewSet):
 
     queryset = Job.objects.all()
     serializer_class = JobSerializer
+    expansions = EXPANSIONS
 
 
-class UserViewSet(viewsets.ModelViewSet):
+class UserViewSet(SerializerMetricsMixin, viewsets.ModelViewSet):
     """Users ViewSet
 
     Args:
@@ -110,3 +218,55 @@ class UserViewSet(viewsets.ModelViewSet):
 
     queryset = HNUser.objects.all()
     serializer_class = UserSerializer
+
+
+class SyncRunListAPIView(SerializerMetricsMixin, ListAPIView):
+    """
+    Retrieves the run history of the collector, latest first, \
+        optionally filtered with `?kind=sync` or `?kind=changes`
+    """
+
+    queryset = SyncRun.objects.all()
+    serializer_class = SyncRunSerializer
+    filterset_fields = ["kind"]
+
+
+class ItemExportAPIView(APIView):
+    """
+    Streams every item matching `?type=`, `?by=`, `?since=` and \
+        `?until=` as NDJSON, gzipped for clients that accept it, \
+            see `api.lib.export`. Takes `?fields=` and `?expand=` \
+                like `news/`.
+
+    Django 4.0 iterates streaming responses on the event loop under \
+        ASGI, where the ORM refuses to run: serve it over WSGI, or \
+            use `manage.py export_items`.
+    """
+
+    def get(self, request):
+        queryset = export.items(request.query_params)
+        rows = for_request(BaseItemSerializer, request, EXPANSIONS)
+        content = export.lines(rows, queryset)
+        gzip = "gzip" in request.META.get("HTTP_ACCEPT_ENCODING", "")
+        if gzip:
+            content = export.gzipped(content)
+        response = StreamingHttpResponse(
+            content, content_type=export.CONTENT_TYPE
+        )
+        if gzip:
+            response["Content-Encoding"] = "gzip"
+        patch_vary_headers(response, ("Accept-Encoding",))
+        return response
+
+
+def metrics_view(request: HttpRequest) -> HttpResponse:
+    """
+    Serves the request metrics of every worker in the Prometheus \
+        text format, to the addresses in `METRICS_ALLOWED_IPS`.
+    """
+    if request.META.get("REMOTE_ADDR") not in settings.METRICS_ALLOWED_IPS:
+        raise Http404
+    return HttpResponse(
+        metrics.exposition(),
+        content_type="text/plain; version=0.0.4; charset=utf-8",
+    )
@@ -9,6 +9,7 @@ import os
 import sys
 from pathlib import Path
 
+import django
 import environ
 from celery.schedules import crontab
 
@@ -54,6 +55,7 @@ LOCAL_APPS = ["api.apps.ApiConfig", "newsapp.apps.NewsappConfig"]
 INSTALLED_APPS = DJANGO_APPS + THIRD_PARTY_APPS + LOCAL_APPS
 
 MIDDLEWARE = [
+    "api.middleware.metrics_middleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "whitenoise.middleware.WhiteNoiseMiddleware",
@@ -85,6 +87,12 @@ TEMPLATES = [
 WSGI_APPLICATION = "core.wsgi.application"
 ASGI_APPLICATION = "core.asgi.application"
 
+ASYNC_VIEWS_ENABLED = env.bool(
+    "ASYNC_VIEWS_ENABLED", default=django.VERSION >= (4, 1)
+)
+"""Route `api/v1/async/`; before Django 4.1 their queries all run on \
+    one thread per process, see `api.lib.aio`."""
+
 # Database
 # https://docs.djangoproject.com/en/4.1/ref/settings/#databases
 
@@ -167,8 +175,112 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 # SECURE_HSTS_SECONDS = env.int("DJANGO_SECURE_HSTS_SECONDS", default=0)
 
 # Hacker News Endpoint
-HACKER_NEWSAPI_URI = "https://hacker-news.firebaseio.com/v0"
-"""Official Hacker News API."""
+HACKER_NEWSAPI_URI = env.str(
+    "HACKER_NEWSAPI_URI", default="https://hacker-news.firebaseio.com/v0"
+)
+"""Official Hacker News API, or a local `manage.py hn_standin`."""
+
+HACKER_NEWS_CONCURRENCY = env.int("HACKER_NEWS_CONCURRENCY", default=32)
+"""Maximum number of requests the collector keeps in flight."""
+
+HACKER_NEWS_TIMEOUT = env.float("HACKER_NEWS_TIMEOUT", default=10.0)
+HACKER_NEWS_RETRIES = env.int("HACKER_NEWS_RETRIES", default=3)
+
+HACKER_NEWS_MAX_ITEMS = env.int("HACKER_NEWS_MAX_ITEMS", default=5000)
+"""Upper bound on new items fetched by a single collector run."""
+
+HACKER_NEWS_BACKFILL_SLICE = env.int(
+    "HACKER_NEWS_BACKFILL_SLICE", default=1000
+)
+"""Number of older items backfilled by each collector run."""
+
+HACKER_NEWS_SYNC_LEASE = env.int("HACKER_NEWS_SYNC_LEASE", default=900)
+"""Seconds a sync holds the cursor before it is presumed dead."""
+
+HACKER_NEWS_REFRESH_WINDOW = env.int("HACKER_NEWS_REFRESH_WINDOW", default=300)
+"""Seconds during which a refreshed item is skipped by the change feed."""
+
+HACKER_NEWS_TRANSPORT = env.str("HACKER_NEWS_TRANSPORT", default="passthrough")
+"""`passthrough`, `record` or `replay`, see `api.lib.transport`."""
+
+HACKER_NEWS_RECORDING = env.str(
+    "HACKER_NEWS_RECORDING",
+    default=str(BASE_DIR / "var" / "recording.sqlite3"),
+)
+"""Store written by the `record` transport and read by `replay`."""
+
+SYNC_RUN_RETENTION = env.int("SYNC_RUN_RETENTION", default=30)
+"""Days the stage timings of collector runs are kept, see `SyncRun`."""
+
+PROFILE_CACHE_TTL = env.int("PROFILE_CACHE_TTL", default=300)
+"""Seconds a fetched author profile is served from the cache."""
+
+LIST_RANKS_TTL = env.int("LIST_RANKS_TTL", default=30)
+"""Seconds a worker serves list ranks without rereading them."""
+
+FRONT_PAGE_SIZE = env.int("FRONT_PAGE_SIZE", default=500)
+"""Number of stories kept on the precomputed front page."""
+
+FRONT_PAGE_WINDOW = env.int("FRONT_PAGE_WINDOW", default=72)
+"""Hours a story stays eligible for the front page."""
+
+FRONT_PAGE_GRAVITY = env.float("FRONT_PAGE_GRAVITY", default=1.8)
+
+# Search
+SEARCH_INDEX_PATH = env.str("SEARCH_INDEX_PATH", default="")
+"""Directory of the BM25 index of `api.search.index`, off when empty."""
+
+# Caching
+REDIS_URL = env.str("REDIS_URL", default="")
+"""Redis holding the caches, local memory (per process) if empty."""
+
+CACHE_MAX_ENTRIES = env.int("CACHE_MAX_ENTRIES", default=1000)
+"""Entries kept by the local memory fallback before culling."""
+
+if REDIS_URL:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": REDIS_URL,
+            "KEY_PREFIX": "hn",
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "OPTIONS": {"MAX_ENTRIES": CACHE_MAX_ENTRIES},
+        }
+    }
+
+RESPONSE_CACHE_ENABLED = env.bool(
+    "RESPONSE_CACHE_ENABLED", default=bool(REDIS_URL)
+)
+"""Serve list pages from the response cache; needs a cache shared by \
+    the web and Celery workers, so it is off on the local memory one."""
+
+RESPONSE_CACHE_ALIAS = "default"
+RESPONSE_CACHE_TIMEOUT = env.int("RESPONSE_CACHE_TIMEOUT", default=600)
+"""Seconds a cached response lives, if no sync invalidates it first."""
+
+# Metrics
+METRICS_ENABLED = env.bool("METRICS_ENABLED", default=True)
+"""Record per-route request metrics, see `api.lib.metrics`."""
+
+METRICS_FLUSH_INTERVAL = env.int("METRICS_FLUSH_INTERVAL", default=10)
+"""Seconds between two publications of a worker's metrics."""
+
+METRICS_MAX_WORKERS = env.int("METRICS_MAX_WORKERS", default=64)
+"""Workers `/metrics` can report, see `api.lib.metrics`."""
+
+METRICS_ALLOWED_IPS = env.list(
+    "METRICS_ALLOWED_IPS", default=["127.0.0.1", "::1"]
+)
+"""Client addresses allowed to scrape `/metrics`."""
+
+# Export
+EXPORT_CHUNK_SIZE = env.int("EXPORT_CHUNK_SIZE", default=2000)
+"""Rows fetched and encoded at a time by `api.lib.export`."""
 
 # Celery Configuration
 CELERY_BEAT_SCHEDULE = {
@@ -176,6 +288,10 @@ CELERY_BEAT_SCHEDULE = {
         "task": "api.tasks.sync_db",
         "schedule": crontab(minute="*/1"),
     },
+    "update_changes": {
+        "task": "api.tasks.update_changes",
+        "schedule": crontab(minute="*/1"),
+    },
 }
 
 CELERY_BROKER_URL = env.str("CELERY_BROKER_URL")
@@ -10,6 +10,8 @@ from django.urls import path
 from drf_spectacular.views import SpectacularAPIView
 from drf_spectacular.views import SpectacularSwaggerView
 
+from api.views import metrics_view
+
 urlpatterns = [
     path("admin/", admin.site.urls),
     # Documentation Endpoint
@@ -19,6 +21,8 @@ urlpatterns = [
         SpectacularSwaggerView.as_view(url_name="schema"),
         name="schema",
     ),
+    # Prometheus scrape target, see api.lib.metrics
+    path("metrics", metrics_view, name="metrics"),
     # API Urls
     path("api/v1/", include("api.urls")),
     # Frontend Urls
@@ -0,0 +1,97 @@
+"""
+Filters rendering the user-controlled text and links of items.
+
+Item text is HTML (HN formats it with `<p>`, `<i>`, `<a>`, \
+    `<pre>` and `<code>`), and anyone can write it through the \
+        API, so it is never marked safe as stored: `hn_text` keeps \
+            those tags, without attributes but the `href` of links, \
+                and escapes everything else.
+
+    {% load hn_text %}
+    {{ comment.text|hn_text }}
+    <a href="{{ item.url|hn_url }}">
+"""
+from __future__ import annotations
+
+from html import escape
+from html.parser import HTMLParser
+from urllib.parse import urlsplit
+
+from django import template
+from django.utils.safestring import mark_safe
+from django.utils.safestring import SafeString
+
+
+register = template.Library()
+
+ALLOWED_TAGS = frozenset({"a", "p", "i", "pre", "code"})
+"""The tags of HN item text."""
+
+URL_SCHEMES = frozenset({"http", "https"})
+
+
+def clean_url(url: str | None) -> str:
+    """`url` if it is http(s) or relative, else an empty string."""
+    url = (url or "").strip()
+    scheme = urlsplit(url).scheme.lower()
+    if scheme in URL_SCHEMES or (not scheme and ":" not in url):
+        return url
+    return ""
+
+
+class Sanitizer(HTMLParser):
+    """Rewrites HTML keeping only `ALLOWED_TAGS`, see `sanitize`."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.out: list[str] = []
+        self.open: list[str] = []
+
+    def handle_starttag(self, tag: str, attrs: list[tuple]) -> None:
+        if tag not in ALLOWED_TAGS:
+            return
+        if tag == "a":
+            href = escape(clean_url(dict(attrs).get("href")))
+            self.out.append(f'<a href="{href}" rel="nofollow noopener">')
+        else:
+            self.out.append(f"<{tag}>")
+        self.open.append(tag)
+
+    def handle_startendtag(self, tag: str, attrs: list[tuple]) -> None:
+        self.handle_starttag(tag, attrs)
+        self.handle_endtag(tag)
+
+    def handle_endtag(self, tag: str) -> None:
+        if tag not in self.open:
+            return
+        while self.open:
+            opened = self.open.pop()
+            self.out.append(f"</{opened}>")
+            if opened == tag:
+                break
+
+    def handle_data(self, data: str) -> None:
+        self.out.append(escape(data, quote=False))
+
+    def close(self) -> str:
+        super().close()
+        self.out.extend(f"</{tag}>" for tag in reversed(self.open))
+        self.open = []
+        return "".join(self.out)
+
+
+def sanitize(text: str | None) -> str:
+    """`text` with only the `ALLOWED_TAGS` of HN left as markup."""
+    parser = Sanitizer()
+    parser.feed(text or "")
+    return parser.close()
+
+
+@register.filter
+def hn_text(text: str | None) -> SafeString:
+    return mark_safe(sanitize(text))
+
+
+@register.filter
+def hn_url(url: str | None) -> str:
+    return clean_url(url)
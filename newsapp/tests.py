@@ -1,5 +1,171 @@
 from __future__ import annotations
 
+from unittest import mock
+
+from django.db import connection
+from django.test import override_settings
+from django.test import SimpleTestCase
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from api.lib import persistence
+from newsapp.templatetags.hn_text import clean_url
+from newsapp.templatetags.hn_text import sanitize
+
+
+T0 = 1_600_000_000
+
+
+def news(id: int, type: str = "story", **extra):
+    return {
+        "id": id,
+        "type": type,
+        "by": f"user{id}",
+        "time": T0 + id,
+        "title": f"{type.title()} {id}",
+        "url": f"https://example.com/{id}",
+        "kids": [],
+        **extra,
+    }
+
+
+@override_settings(SEARCH_INDEX_PATH="", RESPONSE_CACHE_ENABLED=False)
+class HomePageTests(TestCase):
+    def queries(self, path: str) -> int:
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(path)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_queries_do_not_grow_with_the_page(self):
+        for path in ("/home", "/home?filters=Story"):
+            with self.subTest(path=path):
+                persistence.save_items(
+                    [news(1), news(2, "job"), news(3, "poll", parts=[])]
+                )
+                few = self.queries(path)
+
+                persistence.save_items(
+                    news(id, ("story", "job", "poll")[id % 3])
+                    for id in range(10, 40)
+                )
+
+                self.assertEqual(self.queries(path), few)
+
+    def test_lists_items_with_their_subtype(self):
+        persistence.save_items(
+            [news(1), news(2, "job"), news(3, "comment", parent=1)]
+        )
+
+        response = self.client.get("/home")
+
+        self.assertContains(response, "Story 1")
+        self.assertContains(response, "Job 2")
+        self.assertNotContains(response, "Comment 3")
+
+
+class SanitizeTests(SimpleTestCase):
+    def test_keeps_hn_markup(self):
+        text = "<p>An <i>item</i><pre><code>x = 1</code></pre>"
+        self.assertEqual(
+            sanitize(text),
+            "<p>An <i>item</i><pre><code>x = 1</code></pre></p>",
+        )
+
+    def test_escapes_other_markup(self):
+        self.assertEqual(
+            sanitize("<script>alert('&')</script><b>bold</b>"),
+            "alert('&amp;')bold",
+        )
+        self.assertEqual(sanitize("1 &lt; 2"), "1 &lt; 2")
+
+    def test_drops_attributes_but_link_targets(self):
+        self.assertEqual(
+            sanitize(
+                '<p onclick="x()"><a href="https://example.com/?a=1&b=2"'
+                ' onmouseover="x()">link</a>'
+            ),
+            '<p><a href="https://example.com/?a=1&amp;b=2"'
+            ' rel="nofollow noopener">link</a></p>',
+        )
+
+    def test_empties_unsafe_links(self):
+        for href in ("javascript:alert(1)", " JavaScript:x", "data:text"):
+            with self.subTest(href=href):
+                self.assertEqual(
+                    sanitize(f'<a href="{href}">link</a>'),
+                    '<a href="" rel="nofollow noopener">link</a>',
+                )
+
+    def test_closes_unbalanced_tags(self):
+        self.assertEqual(sanitize("<i>a<p>b"), "<i>a<p>b</p></i>")
+        self.assertEqual(sanitize("a</i></p>"), "a")
+        self.assertEqual(sanitize("<i><p>a</i>b"), "<i><p>a</p></i>b")
+
+    def test_clean_url(self):
+        self.assertEqual(clean_url("https://x.org/a"), "https://x.org/a")
+        self.assertEqual(clean_url("/item?id=1"), "/item?id=1")
+        self.assertEqual(clean_url("javascript:alert(1)"), "")
+        self.assertEqual(clean_url(None), "")
+
+
+@override_settings(SEARCH_INDEX_PATH="", RESPONSE_CACHE_ENABLED=False)
+class ItemPageTests(TestCase):
+    def setUp(self):
+        persistence.save_items(
+            [
+                news(1, title="<script>alert(1)</script>", kids=[2, 5]),
+                news(
+                    2,
+                    "comment",
+                    parent=1,
+                    text='<a href="javascript:alert(3)">x</a> python',
+                    kids=[3],
+                ),
+                news(3, "comment", parent=2, text="Python typing", kids=[4]),
+                news(4, "comment", parent=3, text="python packaging"),
+                news(5, "comment", parent=1, text="python elsewhere"),
+                news(6, "job", text="<p>Hi<script>alert(2)</script>"),
+            ]
+        )
+
+    def test_renders_user_text_sanitized(self):
+        response = self.client.get("/1/")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotContains(response, "<script>alert")
+        self.assertNotContains(response, 'href="javascript:')
+        self.assertContains(response, "&lt;script&gt;alert(1)")
+        self.assertContains(response, 'rel="nofollow noopener">x</a>')
+
+        response = self.client.get("/6/")
+        self.assertNotContains(response, "<script>alert")
+        self.assertContains(response, "<p>Hialert(2)</p>")
+
+    def test_search_within_a_story_thread(self):
+        response = self.client.get("/1/?search=python")
+
+        self.assertEqual(
+            sorted(comment.id for comment in response.context["comments"]),
+            [2, 3, 4, 5],
+        )
+
+    def test_search_within_a_comment_thread(self):
+        response = self.client.get("/2/?search=python")
+
+        self.assertEqual(
+            sorted(comment.id for comment in response.context["comments"]),
+            [3, 4],
+        )
+
+    def test_search_within_a_comment_thread_without_full_text(self):
+        with mock.patch("api.search.lookups.get_backend", return_value=None):
+            response = self.client.get("/2/?search=python")
+
+        self.assertEqual(
+            sorted(comment.id for comment in response.context["comments"]),
+            [3, 4],
+        )
 
-# Create your tests here.
+    def test_unknown_item(self):
+        self.assertEqual(self.client.get("/404/").status_code, 404)
@@ -9,6 +9,7 @@ from django.http import HttpRequest
 from django.http import HttpResponse
 from django.shortcuts import get_object_or_404
 from django.shortcuts import redirect
+from django.shortcuts import render
 from django.urls import reverse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.generic import TemplateView
@@ -19,7 +20,11 @@ from .forms import JobsForm
 from .forms import PollOptForm
 from .forms import PollsForm
 from .forms import StoryForm
+from api.lib.cache import get_response
+from api.lib.cache import response_key
+from api.lib.cache import set_response
 from api.models.models import Comment
+from api.models.models import FrontPageRank
 from api.models.models import Item
 from api.models.models import Poll
 from api.models.models import Story
@@ -35,6 +40,18 @@ class DisplayNewsView(TemplateView):
 
     template_name: str = "home.html"
 
+    @staticmethod
+    def latest():
+        # Paginate the QuerySet first, then resolve the subtypes of
+        # that page only, with a single joined query.
+        return (
+            Item.objects.all()
+            .exclude(type="comment")
+            .exclude(type="pollopt")
+            .order_by("time")
+            .with_subtypes()
+        )
+
     def get(
         self, request: HttpRequest, *args: Any, **kwargs: dict[str, Any]
     ) -> HttpResponse:
@@ -45,38 +62,38 @@ class DisplayNewsView(TemplateView):
 
         """
 
+        # the page only changes when a sync commits, see api.lib.cache
+        key = response_key(request)
+        cached, version = get_response(key)
+        if cached is not None:
+            return cached
+
         # If request contains search query
         # retrieve new by item or query or both
         # excluding the comments.
         query = request.GET.get("query")
         filter = request.GET.get("filters")
 
-        if query or filter is None:
-            qs = (
-                Item.objects.all()
-                .exclude(type="comment")
-                .exclude(type="pollopt")
-                .order_by("time")
-            )
-        elif query or filter:
-            if query:
-                search = Search()
-                qs = search.full_match(query)
-
-            filters = {"Story": "story", "Job": "job", "Poll": "poll"}
-
-            if filter and filter in filters:
-                qs = (
-                    Item.objects.filter(filter=filter)
-                    .exclude(type="comment")
-                    .exclude(type="pollopt")
-                    .order_by("time")
-                )
-        # Paginate QuerySet
-        queryset = [q.get_type() for q in qs]
+        filters = {"Story": "story", "Job": "job", "Poll": "poll"}
+
+        if query:
+            # ranked matches, with their subtypes already joined
+            qs = Search(query).full_match()
+        elif filter in filters:
+            qs = self.latest().filter(type=filters[filter])
+        else:
+            # the precomputed front page, see api.lib.ranking
+            qs = FrontPageRank.objects.select_related("item")
+            if not qs.exists():
+                qs = self.latest()
+
         paginator = Paginator(qs, 25)
 
         page = paginator.get_page(request.GET.get("page"))
+        queryset = [
+            q.item if isinstance(q, FrontPageRank) else q.get_type()
+            for q in page.object_list
+        ]
 
         context = {
             "page_obj": page,
@@ -85,23 +102,28 @@ class DisplayNewsView(TemplateView):
             "poll_form": PollsForm,
             "job_form": JobsForm,
         }
-        return super().render_to_response(context=context)
+        response = super().render_to_response(context=context)
+        response.add_post_render_callback(
+            lambda rendered: set_response(key, rendered, version)
+        )
+        return response
 
 
 def get_item_view(request, id: int, *args, **kwargs):
     if request.method == "GET":
-        item = get_object_or_404(Item, id=id)
-        obj = item.get_model_type()
+        item = get_object_or_404(Item.objects.with_subtypes(), id=id)
+        obj = item.get_type()
         query = request.GET.get("search", None)
 
         if query:
-            # import our search library
-            search = Search()
-
-            comments = search.comments(query, id)
+            # the matching comments of this thread, best first
+            comments = Search(query).comments(root=obj)
         else:
-            comments = Comment.objects.filter(parent__id=obj.id)
-            return redirect(reverse("newsapp:get-items"))
+            # the whole thread below the item, in display order
+            comments = Comment.objects.thread(obj)
+
+        context = {"item": obj, "comments": comments}
+        return render(request, "item.html", context=context)
 
 
 @login_required